@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the Flask app tests.
+Keeps test runs out of the application's results files and task queue.
+Importing this module imports app, so it needs Flask.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+from app import job_queue, tasks, CSV_HEADER
+from raw_catalog import RawCatalog
+from results_store import ResultsStore
+from results_writer import ResultsWriter
+
+
+def redirect_results(test):
+    """
+    Point the results CSV, raw files and results store at a temp dir for one
+    test; tasks still running at the end are cancelled before it's removed.
+    """
+    tmpdir = tempfile.mkdtemp()
+    raw_dir = os.path.join(tmpdir, "raw_results")
+    os.makedirs(raw_dir)
+    store = ResultsStore(os.path.join(tmpdir, "results.db"))
+    writer = ResultsWriter(os.path.join(tmpdir, "results.csv"), header=CSV_HEADER)
+    test.addCleanup(shutil.rmtree, tmpdir, True)
+    for name, value in (("results_store", store), ("results_writer", writer), ("CSV_FILE", writer.path),
+                        ("RAW_DIR", raw_dir), ("raw_catalog", RawCatalog(raw_dir))):
+        patcher = mock.patch(f"app.{name}", value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    test.addCleanup(store.close)
+    test.addCleanup(writer.close)
+    test.addCleanup(finish_tasks)
+
+
+def finish_tasks(timeout=15.0):
+    """Cancel every task and wait until the job queue is idle."""
+    for task_id in tasks.ids():
+        job_queue.cancel(task_id)
+    deadline = time.time() + timeout
+    while time.time() < deadline and any(job_queue.stats()[k] for k in ("running", "queued")):
+        time.sleep(0.05)
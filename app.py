@@ -7,17 +7,35 @@ import os
 import csv
 import json
 import uuid
-import threading
+import functools
+import asyncio
 import subprocess
 import re
 import time
 import logging
+import atexit
 import configparser
-import copy
 from datetime import datetime
 from flask import Flask, request, jsonify, send_file, render_template, abort, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from validation import Validator, ValidationError
+from iperf_parser import BidirStreamParser, IperfStreamParser, iperf_supports_bidir, iperf_supports_json_stream
+from task_state import TaskRegistry, PartialState, TERMINAL_STATUSES, json_default
+from latency import LatencyStats
+from latency_probe import PROBE_MODES, ProbeUnavailable, ping_interval_s, probe_rtts
+from convergence import CONFIDENCE_LEVELS, ConvergenceMonitor, RepeatPlanner
+from preflight import ReachabilityCache
+from csv_export import export_etag, gzip_chunks, iter_csv
+from raw_catalog import RawCatalog
+from raw_format import (RAW_COMPRESSIONS, RAW_EXTENSIONS, RAW_FORMATS, compression_of, iter_plain_json, plain_name,
+                        read_stored, write_raw, zstd_available)
+from results_store import ResultsStore
+from results_writer import FSYNC_POLICIES, ResultsWriter
+from wifi_telemetry import WifiTelemetry, make_source
+from engine import MeasurementEngine, ProcessCancelled, aclosing, stream_lines, run_exec, supervisor, until_set
+from server_pool import LOCAL_HOST, ServerPool, parse_endpoints
+from job_queue import JobQueue, QueueFull, PRIORITY_POINT, PRIORITY_SURVEY
 
 # Setup logging
 logging.basicConfig(
@@ -27,7 +45,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Safety limits for process output
-MAX_LINES_PER_SECOND = 10  # Maximum expected lines per second for ping output
+MAX_LINES_PER_PROBE = 10   # Maximum expected ping output lines per probe
 MAX_OUTPUT_LINES = 1000     # Maximum lines to process from iperf3 output
 
 # Load configuration
@@ -66,13 +84,52 @@ config = load_config()
 APP_DIR = os.path.abspath(os.path.dirname(__file__))
 RAW_DIR = os.path.join(APP_DIR, config.get('paths', 'raw_results', fallback='raw_results'))
 CSV_FILE = os.path.join(APP_DIR, config.get('paths', 'csv_file', fallback='wifi_survey_results.csv'))
+RESULTS_DB = os.path.join(APP_DIR, config.get('paths', 'results_db', fallback='results.db'))
+CSV_BATCH_ROWS = config.getint('results', 'batch_rows', fallback=32)
+CSV_FLUSH_INTERVAL_S = config.getfloat('results', 'flush_interval_s', fallback=2.0)
+CSV_FSYNC = config.get('results', 'fsync', fallback='batch').strip().lower()
+RAW_FORMAT = config.get('results', 'raw_format', fallback='json').strip().lower()
+RAW_COMPRESSION = config.get('results', 'raw_compression', fallback='gzip').strip().lower()
 
 SERVER_IP = config.get('server', 'ip', fallback='192.168.1.10')
+REACHABILITY_TTL_S = config.getint('server', 'reachability_ttl_s', fallback=30)
 IPERF_DURATION = config.getint('iperf', 'duration', fallback=20)
 IPERF_PARALLEL = config.getint('iperf', 'parallel', fallback=4)
+IPERF_BIDIR = config.getboolean('iperf', 'bidir', fallback=False)
+IPERF_ADAPTIVE = config.getboolean('iperf', 'adaptive', fallback=False)
+IPERF_ADAPTIVE_TOLERANCE_PCT = config.getfloat('iperf', 'adaptive_tolerance_pct', fallback=5.0)
+IPERF_ADAPTIVE_CONFIDENCE = config.getfloat('iperf', 'adaptive_confidence', fallback=0.95)
+IPERF_ADAPTIVE_MIN_S = config.getfloat('iperf', 'adaptive_min_s', fallback=5.0)
+IPERF_ADAPTIVE_OMIT_S = config.getfloat('iperf', 'adaptive_omit_s', fallback=2.0)
 FLASK_HOST = config.get('server', 'flask_host', fallback='0.0.0.0')
 FLASK_PORT = config.getint('server', 'flask_port', fallback=5000)
 
+SERVER_ENDPOINTS = config.get('servers', 'endpoints', fallback='')
+SERVERS_LOCAL_COUNT = config.getint('servers', 'local_count', fallback=0)
+SERVERS_LOCAL_BASE_PORT = config.getint('servers', 'local_base_port', fallback=5201)
+SERVERS_LOCAL_HOST = config.get('servers', 'local_host', fallback='').strip() or LOCAL_HOST
+
+SURVEY_ADAPTIVE_REPEATS = config.getboolean('survey', 'adaptive_repeats', fallback=False)
+SURVEY_MAX_REPEATS = config.getint('survey', 'max_repeats', fallback=10)
+SURVEY_TARGET_ERROR_PCT = config.getfloat('survey', 'target_error_pct', fallback=10.0)
+
+JOBS_MAX_CONCURRENT = config.getint('jobs', 'max_concurrent', fallback=0)
+JOBS_MAX_QUEUED = config.getint('jobs', 'max_queued', fallback=20)
+
+LATENCY_MODE = config.get('latency', 'mode', fallback='idle').strip().lower()
+LATENCY_PROBE = config.get('latency', 'probe', fallback='icmp').strip().lower()
+LATENCY_INTERVAL_MS = config.getint('latency', 'interval_ms', fallback=200)
+LATENCY_COUNT = config.getint('latency', 'count', fallback=0)
+LATENCY_ECHO_PORT = config.getint('latency', 'echo_port', fallback=5300)
+
+TASK_SPILL_DIR = os.path.join(APP_DIR, config.get('paths', 'task_spill', fallback='task_spill'))
+TASKS_MAX_FINISHED = config.getint('tasks', 'max_finished', fallback=200)
+TASKS_FINISHED_TTL_S = config.getint('tasks', 'finished_ttl_s', fallback=3600)
+TASKS_MEMORY_BUDGET_MB = config.getint('tasks', 'memory_budget_mb', fallback=32)
+TASKS_SPILL_MAX_FILES = config.getint('tasks', 'spill_max_files', fallback=1000)
+TASKS_SPILL_TTL_H = config.getfloat('tasks', 'spill_ttl_h', fallback=168)
+TASKS_SWEEP_INTERVAL_S = config.getfloat('tasks', 'sweep_interval_s', fallback=60)
+
 # Validate configuration
 if IPERF_DURATION < 1 or IPERF_DURATION > 300:
     logger.warning(f"Invalid iperf duration {IPERF_DURATION}, using default 20")
@@ -82,12 +139,145 @@ if IPERF_PARALLEL < 1 or IPERF_PARALLEL > 16:
     logger.warning(f"Invalid iperf parallel {IPERF_PARALLEL}, using default 4")
     IPERF_PARALLEL = 4
 
+if SERVERS_LOCAL_COUNT < 0 or SERVERS_LOCAL_COUNT > 32:
+    logger.warning(f"Invalid servers local_count {SERVERS_LOCAL_COUNT}, local servers disabled")
+    SERVERS_LOCAL_COUNT = 0
+
+if JOBS_MAX_CONCURRENT < 0:
+    logger.warning(f"Invalid jobs max_concurrent {JOBS_MAX_CONCURRENT}, using one per iperf3 server")
+    JOBS_MAX_CONCURRENT = 0
+
+if JOBS_MAX_QUEUED < 0:
+    logger.warning(f"Invalid jobs max_queued {JOBS_MAX_QUEUED}, using default 20")
+    JOBS_MAX_QUEUED = 20
+
+if LATENCY_MODE not in Validator.LATENCY_MODES:
+    logger.warning(f"Invalid latency mode {LATENCY_MODE!r}, using idle")
+    LATENCY_MODE = "idle"
+
+if LATENCY_PROBE not in PROBE_MODES:
+    logger.warning(f"Invalid latency probe {LATENCY_PROBE!r}, using icmp")
+    LATENCY_PROBE = "icmp"
+
+if LATENCY_INTERVAL_MS < 10 or LATENCY_INTERVAL_MS > 1000:
+    logger.warning(f"Invalid latency interval_ms {LATENCY_INTERVAL_MS}, using default 200")
+    LATENCY_INTERVAL_MS = 200
+
+if LATENCY_COUNT < 0 or LATENCY_COUNT > 10000:
+    logger.warning(f"Invalid latency count {LATENCY_COUNT}, using one probe per second of duration")
+    LATENCY_COUNT = 0
+
+if LATENCY_ECHO_PORT < 1 or LATENCY_ECHO_PORT > 65535:
+    logger.warning(f"Invalid latency echo_port {LATENCY_ECHO_PORT}, using default 5300")
+    LATENCY_ECHO_PORT = 5300
+
+LATENCY_INTERVAL_S = LATENCY_INTERVAL_MS / 1000.0
+
+if IPERF_ADAPTIVE_TOLERANCE_PCT <= 0 or IPERF_ADAPTIVE_TOLERANCE_PCT > 50:
+    logger.warning(f"Invalid iperf adaptive_tolerance_pct {IPERF_ADAPTIVE_TOLERANCE_PCT}, using default 5")
+    IPERF_ADAPTIVE_TOLERANCE_PCT = 5.0
+
+if IPERF_ADAPTIVE_CONFIDENCE not in CONFIDENCE_LEVELS:
+    logger.warning(f"Invalid iperf adaptive_confidence {IPERF_ADAPTIVE_CONFIDENCE}, using default 0.95")
+    IPERF_ADAPTIVE_CONFIDENCE = 0.95
+
+if IPERF_ADAPTIVE_MIN_S < 1:
+    logger.warning(f"Invalid iperf adaptive_min_s {IPERF_ADAPTIVE_MIN_S}, using default 5")
+    IPERF_ADAPTIVE_MIN_S = 5.0
+
+if IPERF_ADAPTIVE_OMIT_S < 0:
+    logger.warning(f"Invalid iperf adaptive_omit_s {IPERF_ADAPTIVE_OMIT_S}, using default 2")
+    IPERF_ADAPTIVE_OMIT_S = 2.0
+
+if SURVEY_MAX_REPEATS < 1 or SURVEY_MAX_REPEATS > Validator.REPEATS_MAX:
+    logger.warning(f"Invalid survey max_repeats {SURVEY_MAX_REPEATS}, using default 10")
+    SURVEY_MAX_REPEATS = 10
+
+if SURVEY_TARGET_ERROR_PCT <= 0:
+    logger.warning(f"Invalid survey target_error_pct {SURVEY_TARGET_ERROR_PCT}, using default 10")
+    SURVEY_TARGET_ERROR_PCT = 10.0
+
+if CSV_BATCH_ROWS < 1:
+    logger.warning(f"Invalid results batch_rows {CSV_BATCH_ROWS}, using default 32")
+    CSV_BATCH_ROWS = 32
+
+if CSV_FLUSH_INTERVAL_S < 0:
+    logger.warning(f"Invalid results flush_interval_s {CSV_FLUSH_INTERVAL_S}, using default 2")
+    CSV_FLUSH_INTERVAL_S = 2.0
+
+if CSV_FSYNC not in FSYNC_POLICIES:
+    logger.warning(f"Invalid results fsync {CSV_FSYNC!r}, using default batch")
+    CSV_FSYNC = "batch"
+
+if RAW_FORMAT not in RAW_FORMATS:
+    logger.warning(f"Invalid results raw_format {RAW_FORMAT!r}, using default json")
+    RAW_FORMAT = "json"
+
+if RAW_COMPRESSION not in RAW_COMPRESSIONS:
+    logger.warning(f"Invalid results raw_compression {RAW_COMPRESSION!r}, using default gzip")
+    RAW_COMPRESSION = "gzip"
+elif RAW_COMPRESSION == "zstd" and not zstd_available():
+    logger.warning("zstd raw compression needs the zstandard package, using gzip")
+    RAW_COMPRESSION = "gzip"
+
+WIFI_SOURCE = config.get('wifi', 'source', fallback='termux').strip()
+WIFI_INTERVAL_S = config.getfloat('wifi', 'interval_s', fallback=2.0)
+WIFI_BUFFER_SIZE = config.getint('wifi', 'buffer_size', fallback=600)
+if WIFI_INTERVAL_S < 0.5 or WIFI_INTERVAL_S > 60:
+    logger.warning(f"Invalid wifi interval_s {WIFI_INTERVAL_S}, using default 2")
+    WIFI_INTERVAL_S = 2.0
+
+if WIFI_BUFFER_SIZE < 1:
+    logger.warning(f"Invalid wifi buffer_size {WIFI_BUFFER_SIZE}, using default 600")
+    WIFI_BUFFER_SIZE = 600
+
+try:
+    make_source(WIFI_SOURCE)
+except ValueError:
+    logger.warning(f"Invalid wifi source {WIFI_SOURCE!r}, using default termux")
+    WIFI_SOURCE = "termux"
+
+if REACHABILITY_TTL_S < 0:
+    logger.warning(f"Invalid server reachability_ttl_s {REACHABILITY_TTL_S}, using default 30")
+    REACHABILITY_TTL_S = 30
+
+if TASKS_MAX_FINISHED < 1:
+    logger.warning(f"Invalid tasks max_finished {TASKS_MAX_FINISHED}, using default 200")
+    TASKS_MAX_FINISHED = 200
+
+if TASKS_MEMORY_BUDGET_MB < 1:
+    logger.warning(f"Invalid tasks memory_budget_mb {TASKS_MEMORY_BUDGET_MB}, using default 32")
+    TASKS_MEMORY_BUDGET_MB = 32
+
+if TASKS_SPILL_MAX_FILES < 0:
+    logger.warning(f"Invalid tasks spill_max_files {TASKS_SPILL_MAX_FILES}, using default 1000")
+    TASKS_SPILL_MAX_FILES = 1000
+
+if TASKS_SPILL_TTL_H < 0:
+    logger.warning(f"Invalid tasks spill_ttl_h {TASKS_SPILL_TTL_H}, using default 168")
+    TASKS_SPILL_TTL_H = 168
+
+if TASKS_SWEEP_INTERVAL_S <= 0:
+    logger.warning(f"Invalid tasks sweep_interval_s {TASKS_SWEEP_INTERVAL_S}, using default 60")
+    TASKS_SWEEP_INTERVAL_S = 60
+
 logger.info(f"Server IP: {SERVER_IP}")
 logger.info(f"iperf duration: {IPERF_DURATION}s, parallel streams: {IPERF_PARALLEL}")
 
 os.makedirs(RAW_DIR, exist_ok=True)
 
+class SurveyJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes columnar samples and partial state at the API edge."""
+
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
 app = Flask(__name__, template_folder="templates", static_folder="static")
+app.json = SurveyJSONProvider(app)
 CORS(app)
 
 CSV_HEADER = ["device","point_id","timestamp","ssid","bssid","frequency_mhz","rssi_dbm","link_speed_mbps","iperf_dl_mbps","iperf_ul_mbps","ping_avg_ms","ping_jitter_ms","ping_loss_pct","test_duration_s","notes"]
@@ -95,95 +285,190 @@ if not os.path.exists(CSV_FILE):
     with open(CSV_FILE, "w", newline='') as f:
         csv.writer(f).writerow(CSV_HEADER)
 
-tasks = {}
-tasks_lock = threading.Lock()
+# Raw result files by point and time, for /list_raw
+raw_catalog = RawCatalog(RAW_DIR)
 
-def run_cmd(cmd, timeout=300, retries=0):
-    """Run command with optional retry logic"""
-    attempt = 0
-    max_attempts = retries + 1
-    
-    while attempt < max_attempts:
+# Indexed history of surveys, runs and samples for /results
+results_store = ResultsStore(RESULTS_DB)
+
+# Single appender for CSV_FILE, shared by every task
+results_writer = ResultsWriter(CSV_FILE, header=CSV_HEADER, batch_rows=CSV_BATCH_ROWS,
+                               flush_interval_s=CSV_FLUSH_INTERVAL_S, fsync=CSV_FSYNC)
+
+tasks = TaskRegistry(
+    spill_dir=TASK_SPILL_DIR,
+    max_finished=TASKS_MAX_FINISHED,
+    finished_ttl_s=TASKS_FINISHED_TTL_S,
+    memory_budget_bytes=TASKS_MEMORY_BUDGET_MB * 1024 * 1024,
+    spill_max_files=TASKS_SPILL_MAX_FILES,
+    spill_ttl_s=TASKS_SPILL_TTL_H * 3600,
+    sweep_interval_s=TASKS_SWEEP_INTERVAL_S
+)
+
+# Single event loop thread driving every ping/iperf3 subprocess
+engine = MeasurementEngine()
+
+# iperf3 endpoints leased per measurement stage
+if SERVERS_LOCAL_COUNT:
+    server_pool = ServerPool.local_servers(SERVERS_LOCAL_COUNT, SERVERS_LOCAL_HOST, SERVERS_LOCAL_BASE_PORT)
+else:
+    try:
+        server_pool = ServerPool(parse_endpoints(SERVER_ENDPOINTS, SERVER_IP))
+    except ValueError as e:
+        logger.warning(f"Invalid servers endpoints ({e}), using {SERVER_IP}")
+        server_pool = ServerPool(parse_endpoints("", SERVER_IP))
+logger.info(f"iperf3 servers: {', '.join(str(e) for e in server_pool.endpoints)}")
+
+# Admission control: at most max_concurrent jobs run, up to max_queued wait
+job_queue = JobQueue(
+    engine,
+    max_concurrent=JOBS_MAX_CONCURRENT or len(server_pool.endpoints),
+    max_queued=JOBS_MAX_QUEUED
+)
+
+# Idle probes taken before the throughput stages in "loaded" latency mode
+LOADED_IDLE_PROBES = 20
+
+# Fixed per-point overhead (reachability check, Wi-Fi metadata, stage setup) for ETAs
+POINT_OVERHEAD_S = 5
+
+def latency_probe_count(duration, latency_mode="idle"):
+    """Probes in the idle latency stage: [latency] count, or one per second of duration."""
+    count = LATENCY_COUNT or max(1, int(duration))
+    if latency_mode == "loaded":
+        # Latency is probed during the transfers after a short idle baseline
+        count = min(count, LOADED_IDLE_PROBES)
+    return count
+
+def estimate_point_s(duration, latency_mode="idle", bidir=False):
+    """Expected run time of one point: ping, download and upload stages."""
+    # --bidir measures both directions in a single stage
+    transfer_s = duration if bidir else 2 * duration
+    interval_s = ping_interval_s(LATENCY_INTERVAL_S) if LATENCY_PROBE == "icmp" else LATENCY_INTERVAL_S
+    return transfer_s + latency_probe_count(duration, latency_mode) * interval_s + POINT_OVERHEAD_S
+
+def _queue_full_response(qf):
+    resp = jsonify({
+        "ok": False,
+        "error": "Cola de mediciones llena. Inténtalo de nuevo más tarde."
+    })
+    resp.status_code = 429
+    if qf.retry_after_s is not None:
+        resp.headers["Retry-After"] = str(max(1, int(round(qf.retry_after_s))))
+    return resp
+
+@atexit.register
+def _stop_processes():
+    supervisor.kill_all()
+    # Rows still queued for the CSV are written before exit
+    results_writer.close()
+    tasks.close()
+    if server_pool.local:
         try:
-            r = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
-            return r.stdout, r.stderr, r.returncode
-        except subprocess.TimeoutExpired:
-            attempt += 1
-            if attempt >= max_attempts:
-                return "", "timeout after retries", -1
-            logger.warning(f"Command timeout, retry {attempt}/{retries}")
-            time.sleep(1)
-        except Exception as e:
-            attempt += 1
-            if attempt >= max_attempts:
-                return "", str(e), -1
-            logger.warning(f"Command error: {e}, retry {attempt}/{retries}")
-            time.sleep(1)
-    
-    return "", "max retries exceeded", -1
+            engine.run(server_pool.close(), timeout=10)
+        except Exception:
+            pass
+
+# Seconds between checks of the proceed/cancel flags while a manual survey waits
+FLAG_POLL_S = 0.1
+
+# Seconds an idle SSE stream waits before sending a keep-alive comment
+SSE_HEARTBEAT_S = 15
+
+def _parse_event_id(value):
+    """Parse an SSE event id of the form 'epoch:samples:logs' into a cursor tuple."""
+    try:
+        epoch, n_samples, n_logs = (int(x) for x in value.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    return epoch, n_samples, n_logs
+
+PING_TIME_RE = re.compile(r'time=([\d\.]+)')
 
 def parse_ping_time(line):
-    m = re.search(r'time=([\d\.]+)', line)
+    m = PING_TIME_RE.search(line)
     if m:
         try: return float(m.group(1))
         except: return None
     return None
 
-def _percentile(values, p):
-    if not values: return None
-    arr = sorted(values)
-    k = (len(arr)-1) * (p/100.0)
-    f = int(k); c = min(f+1, len(arr)-1)
-    if f == c: return arr[int(k)]
-    return arr[f] * (c-k) + arr[c] * (k-f)
-
-def worker_run_point(task_id, device, point, run_index, duration, parallel):
-    with tasks_lock:
-        tasks[task_id] = tasks.get(task_id, {})
-        tasks[task_id]["status"] = "running"
-        tasks[task_id]["partial"] = {
-            "dl_mbps": 0.0, "ul_mbps": 0.0,
-            "ping_avg_ms": None, "ping_jitter_ms": None,
-            "ping_p50_ms": None, "ping_p95_ms": None, "ping_loss_pct": None,
-            "progress_pct": 0, "elapsed_s": 0, "stage": "ping"
-        }
-        tasks[task_id]["seq"] = tasks[task_id].get("seq", 0) + 1
-        tasks[task_id]["logs"] = tasks[task_id].get("logs", []) + [f"Task {task_id} started: {point} run:{run_index}"]
-        tasks[task_id]["samples"] = []  # timeseries t, dl, ul, ping, stage
-        tasks[task_id]["_last_sample_ts"] = 0.0
-        tasks[task_id]["_stage_start_ts"] = 0.0
+def _blank(value):
+    """CSV cell for an optional number: "" when missing, no ".0" on whole numbers."""
+    if value is None:
+        return ""
+    return int(value) if float(value).is_integer() else value
 
-    start_ts = time.time()
-    stage_start_ts = start_ts
+def worker_run_point(task_id, device, point, run_index, duration, parallel, latency_mode="idle", bidir=False):
+    """Run one point measurement on the engine loop and wait for it to finish."""
+    return engine.run(run_point_async(task_id, device, point, run_index, duration, parallel, latency_mode, bidir))
 
-    # Verificar conectividad con el servidor antes de iniciar
-    try:
-        ping_check = subprocess.run(
-            ["ping", "-c", "1", "-W", "2", SERVER_IP],
-            capture_output=True,
-            timeout=3
-        )
-        if ping_check.returncode != 0:
-            with tasks_lock:
-                tasks[task_id]["logs"].append(f"Advertencia: No se puede alcanzar el servidor {SERVER_IP}, continuando con pruebas...")
-                tasks[task_id]["seq"] = tasks[task_id].get("seq", 0) + 1
-            logger.warning(f"Server {SERVER_IP} is not reachable, continuing with tests")
-    except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"Advertencia verificando servidor: {e}, continuando con pruebas...")
-        logger.warning(f"Server check failed: {e}, continuing with tests")
+def _mark_cancelled(task, message):
+    with task.mutate():
+        if task.status not in TERMINAL_STATUSES:
+            task.status = "cancelled"
+        task.logs.append(message)
+
+async def _off_loop(func, *args, **kwargs):
+    """Run a blocking call (file, SQLite, subprocess) in the default executor, off the engine loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+async def _ping_once(host):
+    _, _, rc = await run_exec(["ping", "-c", "1", "-W", "2", host], timeout=3)
+    return rc == 0
+
+# Server reachability, shared by consecutive points for a short TTL
+reachability = ReachabilityCache(_ping_once, ttl_s=REACHABILITY_TTL_S)
+
+async def _check_server(task):
+    """
+    Warn in the task log for each iperf3 pool host that is unreachable (any
+    of them may be leased for a stage); the measurement goes on regardless.
+    """
+    hosts = server_pool.hosts()
+    for host, ok in zip(hosts, await asyncio.gather(*(reachability.check(h) for h in hosts))):
+        if not ok:
+            task.log(f"Advertencia: No se puede alcanzar el servidor {host}, continuando con pruebas...")
+            logger.warning(f"Server {host} is not reachable, continuing with tests")
 
-    # Intentar metadata WiFi (no bloqueante)
-    wifi_json = {}
+# Wi-Fi connection info, sampled in the background while any point runs
+wifi_telemetry = WifiTelemetry(make_source(WIFI_SOURCE), interval_s=WIFI_INTERVAL_S, capacity=WIFI_BUFFER_SIZE)
+
+async def run_point_async(task_id, device, point, run_index, duration, parallel, latency_mode="idle", bidir=False):
+    """Measure one point; a cancelled point ends with status "cancelled"."""
+    task = tasks.get(task_id) or tasks.create(task_id)
+    # Pre-flight runs alongside the first stage instead of delaying its first sample
+    server_check = asyncio.ensure_future(_check_server(task))
     try:
-        wifi_out, _, _ = run_cmd("termux-wifi-connectioninfo", timeout=4)
-        wifi_json = json.loads(wifi_out) if wifi_out else {}
-    except Exception:
-        wifi_json = {}
+        async with wifi_telemetry.session():
+            wifi_info = asyncio.ensure_future(wifi_telemetry.wait_latest(timeout=5))
+            try:
+                await _measure_point(task, device, point, run_index, duration, parallel, latency_mode, bidir, wifi_info)
+            finally:
+                wifi_info.cancel()
+    except asyncio.CancelledError:
+        _mark_cancelled(task, "Task cancelled")
+        raise
+    finally:
+        server_check.cancel()
+
+async def _measure_point(task, device, point, run_index, duration, parallel, latency_mode, bidir, wifi_info):
+    task_id = task.task_id
+
+    def stop_requested():
+        # Polled by the process supervisor: cancelling a survey stops its running point too
+        return task.cancel or (task.parent is not None and task.parent.cancel)
 
-    expected_pings = max(1, int(duration))
+    with task.mutate():
+        task.status = "running"
+        task.partial = PartialState(dl_mbps=0.0, ul_mbps=0.0, progress_pct=0, elapsed_s=0, stage="ping")
+        task.logs.append(f"Task {task_id} started: {point} run:{run_index}")
+    task.reset_samples()  # timeseries t, dl, ul, ping, stage
 
-    def update_partial(dl=None, ul=None, ping_vals=None, progress=None, note=None, force_sample=False, stage=None):
+    start_ts = time.time()
+    stage_start_ts = start_ts
+    last_sample_ts = 0.0
+
+    def update_partial(dl=None, ul=None, ping=None, progress=None, note=None, force_sample=False, stage=None):
         """
         Update partial results and track stage-specific timing.
         
@@ -191,272 +476,508 @@ def worker_run_point(task_id, device, point, run_index, duration, parallel):
         for that new stage. This allows the live chart to show each stage independently
         with its own time axis (0 to duration seconds) rather than cumulative time.
         """
-        nonlocal stage_start_ts
+        nonlocal stage_start_ts, last_sample_ts
         now = time.time()
-        with tasks_lock:
-            partial = tasks[task_id].setdefault("partial", {})
+        with task.mutate():
+            # Copy-on-write: snapshots taken by readers keep the previous state
+            partial = task.partial.copy()
             if dl is not None:
-                partial["dl_mbps"] = float(dl)
+                partial.dl_mbps = float(dl)
             if ul is not None:
-                partial["ul_mbps"] = float(ul)
-            if ping_vals is not None:
-                times = ping_vals
-                avg = sum(times)/len(times) if times else None
-                jitter = None
-                if len(times) > 1:
-                    diffs = [abs(times[i] - times[i-1]) for i in range(1, len(times))]
-                    jitter = sum(diffs)/len(diffs)
-                p50 = _percentile(times, 50) if times else None
-                p95 = _percentile(times, 95) if times else None
-                loss = None
-                try:
-                    loss = max(0.0, min(100.0, round((1.0 - (len(times)/expected_pings))*100.0, 2)))
-                except:
-                    loss = None
-                partial["ping_avg_ms"] = avg
-                partial["ping_jitter_ms"] = jitter
-                partial["ping_p50_ms"] = p50
-                partial["ping_p95_ms"] = p95
-                partial["ping_loss_pct"] = loss
+                partial.ul_mbps = float(ul)
+            if ping is not None:
+                # Summary dict from LatencyStats, computed outside the lock
+                partial.ping_avg_ms = ping["avg_ms"]
+                partial.ping_jitter_ms = ping["jitter_ms"]
+                partial.ping_p50_ms = ping["p50_ms"]
+                partial.ping_p95_ms = ping["p95_ms"]
+                partial.ping_p99_ms = ping["p99_ms"]
+                partial.ping_loss_pct = ping["loss_pct"]
             if progress is not None:
-                partial["progress_pct"] = int(progress)
+                partial.progress_pct = int(progress)
             
             # Update stage if provided
             if stage is not None:
-                partial["stage"] = stage
-                tasks[task_id]["_stage_start_ts"] = now
+                partial.stage = stage
                 stage_start_ts = now
             
             # Calculate elapsed time relative to current stage
-            current_stage_start = tasks[task_id].get("_stage_start_ts") or start_ts
-            stage_elapsed = int(now - current_stage_start)
-            partial["elapsed_s"] = stage_elapsed
+            stage_elapsed = int(now - stage_start_ts)
+            partial.elapsed_s = stage_elapsed
+            wifi = wifi_telemetry.latest(max_age_s=3 * WIFI_INTERVAL_S)
+            if wifi is not None:
+                partial.rssi_dbm = wifi.rssi_dbm
+                partial.link_speed_mbps = wifi.link_speed_mbps
+            task.partial = partial
             
             if note:
-                tasks[task_id]["logs"].append(note)
+                task.logs.append(note)
 
             # Append sample (máx ~10 Hz): cada 0.1s o si force_sample
-            last_s = tasks[task_id].get("_last_sample_ts") or 0.0
-            if force_sample or (now - last_s >= 0.1):
+            if force_sample or (now - last_sample_ts >= 0.1):
                 # Time relative to current stage
-                t_s = round(now - current_stage_start, 2)
-                sample = {
-                    "t": t_s,
-                    "dl": partial.get("dl_mbps"),
-                    "ul": partial.get("ul_mbps"),
-                    "ping": partial.get("ping_avg_ms"),
-                    "stage": partial.get("stage", "unknown")
-                }
-                tasks[task_id]["samples"].append(sample)
-                tasks[task_id]["_last_sample_ts"] = now
+                t_s = round(now - stage_start_ts, 2)
+                task.samples.append(t_s, partial.dl_mbps, partial.ul_mbps, partial.ping_avg_ms, partial.stage or "unknown",
+                                    rssi=partial.rssi_dbm, link=partial.link_speed_mbps)
+                last_sample_ts = now
 
-            tasks[task_id]["seq"] = tasks[task_id].get("seq", 0) + 1
+    # Probe kind for this point; switches to icmp if the echo responder is absent
+    probe_mode = LATENCY_PROBE
+
+    def probe_interval_s():
+        return ping_interval_s(LATENCY_INTERVAL_S) if probe_mode == "icmp" else LATENCY_INTERVAL_S
+
+    async def run_latency_probe(stats, count, should_stop, host=SERVER_IP, finished=None):
+        """
+        Send `count` latency probes to host at the configured interval into stats, publishing live values.
+
+        Uses the UDP/TCP echo responder when configured and falls back to
+        `ping -i` if it doesn't answer. should_stop() cancels the probe; setting
+        the finished event (end of a loaded stage) ends it normally. Returns the
+        number of probes sent (due, for ping) when the probe ended, so a probe
+        ended early doesn't count unsent probes as lost.
+        """
+        nonlocal probe_mode
+        if probe_mode != "icmp":
+            sent = 0
+
+            def stop_probing():
+                return should_stop() or (finished is not None and finished.is_set())
 
-    ping_samples = []
-    def ping_worker():
-        try:
-            # Set stage to ping at the beginning
-            update_partial(stage="ping", note="Starting ping test", force_sample=True)
-            
-            p = subprocess.Popen(["ping", "-c", str(int(duration)), SERVER_IP],
-                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            line_count = 0
-            for line in p.stdout:
-                line = line.strip()
-                t = parse_ping_time(line)
-                if t is not None:
-                    ping_samples.append(t)
-                    update_partial(ping_vals=ping_samples, force_sample=True)
-                line_count += 1
-                # Safety check: don't process too many lines
-                if line_count > duration * MAX_LINES_PER_SECOND:
-                    with tasks_lock:
-                        tasks[task_id]["logs"].append("Warning: ping output excessive, stopping")
-                    p.terminate()
-                    break
-            p.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            with tasks_lock:
-                tasks[task_id]["logs"].append("ping timed out")
             try:
-                p.kill()
-            except:
-                pass
-        except Exception as e:
-            with tasks_lock:
-                tasks[task_id]["logs"].append(f"ping error: {e}")
+                async with aclosing(probe_rtts(probe_mode, host, LATENCY_ECHO_PORT, count,
+                                               LATENCY_INTERVAL_S, should_stop=stop_probing)) as rtts:
+                    async for rtt in rtts:
+                        sent += 1
+                        if rtt is not None:
+                            stats.add(rtt)
+                            update_partial(ping=stats.summary(sent), force_sample=True)
+                return sent
+            except ProbeUnavailable as e:
+                task.log(f"{probe_mode.upper()} echo responder not available ({e}), falling back to ping")
+                logger.warning(f"Echo responder {host}:{LATENCY_ECHO_PORT} not available: {e}")
+                probe_mode = "icmp"
+            except Exception as e:
+                task.log(f"latency probe error: {e}")
+                return sent
+        return await run_ping(stats, count, should_stop, host, finished)
 
-    ping_thread = threading.Thread(target=ping_worker, daemon=True)
-    ping_thread.start()
+    async def run_ping(stats, count, should_stop, host, finished):
+        interval = probe_interval_s()
+        probe_start = time.monotonic()
 
-    # Wait for ping to complete before starting download
-    try:
-        ping_thread.join(timeout=duration + 5)
-        if ping_thread.is_alive():
-            with tasks_lock:
-                tasks[task_id]["logs"].append("Warning: ping thread did not finish in time")
-    except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"Error joining ping thread: {e}")
+        def due():
+            return min(count, max(len(stats), int((time.monotonic() - probe_start) / interval)))
 
-    # iperf3 DL
-    dl_mbps_final = 0.0
-    try:
-        # Set stage to download at the beginning
-        update_partial(stage="download", note="Starting download test", force_sample=True)
-        
-        cmd_dl = f"iperf3 -c {SERVER_IP} -t {int(duration)} -P {int(parallel)}"
-        p = subprocess.Popen(cmd_dl, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        completed = False
         line_count = 0
-        for line in p.stdout:
-            line = line.strip()
-            m = re.search(r'([\d\.]+)\s+Mbits/sec', line)
-            if m:
-                try:
-                    val = float(m.group(1))
-                    update_partial(dl=val)
-                except:
-                    pass
-            if line:
-                with tasks_lock:
-                    tasks[task_id]["logs"].append(line if len(line) < 1000 else line[:1000])
-            line_count += 1
-            # Safety limit on lines processed
-            if line_count > MAX_OUTPUT_LINES:
-                with tasks_lock:
-                    tasks[task_id]["logs"].append("Warning: iperf DL output excessive")
-                break
-        
-        # Wait with timeout
+        argv = ["ping", "-c", str(int(count)), "-i", f"{interval:g}", host]
         try:
-            p.wait(timeout=duration + 10)
-        except subprocess.TimeoutExpired:
-            with tasks_lock:
-                tasks[task_id]["logs"].append("iperf3 DL timed out")
-            p.terminate()
-            try:
-                p.wait(timeout=5)
-            except:
-                p.kill()
-        
-        # Get final result with JSON
-        dl_out, _, _ = run_cmd(f"iperf3 -c {SERVER_IP} -t 1 -P {int(parallel)} --json", timeout=10)
+            async with aclosing(stream_lines(argv, timeout=count * interval + 5, should_stop=should_stop)) as lines:
+                async for line in (lines if finished is None else until_set(lines, finished)):
+                    t = parse_ping_time(line)
+                    if t is not None:
+                        stats.add(t)
+                        update_partial(ping=stats.summary(due()), force_sample=True)
+                    line_count += 1
+                    # Safety check: don't process too many lines
+                    if line_count > count * MAX_LINES_PER_PROBE:
+                        task.log("Warning: ping output excessive, stopping")
+                        break
+                else:
+                    completed = finished is None or not finished.is_set()
+        except asyncio.TimeoutError:
+            task.log("ping timed out")
+        except ProcessCancelled:
+            pass
+        except Exception as e:
+            task.log(f"ping error: {e}")
+        return count if completed else due()
+
+    loaded = latency_mode == "loaded"
+    # Latency under load: one series per throughput stage, probed while it runs
+    loaded_stats = {}
+    loaded_expected = {}
+
+    ping_stats = LatencyStats()
+    idle_probes = latency_probe_count(duration, latency_mode)
+    # Set stage to ping at the beginning
+    update_partial(stage="ping", note="Starting ping test", force_sample=True)
+    task.log(f"Latency probe: {probe_mode}, {idle_probes} probes every {probe_interval_s() * 1000:.0f} ms")
+    expected_pings = await run_latency_probe(ping_stats, idle_probes, stop_requested)
+
+    # Exact percentiles once per stage; live values above come from the sketches
+    idle_ping = ping_stats.summary(expected_pings, exact=True) if len(ping_stats) else LatencyStats().summary()
+    if len(ping_stats):
+        update_partial(ping=idle_ping)
+    if stop_requested():
+        return _mark_cancelled(task, "Task cancelled")
+
+    def iperf_argv(endpoint, extra_args, json_stream):
+        argv = ["iperf3", "-c", endpoint.host, "-p", str(endpoint.port),
+                "-t", str(int(duration)), "-P", str(int(parallel))] + extra_args
+        if json_stream:
+            argv.append("--json-stream")
+        return argv
+
+    async def run_iperf_stage(label, extra_args, key):
+        """
+        Run one iperf3 client pass and return its full-run throughput in Mbps
+        (a {"dl": ..., "ul": ...} dictionary for the bidir stage).
+
+        A single invocation feeds both the live partial values (one per
+        reporting interval) and the final result, using --json-stream when the
+        installed iperf3 supports it and plain text parsing otherwise. In
+        loaded latency mode the ping probe runs for as long as the transfer.
+
+        Every direction's interval throughput feeds a ConvergenceMonitor; in
+        adaptive mode the stage stops as soon as all directions converged and
+        reports the converged mean. Stop reason and achieved confidence are
+        kept in iperf_stops for the result.
+        """
+        json_stream = await _off_loop(iperf_supports_json_stream)
+        if key == "bidir":
+            parser = BidirStreamParser(json_stream=json_stream, streams=parallel)
+        else:
+            parser = IperfStreamParser(json_stream=json_stream, streams=parallel)
+        iperf_intervals[key] = parser.intervals
+        directions = {"dl": parser.parsers["dl"], "ul": parser.parsers["ul"]} if key == "bidir" else {key: parser}
+        monitors = {d: ConvergenceMonitor(IPERF_ADAPTIVE_TOLERANCE_PCT, IPERF_ADAPTIVE_CONFIDENCE,
+                                          IPERF_ADAPTIVE_MIN_S, IPERF_ADAPTIVE_OMIT_S)
+                    for d in directions}
+        stop_reason = "duration"
+        if server_pool.would_wait():
+            task.log(f"Waiting for a free iperf3 server (queue position {server_pool.waiting + 1})")
+        line_count = 0
+        probe = None
+        transfer_done = asyncio.Event()
         try:
-            j = json.loads(dl_out) if dl_out else {}
-            dl_bps = (j.get("end", {}).get("sum_received", {}).get("bits_per_second")
-                      or j.get("end", {}).get("sum_sent", {}).get("bits_per_second") or 0)
-            dl_mbps_final = round(dl_bps / 1_000_000, 2) if dl_bps else tasks[task_id]["partial"].get("dl_mbps", 0.0)
-        except:
-            dl_mbps_final = tasks[task_id]["partial"].get("dl_mbps", 0.0)
-        update_partial(dl=dl_mbps_final, force_sample=True)
-    except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"iperf3 DL error: {e}")
+            async with server_pool.lease() as endpoint, \
+                    aclosing(stream_lines(iperf_argv(endpoint, extra_args, json_stream), timeout=duration + 10,
+                                         should_stop=stop_requested)) as lines:
+                task.log(f"iperf3 {label} server: {endpoint}")
+                if loaded:
+                    # Started once a server is leased, so queueing time isn't probed as load
+                    probe = asyncio.ensure_future(run_latency_probe(
+                        loaded_stats.setdefault(key, LatencyStats()), int((duration + 2) / probe_interval_s()),
+                        stop_requested, endpoint.host, transfer_done
+                    ))
+                async for line in lines:
+                    val = parser.feed(line)
+                    if val is not None:
+                        for d in (val if key == "bidir" else (key,)):
+                            interval = directions[d].intervals[-1]
+                            monitors[d].add(interval["start"], interval["end"], interval["mbps"])
+                    if val is not None and key == "bidir":
+                        # Directions report separately in text mode, together in JSON
+                        update_partial(**val)
+                        rates = ", ".join(f"{k.upper()} {v:.2f}" for k, v in val.items())
+                        note = f"iperf3 {label}: {rates} Mbits/sec"
+                    elif val is not None:
+                        # One update per reporting interval, not per stream line
+                        update_partial(**{key: val})
+                        note = f"iperf3 {label}: {val:.2f} Mbits/sec"
+                    elif parser.last_was_report:
+                        note = None
+                    else:
+                        line = line.strip()
+                        note = line if line and not line.startswith("{") else None
+                    if note:
+                        task.log(note if len(note) < 1000 else note[:1000])
+                    line_count += 1
+                    # Safety limit on lines processed
+                    if line_count > MAX_OUTPUT_LINES:
+                        task.log(f"Warning: iperf {label} output excessive")
+                        stop_reason = "output_limit"
+                        break
+                    if IPERF_ADAPTIVE and all(m.converged for m in monitors.values()):
+                        elapsed = max(m.elapsed_s for m in monitors.values())
+                        task.log(f"iperf3 {label} converged after {elapsed:.0f}s "
+                                 f"(±{IPERF_ADAPTIVE_TOLERANCE_PCT:g}% at {IPERF_ADAPTIVE_CONFIDENCE:.0%}), stopping early")
+                        stop_reason = "converged"
+                        break
+        except asyncio.TimeoutError:
+            task.log(f"iperf3 {label} timed out")
+            stop_reason = "timeout"
+        except ProcessCancelled:
+            task.log(f"iperf3 {label} stopped")
+            stop_reason = "cancelled"
+        except BaseException:
+            if probe is not None:
+                probe.cancel()
+            raise
+        if probe is not None:
+            transfer_done.set()
+            loaded_expected[key] = await probe
+
+        if parser.error:
+            task.log(f"iperf3 {label} error: {parser.error}")
+            stop_reason = "error"
+        for d, monitor in monitors.items():
+            iperf_stops[d] = dict(monitor.summary(), reason=stop_reason)
+        if stop_reason == "converged":
+            # No end-of-run summary when stopped early; slow-start intervals stay out of the mean
+            converged = {d: m.mean_mbps() for d, m in monitors.items()}
+            return converged if key == "bidir" else converged[key]
+        return parser.result_mbps()
+
+    def loaded_summary(key):
+        """Exact summary of a loaded latency series, or None if there is none."""
+        stats = loaded_stats.get(key)
+        if not stats:
+            return None
+        return stats.summary(loaded_expected.get(key), exact=True)
 
-    # iperf3 UL (reverse)
+    # Per-interval (and per-stream) throughput of each stage, kept for the raw file
+    iperf_intervals = {}
+    # Stop reason and achieved confidence per direction
+    iperf_stops = {}
+
+    if bidir and not await _off_loop(iperf_supports_bidir):
+        task.log("iperf3 does not support --bidir, running download and upload separately")
+        bidir = False
+
+    dl_mbps_final = 0.0
     ul_mbps_final = 0.0
-    try:
-        # Set stage to upload at the beginning
-        update_partial(stage="upload", note="Starting upload test", force_sample=True)
-        
-        cmd_ul = f"iperf3 -c {SERVER_IP} -t {int(duration)} -P {int(parallel)} -R"
-        p = subprocess.Popen(cmd_ul, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
-        line_count = 0
-        for line in p.stdout:
-            line = line.strip()
-            m = re.search(r'([\d\.]+)\s+Mbits/sec', line)
-            if m:
-                try:
-                    val = float(m.group(1))
-                    update_partial(ul=val)
-                except:
-                    pass
-            if line:
-                with tasks_lock:
-                    tasks[task_id]["logs"].append(line if len(line) < 1000 else line[:1000])
-            line_count += 1
-            # Safety limit on lines processed
-            if line_count > MAX_OUTPUT_LINES:
-                with tasks_lock:
-                    tasks[task_id]["logs"].append("Warning: iperf UL output excessive")
-                break
-        
-        # Wait with timeout
+    if bidir:
+        # iperf3 --bidir: both directions in one stage
         try:
-            p.wait(timeout=duration + 10)
-        except subprocess.TimeoutExpired:
-            with tasks_lock:
-                tasks[task_id]["logs"].append("iperf3 UL timed out")
-            p.terminate()
-            try:
-                p.wait(timeout=5)
-            except:
-                p.kill()
-        
-        # Get final result with JSON
-        ul_out, _, _ = run_cmd(f"iperf3 -c {SERVER_IP} -t 1 -P {int(parallel)} -R --json", timeout=10)
+            update_partial(stage="bidir", note="Starting bidirectional test", force_sample=True,
+                           ping=LatencyStats().summary() if loaded else None)
+            bidir_mbps = await run_iperf_stage("bidir", ["--bidir"], "bidir")
+            dl_mbps_final, ul_mbps_final = bidir_mbps["dl"], bidir_mbps["ul"]
+            update_partial(dl=dl_mbps_final, ul=ul_mbps_final, force_sample=True, ping=loaded_summary("bidir"))
+        except Exception as e:
+            task.log(f"iperf3 bidir error: {e}")
+        if stop_requested():
+            return _mark_cancelled(task, "Task cancelled")
+    else:
+        # iperf3 DL
         try:
-            j = json.loads(ul_out) if ul_out else {}
-            ul_bps = (j.get("end", {}).get("sum_received", {}).get("bits_per_second")
-                      or j.get("end", {}).get("sum_sent", {}).get("bits_per_second") or 0)
-            ul_mbps_final = round(ul_bps / 1_000_000, 2) if ul_bps else tasks[task_id]["partial"].get("ul_mbps", 0.0)
-        except:
-            ul_mbps_final = tasks[task_id]["partial"].get("ul_mbps", 0.0)
-        update_partial(ul=ul_mbps_final, force_sample=True)
-    except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"iperf3 UL error: {e}")
+            # Set stage to download at the beginning
+            update_partial(stage="download", note="Starting download test", force_sample=True,
+                           ping=LatencyStats().summary() if loaded else None)
+            dl_mbps_final = await run_iperf_stage("DL", [], "dl")
+            update_partial(dl=dl_mbps_final, force_sample=True, ping=loaded_summary("dl"))
+        except Exception as e:
+            task.log(f"iperf3 DL error: {e}")
+        if stop_requested():
+            return _mark_cancelled(task, "Task cancelled")
 
-    with tasks_lock:
-        partial_ping = tasks[task_id].get("partial", {})
-        samples = tasks[task_id].get("samples", [])
-        # clamp size of samples if needed (optional)
+        # iperf3 UL (reverse)
+        try:
+            # Set stage to upload at the beginning
+            update_partial(stage="upload", note="Starting upload test", force_sample=True,
+                           ping=LatencyStats().summary() if loaded else None)
+            ul_mbps_final = await run_iperf_stage("UL", ["-R"], "ul")
+            update_partial(ul=ul_mbps_final, force_sample=True, ping=loaded_summary("ul"))
+        except Exception as e:
+            task.log(f"iperf3 UL error: {e}")
+        if stop_requested():
+            return _mark_cancelled(task, "Task cancelled")
+
+    # Usually cached long ago; attached to the result once ready
+    wifi = await wifi_info
+    wifi_json = dict(wifi_telemetry.info) if wifi is not None else {}
+    partial_ping = task.snapshot().partial
+    # Stages are done: the columnar buffer is final and shared with the result as-is
+    samples = task.samples
 
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
     final = {
         "device": device,
         "point": point,
         "timestamp": timestamp,
-        "ssid": wifi_json.get("ssid",""),
-        "bssid": wifi_json.get("bssid",""),
-        "rssi": wifi_json.get("rssi",""),
-        "frequency": wifi_json.get("frequency",""),
-        "link_speed": wifi_json.get("linkSpeed",""),
+        "ssid": wifi.ssid if wifi else "",
+        "bssid": wifi.bssid if wifi else "",
+        "rssi": _blank(wifi.rssi_dbm) if wifi else "",
+        "frequency": _blank(wifi.frequency_mhz) if wifi else "",
+        "link_speed": _blank(wifi.link_speed_mbps) if wifi else "",
         "iperf_dl_mbps": dl_mbps_final,
         "iperf_ul_mbps": ul_mbps_final,
-        "ping_avg_ms": partial_ping.get("ping_avg_ms"),
-        "ping_jitter_ms": partial_ping.get("ping_jitter_ms"),
-        "ping_p50_ms": partial_ping.get("ping_p50_ms"),
-        "ping_p95_ms": partial_ping.get("ping_p95_ms"),
-        "ping_loss_pct": partial_ping.get("ping_loss_pct"),
+        "ping_avg_ms": idle_ping["avg_ms"],
+        "ping_jitter_ms": idle_ping["jitter_ms"],
+        "ping_p50_ms": idle_ping["p50_ms"],
+        "ping_p95_ms": idle_ping["p95_ms"],
+        "ping_p99_ms": idle_ping["p99_ms"],
+        "ping_loss_pct": idle_ping["loss_pct"],
+        "latency_mode": latency_mode,
+        "bidir": bidir,
         "duration_s": duration,
         "samples": samples  # << incluir timeseries
     }
+    if loaded:
+        # ping_* above is the idle series; samples carry each series under its stage
+        for key in (("bidir",) if bidir else ("dl", "ul")):
+            summary = loaded_summary(key) or LatencyStats().summary()
+            for name, value in summary.items():
+                final[f"ping_{key}_loaded_{name}"] = value
+    final["iperf_adaptive"] = IPERF_ADAPTIVE
+    final["iperf_confidence"] = IPERF_ADAPTIVE_CONFIDENCE
+    for key, stop in iperf_stops.items():
+        final[f"iperf_{key}_stop_reason"] = stop["reason"]
+        final[f"iperf_{key}_ci_pct"] = stop["ci_pct"]
+        final[f"iperf_{key}_elapsed_s"] = stop["elapsed_s"]
+
+    raw_compression = RAW_COMPRESSION if RAW_FORMAT == "compact" else None
+    raw_name = f"{point}_{run_index}_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}{RAW_EXTENSIONS[raw_compression]}"
+    raw_file = os.path.join(RAW_DIR, raw_name)
+
+    def save_raw():
+        with raw_catalog.writing(raw_name):
+            write_raw(raw_file, {"wifi": wifi_json, "partial": partial_ping, "final": final,
+                                 "iperf_intervals": iperf_intervals}, raw_compression)
+
+    def save_run():
+        results_store.add_run(final, samples.rows(), task_id=task_id,
+                              survey_id=task.parent.task_id if task.parent else None,
+                              run_index=run_index, raw_file=os.path.basename(raw_file))
 
-    raw_file = os.path.join(RAW_DIR, f"{point}_{run_index}_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json")
+    # Off the loop: serializing, compressing and inserting a run shouldn't stall other measurements
     try:
-        with open(raw_file, "w") as f:
-            json.dump({"wifi": wifi_json, "partial": tasks[task_id].get("partial",{}), "final": final}, f, indent=2)
+        await _off_loop(save_raw)
     except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"Error saving raw: {e}")
+        task.log(f"Error saving raw: {e}")
 
     try:
-        with open(CSV_FILE, "a", newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([device, point, timestamp, final["ssid"], final["bssid"], final["frequency"], final["rssi"], final["link_speed"], final["iperf_dl_mbps"], final["iperf_ul_mbps"], final["ping_avg_ms"], final["ping_jitter_ms"], final["ping_loss_pct"], duration, f"run:{run_index}"])
+        await _off_loop(save_run)
     except Exception as e:
-        with tasks_lock:
-            tasks[task_id]["logs"].append(f"CSV write error: {e}")
-
-    with tasks_lock:
-        tasks[task_id]["status"] = "finished"
-        tasks[task_id]["result"] = final
-        tasks[task_id]["raw_file"] = os.path.basename(raw_file)
-        tasks[task_id]["seq"] = tasks[task_id].get("seq", 0) + 1
-        tasks[task_id]["logs"].append("Task finished")
+        task.log(f"Results DB error: {e}")
+
+    try:
+        results_writer.write([device, point, timestamp, final["ssid"], final["bssid"], final["frequency"], final["rssi"], final["link_speed"], final["iperf_dl_mbps"], final["iperf_ul_mbps"], final["ping_avg_ms"], final["ping_jitter_ms"], final["ping_loss_pct"], duration, f"run:{run_index}"])
+    except Exception as e:
+        task.log(f"CSV write error: {e}")
+
+    with task.mutate():
+        task.status = "finished"
+        task.result = final
+        task.raw_file = os.path.basename(raw_file)
+        task.logs.append("Task finished")
     return
 
+async def run_survey_async(p_id, device, points, repeats, manual, latency_mode="idle", bidir=False, planner=None):
+    """
+    Run every point of a survey in turn on the engine loop.
+
+    With a RepeatPlanner, passes continue over the points that still need
+    runs instead of a fixed number of repeats.
+    """
+    parent = tasks.get(p_id)
+    try:
+        await _off_loop(results_store.start_survey, p_id, device, points, repeats,
+                        datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
+    except Exception as e:
+        parent.log(f"Results DB error: {e}")
+    try:
+        # One sampler session for the whole survey, so it keeps running between points
+        async with wifi_telemetry.session():
+            await _survey_points(parent, device, points, repeats, manual, latency_mode, bidir, planner)
+    except asyncio.CancelledError:
+        with parent.mutate():
+            parent.active_child = None
+            parent.samples_epoch += 1
+        _mark_cancelled(parent, "Survey cancelled")
+        raise
+    finally:
+        try:
+            await _off_loop(results_store.finish_survey, p_id, parent.status,
+                            datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
+        except Exception as e:
+            logger.error(f"Results DB error finishing survey {p_id}: {e}")
+
+def _passes(points, repeats, planner):
+    """Points of each survey pass: all of them `repeats` times, or the planner's pending ones."""
+    if planner is None:
+        for _ in range(repeats):
+            yield points
+        return
+    while True:
+        pending = planner.pending()
+        if not pending:
+            return
+        yield pending
+
+def _planner_note(planner, pt):
+    errors = planner.relative_errors(pt)
+    parts = [f"{name} ±{errors[metric]:.1f}%" for metric, name in
+             (("iperf_dl_mbps", "DL"), ("iperf_ul_mbps", "UL"), ("ping_avg_ms", "ping"))
+             if errors[metric] is not None]
+    within = all(e is None or e <= planner.target_pct for e in errors.values())
+    if not planner.settled(pt):
+        state = "needs more runs"
+    elif within:
+        state = "settled"
+    else:
+        state = "stopped at the maximum"
+    return f"Point {pt} {state} after {planner.runs(pt)} runs" + (f" ({', '.join(parts)})" if parts else "")
+
+async def _survey_points(parent, device, points, repeats, manual, latency_mode, bidir, planner=None):
+    with parent.mutate():
+        parent.status = "running"
+        if planner is None:
+            parent.logs.append(f"Survey started: {points} repeats:{repeats} manual:{manual}")
+        else:
+            parent.logs.append(f"Survey started: {points} repeats:{planner.min_repeats}-{planner.max_repeats} "
+                               f"(target ±{planner.target_pct:g}%) manual:{manual}")
+    for rep, pass_points in enumerate(_passes(points, repeats, planner)):
+        for pt in pass_points:
+            if parent.cancel:
+                with parent.mutate():
+                    parent.status = "cancelled"
+                    parent.logs.append("Survey cancelled")
+                return
+            child_id = str(uuid.uuid4())
+            child = tasks.create(child_id, parent=parent)
+            # The parent exposes the running child's partial and samples by reference
+            with parent.mutate():
+                parent.active_child = child
+                parent.samples_epoch += 1
+                # Log which point is starting
+                parent.logs.append(f"Starting point {pt} (run {rep+1})")
+            
+            # Execute the point measurement
+            await run_point_async(child_id, device, pt, rep+1, IPERF_DURATION, IPERF_PARALLEL, latency_mode, bidir)
+            
+            child_result = child.result
+            if planner is not None:
+                planner.add(pt, child_result)
+            with parent.mutate():
+                if child_result:
+                    parent.results.append(child_result)
+                    parent.done += 1
+                if planner is not None:
+                    # Runs so far (failed ones too, as with fixed repeats) plus the projection from
+                    # the spread, so a failed run doesn't shrink the total; it drops only as points settle
+                    parent.total = planner.completed_runs() + planner.projected_remaining()
+                if child_result:
+                    parent.logs.append(f"Point done: {pt} ({parent.done}/{parent.total})")
+                if planner is not None:
+                    parent.logs.append(_planner_note(planner, pt))
+                # Detach the child so its partial data and samples don't persist to next point
+                parent.active_child = None
+                parent.samples_epoch += 1
+            
+            # Wait AFTER measurement completes if in manual mode
+            if manual:
+                with parent.mutate():
+                    parent.waiting = True
+                    parent.logs.append(f"Measurement complete for {pt}. Move to next location and click proceed.")
+                while True:
+                    if parent.cancel:
+                        with parent.mutate():
+                            parent.status = "cancelled"
+                            parent.logs.append("Survey cancelled during wait")
+                        return
+                    if parent.proceed:
+                        parent.update(proceed=False, waiting=False)
+                        break
+                    # Set by /task_proceed or /task_cancel
+                    await asyncio.sleep(FLAG_POLL_S)
+    with parent.mutate():
+        parent.status = "finished"
+        parent.logs.append("Survey finished")
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -476,7 +997,9 @@ def run_point():
                     "point": "P1",
                     "run": 1,
                     "duration": IPERF_DURATION,
-                    "parallel": IPERF_PARALLEL
+                    "parallel": IPERF_PARALLEL,
+                    "latency_mode": LATENCY_MODE,
+                    "bidir": IPERF_BIDIR
                 }
             )
         except ValidationError as ve:
@@ -488,26 +1011,23 @@ def run_point():
         run_index = validated["run"]
         duration = validated["duration"]
         parallel = validated["parallel"]
+        latency_mode = validated["latency_mode"]
+        bidir = validated["bidir"]
         
         task_id = str(uuid.uuid4())
-        with tasks_lock:
-            tasks[task_id] = {
-                "status": "queued",
-                "total": 1,
-                "done": 0,
-                "logs": [],
-                "results": [],
-                "partial": {},
-                "samples": [],
-                "seq": 0
-            }
+        task = tasks.create(task_id)
         
-        t = threading.Thread(
-            target=worker_run_point,
-            args=(task_id, device, point, run_index, duration, parallel),
-            daemon=True
-        )
-        t.start()
+        try:
+            job_queue.submit(
+                task,
+                lambda: run_point_async(task_id, device, point, run_index, duration, parallel, latency_mode, bidir),
+                priority=PRIORITY_POINT,
+                estimate_s=estimate_point_s(duration, latency_mode, bidir)
+            )
+        except QueueFull as qf:
+            tasks.delete(task_id)
+            logger.warning(f"Job queue full, rejected point measurement: {point}")
+            return _queue_full_response(qf)
         logger.info(f"Started point measurement: {point}, task_id: {task_id}")
         return jsonify({"ok": True, "task_id": task_id})
     
@@ -530,7 +1050,11 @@ def start_survey():
                 payload,
                 defaults={
                     "device": "phone",
-                    "repeats": 1
+                    "repeats": 1,
+                    "latency_mode": LATENCY_MODE,
+                    "bidir": IPERF_BIDIR,
+                    "adaptive_repeats": SURVEY_ADAPTIVE_REPEATS,
+                    "max_repeats": SURVEY_MAX_REPEATS
                 }
             )
         except ValidationError as ve:
@@ -541,127 +1065,28 @@ def start_survey():
         validated_points = validated["points"]
         repeats = validated["repeats"]
         manual = validated["manual"]
+        latency_mode = validated["latency_mode"]
+        bidir = validated["bidir"]
+        planner = None
+        if validated["adaptive_repeats"]:
+            # repeats is the minimum per point; noisy points get more, up to max_repeats
+            planner = RepeatPlanner(validated_points, repeats, validated["max_repeats"], SURVEY_TARGET_ERROR_PCT)
         
         parent_id = str(uuid.uuid4())
-        with tasks_lock:
-            tasks[parent_id] = {
-                "status": "queued",
-                "total": len(validated_points) * repeats,
-                "done": 0,
-                "logs": [],
-                "results": [],
-                "partial": {},
-                "samples": [],
-                "seq": 0,
-                "cancel": False,
-                "waiting": False,
-                "proceed": False
-            }
-        
-        # Helper function to propagate partial updates from child to parent
-        # Defined outside the loop to avoid closure issues
-        def make_propagate_partial_updates(parent_id):
-            """Factory function to create propagation worker for a child task"""
-            def propagate_partial_updates(child_id):
-                """Copy partial data from child task to parent task for live updates"""
-                try:
-                    while True:
-                        time.sleep(0.3)  # Update every 300ms
-                        with tasks_lock:
-                            child = tasks.get(child_id)
-                            if not child:
-                                break
-                            if child.get("status") in ("finished", "error", "cancelled"):
-                                break
-                            # Copy partial data from child to parent (deep copy for nested dicts)
-                            if child.get("partial"):
-                                tasks[parent_id]["partial"] = copy.deepcopy(child["partial"])
-                                tasks[parent_id]["seq"] = tasks[parent_id].get("seq", 0) + 1
-                            # Copy samples if available (deep copy to avoid concurrent modification)
-                            if child.get("samples"):
-                                tasks[parent_id]["samples"] = copy.deepcopy(child["samples"])
-                except Exception as e:
-                    logger.error(f"Error in propagate_partial_updates: {e}")
-            return propagate_partial_updates
-        
-        def survey_worker(p_id, device, points, repeats, manual):
-            with tasks_lock:
-                tasks[p_id]["status"] = "running"
-                tasks[p_id]["logs"].append(f"Survey started: {points} repeats:{repeats} manual:{manual}")
-            for rep in range(repeats):
-                for pt in points:
-                    with tasks_lock:
-                        if tasks[p_id].get("cancel"):
-                            tasks[p_id]["status"] = "cancelled"
-                            tasks[p_id]["logs"].append("Survey cancelled")
-                            tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                            return
-                    child_id = str(uuid.uuid4())
-                    with tasks_lock:
-                        tasks[child_id] = {"status":"queued", "total":1, "done":0, "logs":[], "results": [], "partial": {}, "seq": 0, "samples": []}
-                        # Log which point is starting
-                        tasks[p_id]["logs"].append(f"Starting point {pt} (run {rep+1})")
-                        tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                    
-                    # Create and start propagation thread
-                    propagate_func = make_propagate_partial_updates(p_id)
-                    propagate_thread = threading.Thread(
-                        target=propagate_func,
-                        args=(child_id,),
-                        daemon=True
-                    )
-                    propagate_thread.start()
-                    
-                    # Execute the point measurement
-                    worker_run_point(child_id, device, pt, rep+1, IPERF_DURATION, IPERF_PARALLEL)
-                    
-                    # Give the propagation thread time to finish (increased timeout to ensure completion)
-                    propagate_thread.join(timeout=5)
-                    if propagate_thread.is_alive():
-                        logger.warning(f"Propagation thread for {child_id} did not finish in time")
-                    
-                    with tasks_lock:
-                        child_result = tasks[child_id].get("result")
-                        if child_result:
-                            tasks[p_id]["results"].append(child_result)
-                            tasks[p_id]["done"] += 1
-                            tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                            tasks[p_id]["logs"].append(f"Point done: {pt} ({tasks[p_id]['done']}/{tasks[p_id]['total']})")
-                        # Clear partial data and samples after point is done so they don't persist to next point
-                        tasks[p_id]["partial"] = {}
-                        tasks[p_id]["samples"] = []
-                        tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                    
-                    # Wait AFTER measurement completes if in manual mode
-                    if manual:
-                        with tasks_lock:
-                            tasks[p_id]["waiting"] = True
-                            tasks[p_id]["logs"].append(f"Measurement complete for {pt}. Move to next location and click proceed.")
-                            tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                        while True:
-                            time.sleep(0.5)
-                            with tasks_lock:
-                                if tasks[p_id].get("cancel"):
-                                    tasks[p_id]["status"] = "cancelled"
-                                    tasks[p_id]["logs"].append("Survey cancelled during wait")
-                                    tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                                    return
-                                if tasks[p_id].get("proceed"):
-                                    tasks[p_id]["proceed"] = False
-                                    tasks[p_id]["waiting"] = False
-                                    tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                                    break
-            with tasks_lock:
-                tasks[p_id]["status"] = "finished"
-                tasks[p_id]["seq"] = tasks[p_id].get("seq", 0) + 1
-                tasks[p_id]["logs"].append("Survey finished")
+        total = len(validated_points) * repeats if planner is None else planner.projected_remaining()
+        parent = tasks.create(parent_id, total=total)
         
-        t = threading.Thread(
-            target=survey_worker,
-            args=(parent_id, device, validated_points, repeats, manual),
-            daemon=True
-        )
-        t.start()
+        try:
+            job_queue.submit(
+                parent,
+                lambda: run_survey_async(parent_id, device, validated_points, repeats, manual, latency_mode, bidir, planner),
+                priority=PRIORITY_SURVEY,
+                estimate_s=total * estimate_point_s(IPERF_DURATION, latency_mode, bidir)
+            )
+        except QueueFull as qf:
+            tasks.delete(parent_id)
+            logger.warning(f"Job queue full, rejected survey: {len(validated_points)} points")
+            return _queue_full_response(qf)
         logger.info(f"Started survey: {len(validated_points)} points, {repeats} repeats, task_id: {parent_id}")
         return jsonify({"ok": True, "task_id": parent_id})
     
@@ -674,77 +1099,200 @@ def start_survey():
 
 @app.route("/task_proceed/<task_id>", methods=["POST"])
 def task_proceed(task_id):
-    with tasks_lock:
-        t = tasks.get(task_id)
-        if not t:
-            return jsonify({"ok": False, "error": "task not found"}), 404
-        t["proceed"] = True
-        t["seq"] = t.get("seq", 0) + 1
+    t = tasks.get(task_id)
+    if not t:
+        return jsonify({"ok": False, "error": "task not found"}), 404
+    t.update(proceed=True)
     return jsonify({"ok": True})
 
 @app.route("/task_cancel/<task_id>", methods=["POST"])
 def task_cancel(task_id):
-    with tasks_lock:
-        t = tasks.get(task_id)
-        if not t:
-            return jsonify({"ok": False, "error": "task not found"}), 404
-        t["cancel"] = True
-        t["seq"] = t.get("seq", 0) + 1
+    t = tasks.get(task_id)
+    if not t:
+        return jsonify({"ok": False, "error": "task not found"}), 404
+    t.update(cancel=True)
+    # A job still waiting in the queue is dropped right away
+    job_queue.cancel(task_id)
     return jsonify({"ok": True})
 
 @app.route("/task_status/<task_id>")
 def task_status(task_id):
-    with tasks_lock:
-        if task_id not in tasks:
-            return jsonify({"ok": False, "error": "task not found"}), 404
-        return jsonify(tasks[task_id])
+    data = tasks.snapshot(task_id)
+    if data is None:
+        return jsonify({"ok": False, "error": "task not found"}), 404
+    return jsonify(data)
 
 @app.route("/stream/<task_id>")
 def stream_task(task_id):
+    """
+    Server-sent events for a task.
+
+    Each update carries only the samples and log lines added since the
+    previous event. Event ids encode that cursor ('epoch:samples:logs'), so a
+    reconnecting EventSource resumes from Last-Event-ID; when the cursor no
+    longer matches (new samples epoch) the update is sent with samples_reset.
+    """
+    cursor = _parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+    task = tasks.get(task_id)
+
     def event_stream():
+        nonlocal cursor
+        if task is None:
+            # Evicted tasks are finished: replay the final result from the spill file
+            spilled = tasks.snapshot(task_id)
+            if spilled is None:
+                yield f"event: error\ndata: {json.dumps({'error':'task not found'})}\n\n"
+            else:
+                payload = spilled.get("result") or spilled.get("results", [])
+                yield f"event: finished\ndata: {json.dumps(payload)}\n\n"
+            return
+        yield "retry: 2000\n\n"
         last_seq = -1
         while True:
-            with tasks_lock:
-                t = tasks.get(task_id)
-                if t is None:
-                    yield f"event: error\ndata: {json.dumps({'error':'task not found'})}\n\n"
-                    break
-                seq = t.get("seq", 0)
-                if seq != last_seq:
-                    last_seq = seq
-                    data = {
-                        "status": t.get("status"), 
-                        "partial": t.get("partial"), 
-                        "samples": t.get("samples", []),
-                        "logs": t.get("logs")[-20:], 
-                        "done": t.get("done"), 
-                        "total": t.get("total")
-                    }
-                    yield f"event: update\ndata: {json.dumps(data)}\n\n"
-                if t.get("status") in ("finished","error","cancelled"):
-                    payload = t.get("result") if t.get("result") else t.get("results", [])
-                    yield f"event: finished\ndata: {json.dumps(payload)}\n\n"
-                    break
-            time.sleep(0.8)
+            # Block until the task signals a new seq or the heartbeat interval passes
+            task.wait_for_change(last_seq, SSE_HEARTBEAT_S)
+            snap = task.snapshot()
+            sent = False
+            if snap.seq != last_seq:
+                last_seq = snap.seq
+                if cursor and cursor[0] == snap.samples_epoch and cursor[1] <= snap.n_samples and cursor[2] <= snap.n_logs:
+                    new_samples, new_logs, reset = snap.samples(cursor[1]), snap.logs(cursor[2]), False
+                else:
+                    new_samples, new_logs, reset = snap.samples(), snap.logs(max(0, snap.n_logs - 20)), True
+                cursor = (snap.samples_epoch, snap.n_samples, snap.n_logs)
+                data = {
+                    "status": snap.status, 
+                    "partial": snap.partial, 
+                    "samples": new_samples,
+                    "samples_reset": reset,
+                    "logs": new_logs, 
+                    "done": snap.done, 
+                    "total": snap.total
+                }
+                if snap.queue_position is not None:
+                    data["queue_position"] = snap.queue_position
+                    data["eta_s"] = snap.eta_s
+                yield f"id: {cursor[0]}:{cursor[1]}:{cursor[2]}\nevent: update\ndata: {json.dumps(data, default=json_default)}\n\n"
+                sent = True
+            if snap.finished:
+                payload = snap.result if snap.result else snap.results()
+                yield f"event: finished\ndata: {json.dumps(payload, default=json_default)}\n\n"
+                break
+            if not sent:
+                yield ": keep-alive\n\n"
     return Response(event_stream(), mimetype="text/event-stream")
 
 @app.route("/download_csv")
 def download_csv():
-    if os.path.exists(CSV_FILE):
-        return send_file(CSV_FILE, as_attachment=True)
-    return jsonify({"ok": False, "error": "CSV not found"}), 404
+    """
+    Stream the results CSV, optionally only the rows matching device, point
+    and since/until (ISO 8601). Sent gzip compressed to clients that accept
+    it; unchanged exports answer If-None-Match with 304.
+    """
+    try:
+        filters = Validator.validate_csv_query(request.args)
+    except ValidationError as ve:
+        return jsonify(ve.to_dict()), 400
+    # Rows still queued by the writer belong in the download
+    results_writer.flush(timeout=5)
+    try:
+        f = open(CSV_FILE, "rb")
+    except FileNotFoundError:
+        return jsonify({"ok": False, "error": "CSV not found"}), 404
+    st = os.fstat(f.fileno())
+    encoding = "gzip" if request.accept_encodings["gzip"] else None
+    etag = export_etag(st, filters, encoding)
+    if request.if_none_match.contains(etag):
+        f.close()
+        response = Response(status=304)
+    else:
+        chunks = iter_csv(f, st.st_size, filters)
+        response = Response(gzip_chunks(chunks) if encoding else chunks, mimetype="text/csv")
+        response.headers["Content-Disposition"] = f"attachment; filename={os.path.basename(CSV_FILE)}"
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.route("/results")
+def results_history():
+    """
+    Stored runs, newest first, with optional device, point, survey_id and
+    since/until (ISO 8601) filters. Pages hold `limit` runs; pass the
+    returned next_cursor as `cursor` for the next page.
+    """
+    try:
+        query = Validator.validate_results_query(request.args)
+    except ValidationError as ve:
+        return jsonify(ve.to_dict()), 400
+    try:
+        runs, next_cursor = results_store.query_runs(**query)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Cursor de paginación inválido", "field": "cursor"}), 400
+    return jsonify({"ok": True, "results": runs, "next_cursor": next_cursor})
+
+@app.route("/results/<int:run_id>")
+def result_detail(run_id):
+    """One stored run with all its result fields and samples."""
+    run = results_store.get_run(run_id, with_samples=request.args.get("samples", "1") != "0")
+    if run is None:
+        return jsonify({"ok": False, "error": "result not found"}), 404
+    return jsonify({"ok": True, "result": run})
 
 @app.route("/list_raw")
 def list_raw():
-    files = sorted(os.listdir(RAW_DIR))
-    return jsonify({"files": files})
+    """
+    Raw result files, newest first, with optional point and since/until
+    (ISO 8601) filters. Pages hold `limit` files; pass the returned
+    next_cursor as `cursor` for the next page.
+    """
+    try:
+        query = Validator.validate_raw_query(request.args)
+    except ValidationError as ve:
+        return jsonify(ve.to_dict()), 400
+    try:
+        entries, next_cursor = raw_catalog.query(**query)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Cursor de paginación inválido", "field": "cursor"}), 400
+    return jsonify({
+        "files": [entry.name for entry in entries],
+        "entries": [entry.to_dict() for entry in entries],
+        "next_cursor": next_cursor
+    })
 
 @app.route("/raw/<path:fname>")
 def raw_file(fname):
-    safe_path = os.path.join(RAW_DIR, os.path.basename(fname))
-    if os.path.exists(safe_path):
+    """
+    Download a raw result file. Compressed files are sent as stored, with
+    their Content-Encoding (Range requests apply to the stored bytes), to
+    clients that accept it; ?format=json, or a client that doesn't, gets
+    plain JSON in the original layout instead.
+    """
+    name = os.path.basename(fname)
+    safe_path = os.path.join(RAW_DIR, name)
+    if not os.path.exists(safe_path):
+        abort(404)
+    fmt = request.args.get("format")
+    if fmt not in (None, "json"):
+        return jsonify({"ok": False, "error": "Formato inválido (use 'json')", "field": "format"}), 400
+    compression = compression_of(name)
+    if compression is None:
         return send_file(safe_path, as_attachment=True)
-    abort(404)
+    if fmt is None and request.accept_encodings[compression]:
+        response = send_file(safe_path, mimetype="application/json", as_attachment=True,
+                             download_name=plain_name(name))
+        response.headers["Content-Encoding"] = compression
+    else:
+        try:
+            doc = read_stored(safe_path)
+        except RuntimeError:
+            return jsonify({"ok": False, "error": f"No se puede descomprimir {name}: falta el paquete zstandard"}), 406
+        # Rows are expanded as they are sent, not all at once
+        response = Response(iter_plain_json(doc), mimetype="application/json")
+        response.headers["Content-Disposition"] = f"attachment; filename={plain_name(name)}"
+    response.vary.add("Accept-Encoding")
+    return response
 
 @app.route("/_survey_config")
 def survey_config():
@@ -752,6 +1300,13 @@ def survey_config():
     return jsonify({
         "IPERF_DURATION": IPERF_DURATION,
         "IPERF_PARALLEL": IPERF_PARALLEL,
+        "LATENCY_MODE": LATENCY_MODE,
+        "LATENCY_PROBE": LATENCY_PROBE,
+        "LATENCY_INTERVAL_MS": LATENCY_INTERVAL_MS,
+        "IPERF_BIDIR": IPERF_BIDIR,
+        "IPERF_ADAPTIVE": IPERF_ADAPTIVE,
+        "SURVEY_ADAPTIVE_REPEATS": SURVEY_ADAPTIVE_REPEATS,
+        "SURVEY_MAX_REPEATS": SURVEY_MAX_REPEATS,
         "SERVER_IP": SERVER_IP
     })
 
@@ -798,6 +1353,19 @@ def health_check():
     except Exception:
         health["checks"]["termux_api_available"] = False
     
+    health["tasks"] = tasks.stats()
+    health["servers"] = server_pool.stats()
+    health["jobs"] = job_queue.stats()
+    health["processes"] = supervisor.stats()
+    health["reachability"] = reachability.stats()
+    health["results_writer"] = results_writer.stats()
+    health["raw_catalog"] = raw_catalog.stats()
+    try:
+        health["results_store"] = results_store.stats()
+    except Exception as e:
+        health["results_store"] = {"error": str(e)}
+    health["wifi"] = wifi_telemetry.stats()
+    
     # Overall status
     if not health["checks"].get("server_reachable") or not health["checks"].get("iperf3_available"):
         health["status"] = "degraded"
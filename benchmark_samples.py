@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory and time of the live samples timeline.
+
+Compares the previous per-sample dict list with the columnar SampleBuffer for
+one point of three 300 s stages sampled at 10 Hz, with a Wi-Fi reading (RSSI
+and link speed) every 2 s.
+
+Usage: python3 benchmark_samples.py [--duration 300] [--rate 10] [--wifi-interval 2]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from task_state import SampleBuffer
+
+STAGES = ("ping", "download", "upload")
+
+
+def wifi_reading(i, per_poll):
+    poll = i // per_poll
+    return -60.0 - poll % 7, 433.0 + 10 * (poll % 3)
+
+
+def fill_dicts(n_per_stage, per_poll):
+    samples = []
+    for stage in STAGES:
+        for i in range(n_per_stage):
+            rssi, link = wifi_reading(i, per_poll)
+            samples.append({"t": round(i * 0.1, 2), "dl": 93.4 + i % 7, "ul": 41.2 + i % 5,
+                            "ping": 12.5 + (i % 11) / 10.0, "rssi": rssi, "link": link, "stage": stage})
+    return samples
+
+
+def fill_buffer(n_per_stage, per_poll):
+    buf = SampleBuffer()
+    for stage in STAGES:
+        for i in range(n_per_stage):
+            rssi, link = wifi_reading(i, per_poll)
+            buf.append(round(i * 0.1, 2), 93.4 + i % 7, 41.2 + i % 5, 12.5 + (i % 11) / 10.0, stage,
+                       rssi=rssi, link=link)
+    return buf
+
+
+def measure(fill, n_per_stage, per_poll):
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = fill(n_per_stage, per_poll)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=int, default=300, help="stage duration in seconds")
+    parser.add_argument("--rate", type=int, default=10, help="samples per second")
+    parser.add_argument("--wifi-interval", type=float, default=2.0, help="seconds between Wi-Fi readings")
+    args = parser.parse_args()
+    n_per_stage = args.duration * args.rate
+    per_poll = max(1, int(args.wifi_interval * args.rate))
+
+    dicts, dict_bytes, dict_fill = measure(fill_dicts, n_per_stage, per_poll)
+    buf, buf_bytes, buf_fill = measure(fill_buffer, n_per_stage, per_poll)
+
+    start = time.perf_counter()
+    json.dumps(dicts)
+    dict_json = time.perf_counter() - start
+    start = time.perf_counter()
+    json.dumps(buf.rows())
+    buf_json = time.perf_counter() - start
+
+    n = len(dicts)
+    print(f"{n} samples ({len(STAGES)} stages x {args.duration} s x {args.rate} Hz)")
+    print(f"{'store':<14}{'memory':>12}{'bytes/sample':>14}{'fill ms':>10}{'json ms':>10}")
+    print(f"{'list[dict]':<14}{dict_bytes / 1024:>10.1f}KB{dict_bytes / n:>14.1f}{dict_fill * 1000:>10.1f}{dict_json * 1000:>10.1f}")
+    print(f"{'SampleBuffer':<14}{buf_bytes / 1024:>10.1f}KB{buf_bytes / n:>14.1f}{buf_fill * 1000:>10.1f}{buf_json * 1000:>10.1f}")
+    print(f"memory ratio: {dict_bytes / max(buf_bytes, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Throughput convergence for WiFi Survey application.
+Watches per-interval iperf3 throughput and tells when the mean is known
+within a relative tolerance, so a stage can stop before its full duration;
+the same test decides how many survey repeats each point needs.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Two-sided Student t critical values for 1..30 degrees of freedom
+_T_TABLE = {
+    0.90: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+           1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+           1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697),
+    0.95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+    0.99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750),
+}
+_Z = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+CONFIDENCE_LEVELS = tuple(sorted(_T_TABLE))
+
+
+def t_critical(confidence: float, df: int) -> float:
+    """
+    Two-sided Student t critical value.
+
+    Args:
+        confidence: One of CONFIDENCE_LEVELS
+        df: Degrees of freedom (>= 1)
+
+    Returns:
+        Critical value; beyond the table, the normal value with a first-order correction
+    """
+    if df <= len(_T_TABLE[confidence]):
+        return _T_TABLE[confidence][df - 1]
+    z = _Z[confidence]
+    return z + (z ** 3 + z) / (4 * df)
+
+
+class ConvergenceMonitor:
+    """
+    Confidence interval of the mean interval throughput of one stage.
+
+    Intervals starting within omit_s of the stage start are skipped (TCP
+    slow start). add() returns True once at least min_duration_s of the stage
+    has elapsed and the interval half-width is within tolerance_pct of the mean.
+    """
+
+    def __init__(self, tolerance_pct: float = 5.0, confidence: float = 0.95,
+                 min_duration_s: float = 5.0, omit_s: float = 2.0, min_intervals: int = 3):
+        if confidence not in _T_TABLE:
+            raise ValueError(f"confidence must be one of {CONFIDENCE_LEVELS}")
+        self.tolerance_pct = tolerance_pct
+        self.confidence = confidence
+        self.min_duration_s = min_duration_s
+        self.omit_s = omit_s
+        self.min_intervals = max(2, int(min_intervals))
+        self.count = 0
+        self.elapsed_s = 0.0
+        self.converged = False
+        # Welford running mean and sum of squared deviations
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, start: Optional[float], end: Optional[float], mbps: float) -> bool:
+        """
+        Record one reporting interval.
+
+        Args:
+            start: Interval start, seconds since the stage started
+            end: Interval end, seconds since the stage started
+            mbps: Interval throughput
+
+        Returns:
+            True if the stage has converged
+        """
+        if end is not None:
+            self.elapsed_s = max(self.elapsed_s, float(end))
+        if start is not None and float(start) < self.omit_s:
+            return self.converged
+        self.count += 1
+        delta = mbps - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (mbps - self._mean)
+        if not self.converged and self.elapsed_s >= self.min_duration_s and self.count >= self.min_intervals:
+            half_width = self.half_width_pct()
+            self.converged = half_width is not None and half_width <= self.tolerance_pct
+        return self.converged
+
+    def mean_mbps(self) -> Optional[float]:
+        """Mean throughput of the counted intervals, or None before the first one."""
+        return round(self._mean, 2) if self.count else None
+
+    def half_width_pct(self) -> Optional[float]:
+        """Confidence interval half-width relative to the mean, in percent."""
+        if self.count < 2:
+            return None
+        if self._mean <= 0:
+            return math.inf
+        sd = math.sqrt(self._m2 / (self.count - 1))
+        return t_critical(self.confidence, self.count - 1) * sd / math.sqrt(self.count) / self._mean * 100.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Achieved confidence for the result: mean, CI half-width and interval count."""
+        half_width = self.half_width_pct()
+        return {
+            "mean_mbps": self.mean_mbps(),
+            "ci_pct": round(half_width, 2) if half_width is not None and math.isfinite(half_width) else None,
+            "intervals": self.count,
+            "elapsed_s": round(self.elapsed_s, 1)
+        }
+
+
+def relative_error_pct(values: Sequence[float], confidence: float = 0.95) -> Optional[float]:
+    """
+    Confidence interval half-width of the mean of values, in percent of the mean.
+
+    Returns:
+        None for fewer than two values, 0 for identical values, inf for a zero mean
+    """
+    n = len(values)
+    if n < 2:
+        return None
+    mean = sum(values) / n
+    sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    if sd == 0:
+        return 0.0
+    if mean == 0:
+        return math.inf
+    return t_critical(confidence, n - 1) * sd / math.sqrt(n) / abs(mean) * 100.0
+
+
+class RepeatPlanner:
+    """
+    Sequential repeat decisions for the points of a survey.
+
+    A point is settled once it has min_repeats runs and the relative error of
+    every metric is within target_pct, or once it has max_repeats runs. The
+    spread needs two measured runs, so a point is never settled early before
+    two runs produced results, even with min_repeats = 1. Runs without a
+    result count towards max_repeats, so a point whose runs all fail is
+    retried up to max_repeats and no more.
+    """
+
+    METRICS = ("iperf_dl_mbps", "iperf_ul_mbps", "ping_avg_ms")
+
+    def __init__(self, points: Iterable[str], min_repeats: int, max_repeats: int,
+                 target_pct: float, confidence: float = 0.95):
+        self.points = list(dict.fromkeys(points))
+        self.min_repeats = max(1, int(min_repeats))
+        self.max_repeats = max(self.min_repeats, int(max_repeats))
+        self.target_pct = target_pct
+        self.confidence = confidence
+        self._runs = {pt: 0 for pt in self.points}
+        self._values: Dict[str, Dict[str, List[float]]] = {pt: {m: [] for m in self.METRICS} for pt in self.points}
+
+    def add(self, point: str, result: Optional[Dict[str, Any]]) -> None:
+        """Record one run of point; result is None when the run produced none."""
+        self._runs[point] += 1
+        for metric, values in self._values[point].items():
+            value = (result or {}).get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(float(value))
+
+    def runs(self, point: str) -> int:
+        return self._runs[point]
+
+    def relative_errors(self, point: str) -> Dict[str, Optional[float]]:
+        """Relative error in percent per metric (None while unknown)."""
+        return {m: relative_error_pct(v, self.confidence) for m, v in self._values[point].items()}
+
+    def completed_runs(self) -> int:
+        """Runs recorded across all points, with or without a result."""
+        return sum(self._runs.values())
+
+    def settled(self, point: str) -> bool:
+        runs = self._runs[point]
+        if runs >= self.max_repeats:
+            return True
+        if runs < self.min_repeats:
+            return False
+        measured = max(len(values) for values in self._values[point].values())
+        if measured < 2:
+            # No spread to judge yet (one result, or the runs failed)
+            return False
+        return all(e <= self.target_pct for e in self._measured_errors(point))
+
+    def pending(self) -> List[str]:
+        """Points that need another run, in survey order."""
+        return [pt for pt in self.points if not self.settled(pt)]
+
+    def projected_runs(self, point: str) -> int:
+        """Total runs point is expected to need, from the spread observed so far."""
+        runs = self._runs[point]
+        if self.settled(point):
+            return runs
+        needed = max(self.min_repeats, 2, runs + 1)
+        if runs >= 2:
+            t = t_critical(self.confidence, runs - 1)
+            for metric, values in self._values[point].items():
+                error = relative_error_pct(values, self.confidence)
+                if error is None or error <= self.target_pct:
+                    continue
+                if math.isinf(error):
+                    needed = self.max_repeats
+                    break
+                # error shrinks with sqrt(n): solve for the n that reaches the target
+                cv_pct = error / t * math.sqrt(len(values))
+                needed = max(needed, math.ceil((t * cv_pct / self.target_pct) ** 2))
+        return min(needed, self.max_repeats)
+
+    def projected_remaining(self) -> int:
+        """Runs still expected across all points."""
+        return sum(self.projected_runs(pt) - self._runs[pt] for pt in self.points)
+
+    def _measured_errors(self, point: str) -> List[float]:
+        # Metrics with fewer than two values (e.g. ping always failing) don't hold a point back
+        return [e for e in self.relative_errors(point).values() if e is not None]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Results CSV export for WiFi Survey application.
+Streams the results CSV in chunks, optionally filtered by device, point and
+time range and gzip compressed, so an export never holds the whole file in
+memory.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional
+
+# Bytes read from the file / collected before a chunk is sent
+CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+
+# Query filters, matched against the device, point_id and timestamp columns
+FILTERS = ("device", "point", "since", "until")
+
+
+def _has_filters(filters: Dict[str, Any]) -> bool:
+    return any(filters.get(key) for key in FILTERS)
+
+
+def export_etag(st: os.stat_result, filters: Dict[str, Any], encoding: Optional[str] = None) -> str:
+    """
+    ETag of an export: changes whenever the file is appended to or replaced,
+    and differs per filter set and content encoding.
+    """
+    key = [st.st_ino, st.st_size, st.st_mtime_ns]
+    key += [f"{name}={filters[name]}" for name in FILTERS if filters.get(name)]
+    digest = hashlib.sha1("|".join(map(str, key)).encode()).hexdigest()[:20]
+    return f"{digest}-{encoding}" if encoding else digest
+
+
+def _read_blocks(f: BinaryIO, size: int) -> Iterator[bytes]:
+    remaining = size
+    while remaining > 0:
+        block = f.read(min(CHUNK_BYTES, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def _read_lines(f: BinaryIO, size: int) -> Iterator[str]:
+    remaining = size
+    while remaining > 0:
+        line = f.readline(remaining)
+        if not line:
+            break
+        remaining -= len(line)
+        yield line.decode("utf-8", errors="replace")
+
+
+def _matches(row: list, columns: Dict[str, int], filters: Dict[str, Any]) -> bool:
+    def value(column: str) -> str:
+        index = columns.get(column)
+        return row[index] if index is not None and index < len(row) else ""
+
+    if filters.get("device") and value("device") != filters["device"]:
+        return False
+    if filters.get("point") and value("point_id") != filters["point"]:
+        return False
+    # Bounds are "YYYY-MM-DDTHH:MM:SSZ"; compare the date-time part only
+    ts = value("timestamp")[:19]
+    if filters.get("since") and ts < filters["since"][:19]:
+        return False
+    if filters.get("until") and ts > filters["until"][:19]:
+        return False
+    return True
+
+
+def _filtered(f: BinaryIO, size: int, filters: Dict[str, Any]) -> Iterator[bytes]:
+    reader = csv.reader(_read_lines(f, size))
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {name: index for index, name in enumerate(header)}
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in reader:
+        if not _matches(row, columns, filters):
+            continue
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def iter_csv(f: BinaryIO, size: int, filters: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """
+    Chunks of a results CSV opened in binary mode, closing it when done.
+
+    Only the first `size` bytes are read, so rows appended while streaming
+    (which the ETag doesn't cover) are left for the next export. Without
+    filters the bytes are passed through as stored; otherwise the header and
+    matching rows are re-encoded.
+    """
+    try:
+        if filters and _has_filters(filters):
+            yield from _filtered(f, size, filters)
+        else:
+            yield from _read_blocks(f, size)
+    finally:
+        f.close()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a stream of chunks into one gzip member, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Echo responder for WiFi Survey latency probes.
+Run it next to the iperf3 server so clients can probe latency without ICMP
+privileges: UDP datagrams are echoed back as-is, TCP connections are
+accepted and closed (the client times the handshake).
+
+Usage:
+    python3 echo_responder.py [--host 0.0.0.0] [--port 5300]
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5300
+
+
+class _UdpEcho(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+async def _accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    writer.close()
+
+
+async def serve(host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> Tuple[asyncio.DatagramTransport, asyncio.AbstractServer]:
+    """
+    Start the UDP echo and TCP accept servers on the running loop.
+
+    Args:
+        host: Address to listen on
+        port: Port for both servers; 0 picks a free TCP port and reuses it for UDP
+
+    Returns:
+        Tuple (udp_transport, tcp_server); close both to stop
+    """
+    loop = asyncio.get_running_loop()
+    tcp = await asyncio.start_server(_accept, host, port)
+    port = tcp.sockets[0].getsockname()[1]
+    try:
+        udp, _ = await loop.create_datagram_endpoint(_UdpEcho, local_addr=(host, port))
+    except BaseException:
+        tcp.close()
+        raise
+    return udp, tcp
+
+
+async def _main(host: str, port: int) -> None:
+    udp, tcp = await serve(host, port)
+    logger.info(f"Echo responder listening on {host}:{port} (udp echo, tcp accept)")
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    finally:
+        udp.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UDP/TCP echo responder for WiFi Survey latency probes")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on (default: all interfaces)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port for both UDP and TCP (default: {DEFAULT_PORT})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(_main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Measurement engine for WiFi Survey application.
+Runs ping and iperf3 as asyncio subprocesses on one event loop thread, so the
+number of threads stays constant however many measurements are active.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import warnings
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Coroutine, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Largest output line read from a subprocess (iperf3 --json-stream "end" records are big)
+MAX_LINE_BYTES = 1024 * 1024
+
+# Seconds between supervisor checks of stage deadlines and cancel flags
+SUPERVISOR_TICK_S = 0.05
+
+# Seconds a process group gets to exit after SIGTERM before SIGKILL
+TERMINATE_GRACE_S = 2.0
+
+try:
+    from contextlib import aclosing
+except ImportError:  # Python < 3.10
+    @asynccontextmanager
+    async def aclosing(thing):
+        """Async context manager that calls thing.aclose() on exit."""
+        try:
+            yield thing
+        finally:
+            await thing.aclose()
+
+
+class MeasurementEngine:
+    """
+    Event loop running in a dedicated daemon thread.
+
+    Flask routes and other threads hand coroutines to the loop with run(),
+    which blocks for the result.
+    """
+
+    def __init__(self, name: str = "measurement-engine"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self) -> None:
+        """Start the loop thread if it is not running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            _install_child_watcher()
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the loop and wait for its thread to exit."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None):
+        """Run a coroutine on the engine loop and block until it returns."""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("MeasurementEngine.run() called from the engine loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+# Child watchers are deprecated in 3.12 and removed in 3.14
+class _PidfdChildWatcher(getattr(asyncio, "AbstractChildWatcher", object)):
+    """
+    Child watcher that waits on a pidfd in whichever loop spawned the child.
+
+    Before Python 3.12 the default watcher starts one thread per subprocess,
+    and the stock PidfdChildWatcher is bound to a single loop; 3.12+ already
+    behaves like this one when the kernel supports pidfds.
+    """
+
+    def add_child_handler(self, pid, callback, *args):
+        loop = asyncio.get_running_loop()
+        pidfd = os.pidfd_open(pid)
+        loop.add_reader(pidfd, self._do_wait, loop, pid, pidfd, callback, args)
+
+    def _do_wait(self, loop, pid, pidfd, callback, args):
+        loop.remove_reader(pidfd)
+        try:
+            _, status = os.waitpid(pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            # Already reaped elsewhere
+            returncode = 255
+        finally:
+            os.close(pidfd)
+        callback(pid, returncode, *args)
+
+    def remove_child_handler(self, pid):
+        return False
+
+    def attach_loop(self, loop):
+        pass
+
+    def is_active(self):
+        return True
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
+
+
+_watcher_lock = threading.Lock()
+_watcher_installed = False
+
+
+def _install_child_watcher() -> None:
+    global _watcher_installed
+    with _watcher_lock:
+        if _watcher_installed or sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+            return
+        _watcher_installed = True
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            return
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            asyncio.set_child_watcher(_PidfdChildWatcher())
+
+
+class ProcessCancelled(Exception):
+    """Raised when a supervised process was stopped because its task was cancelled."""
+
+
+class SupervisedProcess:
+    """A registered subprocess with its deadline and stop condition."""
+
+    __slots__ = ("proc", "argv", "deadline", "should_stop", "reason")
+
+    def __init__(self, proc: asyncio.subprocess.Process, argv: List[str],
+                 deadline: Optional[float], should_stop: Optional[Callable[[], bool]]):
+        self.proc = proc
+        self.argv = argv
+        self.deadline = deadline
+        self.should_stop = should_stop
+        # Why the supervisor stopped the process: None, "deadline" or "cancelled"
+        self.reason: Optional[str] = None
+
+
+class ProcessSupervisor:
+    """
+    Registry of every measurement subprocess.
+
+    Each process runs in its own session, so signals reach the whole process
+    group. While any process is registered, a watchdog on the event loop checks
+    deadlines and stop callbacks every tick_s and terminates the group (SIGKILL
+    after grace_s). release() always reaps, draining stdout meanwhile so a
+    child blocked on a full pipe can exit.
+    """
+
+    def __init__(self, tick_s: float = SUPERVISOR_TICK_S, grace_s: float = TERMINATE_GRACE_S):
+        self.tick_s = tick_s
+        self.grace_s = grace_s
+        self._procs: Set[SupervisedProcess] = set()
+        self._watchdogs: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self._counts = {"spawned": 0, "reaped": 0, "killed_deadline": 0, "killed_cancelled": 0}
+
+    async def spawn(self, argv: List[str], timeout: Optional[float] = None,
+                    should_stop: Optional[Callable[[], bool]] = None, **kwargs) -> SupervisedProcess:
+        """Start and register a process; kwargs go to create_subprocess_exec."""
+        loop = asyncio.get_running_loop()
+        proc = await asyncio.create_subprocess_exec(*argv, start_new_session=True, **kwargs)
+        deadline = None if timeout is None else loop.time() + timeout
+        supervised = SupervisedProcess(proc, argv, deadline, should_stop)
+        self._procs.add(supervised)
+        self._counts["spawned"] += 1
+        watchdog = self._watchdogs.get(loop)
+        if watchdog is None or watchdog.done():
+            self._watchdogs[loop] = loop.create_task(self._watch(loop))
+        return supervised
+
+    async def _watch(self, loop: asyncio.AbstractEventLoop) -> None:
+        while self._procs:
+            await asyncio.sleep(self.tick_s)
+            now = loop.time()
+            for supervised in list(self._procs):
+                if supervised.reason is not None or supervised.proc.returncode is not None:
+                    continue
+                if supervised.deadline is not None and now >= supervised.deadline:
+                    supervised.reason = "deadline"
+                elif supervised.should_stop is not None and supervised.should_stop():
+                    supervised.reason = "cancelled"
+                else:
+                    continue
+                self._counts[f"killed_{supervised.reason}"] += 1
+                logger.info(f"Stopping {supervised.argv[0]} (pid {supervised.proc.pid}): {supervised.reason}")
+                self._signal(supervised, signal.SIGTERM)
+                loop.call_later(self.grace_s, self._signal, supervised, signal.SIGKILL)
+
+    @staticmethod
+    def _signal(supervised: SupervisedProcess, sig: int) -> None:
+        if supervised.proc.returncode is not None:
+            return
+        try:
+            os.killpg(supervised.proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def release(self, supervised: SupervisedProcess) -> None:
+        """Terminate the process group if still running, reap it and unregister it."""
+        drain = None
+        try:
+            if supervised.proc.returncode is None:
+                self._signal(supervised, signal.SIGTERM)
+                if supervised.proc.stdout is not None:
+                    drain = asyncio.ensure_future(_drain(supervised.proc.stdout))
+                try:
+                    await asyncio.wait_for(supervised.proc.wait(), self.grace_s)
+                except asyncio.TimeoutError:
+                    self._signal(supervised, signal.SIGKILL)
+                    await supervised.proc.wait()
+        except asyncio.CancelledError:
+            self._signal(supervised, signal.SIGKILL)
+            raise
+        finally:
+            if drain is not None:
+                drain.cancel()
+            self._procs.discard(supervised)
+            self._counts["reaped"] += 1
+
+    def kill_all(self) -> None:
+        """SIGKILL every registered process group (interpreter shutdown)."""
+        for supervised in list(self._procs):
+            self._signal(supervised, signal.SIGKILL)
+
+    def stats(self) -> Dict[str, int]:
+        """Process counters for the health endpoint."""
+        return dict(self._counts, running=len(self._procs))
+
+
+async def _drain(stream: asyncio.StreamReader) -> None:
+    while await stream.read(65536):
+        pass
+
+
+# Default supervisor for every process started through this module
+supervisor = ProcessSupervisor()
+
+
+async def stream_lines(argv: List[str], timeout: Optional[float] = None,
+                       should_stop: Optional[Callable[[], bool]] = None) -> AsyncIterator[str]:
+    """
+    Run a supervised command without a shell and yield its output lines (stderr merged).
+
+    The process group is terminated and reaped when the iterator is closed
+    early (wrap it in aclosing() so a `break` closes it right away).
+
+    Args:
+        argv: Command and arguments
+        timeout: Stage deadline in seconds, or None
+        should_stop: Callable polled by the supervisor; True stops the process
+
+    Yields:
+        Decoded output lines without the trailing newline
+
+    Raises:
+        asyncio.TimeoutError: If the process was stopped at its deadline
+        ProcessCancelled: If the process was stopped because should_stop() returned True
+    """
+    supervised = await supervisor.spawn(
+        argv, timeout, should_stop,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=MAX_LINE_BYTES
+    )
+    try:
+        while True:
+            raw = await supervised.proc.stdout.readline()
+            if not raw:
+                break
+            yield raw.decode(errors="replace").rstrip("\r\n")
+        await supervised.proc.wait()
+    finally:
+        await supervisor.release(supervised)
+    if supervised.reason == "deadline":
+        raise asyncio.TimeoutError()
+    if supervised.reason == "cancelled":
+        raise ProcessCancelled()
+
+
+async def until_set(aiter: AsyncIterator, event: asyncio.Event) -> AsyncIterator:
+    """
+    Yield the items of aiter until it is exhausted or event is set.
+
+    When the event is set the pending __anext__() is cancelled, which closes
+    a stream_lines() iterator through its normal cleanup: the process is
+    released like one that ended, not counted as a cancelled one.
+    """
+    stop = asyncio.ensure_future(event.wait())
+    step = None
+    try:
+        while not event.is_set():
+            step = asyncio.ensure_future(aiter.__anext__())
+            await asyncio.wait((step, stop), return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                return
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        stop.cancel()
+        if step is not None and not step.done():
+            step.cancel()
+            await asyncio.gather(step, return_exceptions=True)
+
+
+async def run_exec(argv: List[str], timeout: Optional[float] = None) -> Tuple[str, str, int]:
+    """
+    Run a supervised command without a shell and collect its output.
+
+    Returns:
+        Tuple (stdout, stderr, returncode); returncode is -1 on timeout or launch failure
+    """
+    try:
+        supervised = await supervisor.spawn(
+            argv, timeout, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+    except OSError as e:
+        return "", str(e), -1
+    try:
+        out, err = await supervised.proc.communicate()
+    finally:
+        await supervisor.release(supervised)
+    if supervised.reason == "deadline":
+        return "", "timeout", -1
+    return out.decode(errors="replace"), err.decode(errors="replace"), supervised.proc.returncode
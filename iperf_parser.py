@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+iperf3 output parsing for WiFi Survey application.
+Turns the output of a single iperf3 client run into live interval values and a final result.
+"""
+
+import json
+import re
+import subprocess
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# Text-mode report line, e.g.
+# "[  5]   0.00-1.00   sec  11.2 MBytes  94.1 Mbits/sec    0    338 KBytes"
+# "[SUM]   0.00-1.00   sec  45.0 MBytes   377 Mbits/sec    0"
+# "[  5][TX-C]   0.00-1.00   sec ..." (--bidir)
+_TEXT_LINE_RE = re.compile(
+    r'^\[\s*(?P<id>\d+|SUM)\](?:\[(?P<role>[A-Z]{2}-[CS])\])?\s+'
+    r'(?P<start>[\d\.]+)-(?P<end>[\d\.]+)\s+sec\s+.*?'
+    r'(?P<rate>[\d\.]+)\s+(?P<unit>[KMG]?)bits/sec'
+)
+
+_UNIT_TO_MBPS = {"": 1e-6, "K": 1e-3, "M": 1.0, "G": 1e3}
+
+
+# --bidir direction roles: the client transmits or receives. They map to the
+# separate stages: "DL" is a plain `iperf3 -c` run (the client transmits) and
+# "UL" is `-R` (the client receives), so a bidir run reports TX-C as dl and
+# RX-C as ul.
+ROLE_CLIENT_TX = "TX-C"
+ROLE_CLIENT_RX = "RX-C"
+
+
+@lru_cache(maxsize=None)
+def _iperf_help(binary: str) -> str:
+    try:
+        r = subprocess.run([binary, "--help"], capture_output=True, text=True, timeout=5)
+        return r.stdout + r.stderr
+    except Exception:
+        return ""
+
+
+def iperf_supports_json_stream(binary: str = "iperf3") -> bool:
+    """
+    Check whether the installed iperf3 understands --json-stream (iperf3 >= 3.17).
+
+    The help output is cached for the lifetime of the process.
+
+    Args:
+        binary: iperf3 executable name or path
+
+    Returns:
+        True if --json-stream is listed in the iperf3 help output
+    """
+    return "--json-stream" in _iperf_help(binary)
+
+
+def iperf_supports_bidir(binary: str = "iperf3") -> bool:
+    """Check whether the installed iperf3 understands --bidir (iperf3 >= 3.7)."""
+    return "--bidir" in _iperf_help(binary)
+
+
+def _bps_to_mbps(bps: Any) -> Optional[float]:
+    try:
+        return round(float(bps) / 1_000_000, 2)
+    except (TypeError, ValueError):
+        return None
+
+
+class IperfStreamParser:
+    """
+    Incremental parser for one iperf3 client run.
+
+    Accepts either --json-stream records (one JSON object per line) or, for
+    older iperf3 builds, plain text output. Each call to feed() returns the
+    live throughput for a completed interval (or None), and once the run ends
+    final_mbps holds the full-run average reported by iperf3.
+
+    In text mode, the per-stream lines of one reporting interval are collected
+    into a block and reported once: from the [SUM] line when iperf3 prints one
+    (-P > 1), from the stream line itself for a single stream, or from the
+    stream total when the next interval starts without a [SUM]. Per-stream
+    values are kept in intervals[i]["streams"].
+
+    For a --bidir run, role selects one direction (ROLE_CLIENT_TX or
+    ROLE_CLIENT_RX); report lines of the other direction are skipped.
+    """
+
+    def __init__(self, json_stream: bool = True, streams: int = 1, role: Optional[str] = None):
+        self.json_stream = json_stream
+        self.streams = max(1, int(streams))
+        self.role = role
+        # JSON keys of the selected direction: --bidir reports the reverse one apart
+        self._suffix = "_bidir_reverse" if role == ROLE_CLIENT_RX else ""
+        self.intervals: List[Dict[str, Any]] = []
+        self.final_mbps: Optional[float] = None
+        self.error: Optional[str] = None
+        # True when the last fed line was an interval report line (stream or [SUM])
+        self.last_was_report = False
+        self._block: Optional[Dict[str, Any]] = None
+        self._summary: Dict[str, float] = {}
+
+    def feed(self, line: str) -> Optional[float]:
+        """
+        Parse one output line.
+
+        Args:
+            line: Raw output line from iperf3
+
+        Returns:
+            Interval throughput in Mbps if the line completed an interval, else None
+        """
+        line = line.strip()
+        self.last_was_report = False
+        if not line:
+            return None
+        if self.json_stream and line.startswith("{"):
+            return self._feed_json(line)
+        return self._feed_text(line)
+
+    def _feed_json(self, line: str) -> Optional[float]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return self.feed_record(record)
+
+    def feed_record(self, record: Dict[str, Any]) -> Optional[float]:
+        """Parse one decoded --json-stream record; see feed()."""
+        event = record.get("event")
+        data = record.get("data") or {}
+        if event == "interval":
+            total = data.get("sum" + self._suffix) or {}
+            mbps = _bps_to_mbps(total.get("bits_per_second"))
+            if mbps is None:
+                return None
+            streams = {}
+            for stream in data.get("streams") or []:
+                if self.role is not None and bool(stream.get("sender", True)) != (self.role == ROLE_CLIENT_TX):
+                    continue
+                stream_mbps = _bps_to_mbps(stream.get("bits_per_second"))
+                if stream_mbps is not None:
+                    streams[str(stream.get("socket"))] = stream_mbps
+            self.intervals.append({"start": total.get("start"), "end": total.get("end"),
+                                   "mbps": mbps, "streams": streams})
+            self.last_was_report = True
+            return mbps
+        if event == "end":
+            total = data.get("sum_received" + self._suffix) or data.get("sum_sent" + self._suffix) or {}
+            self.final_mbps = _bps_to_mbps(total.get("bits_per_second"))
+        elif event == "error":
+            self.error = str(data)
+        return None
+
+    def _feed_text(self, line: str) -> Optional[float]:
+        if line.startswith("iperf3: error"):
+            self.error = line
+            return None
+        m = _TEXT_LINE_RE.match(line)
+        if not m:
+            return None
+        try:
+            mbps = round(float(m.group("rate")) * _UNIT_TO_MBPS[m.group("unit")], 3)
+            start, end = float(m.group("start")), float(m.group("end"))
+        except ValueError:
+            return None
+        self.last_was_report = True
+        if self.role is not None and m.group("role") != self.role:
+            return None
+        stream_id = m.group("id")
+
+        # Summary lines close the run: the receiver line is the full-run average
+        if line.endswith("receiver") or line.endswith("sender"):
+            emitted = self._flush_block()
+            self._add_summary(stream_id, line.rsplit(None, 1)[-1], mbps)
+            self.last_was_report = False
+            return emitted
+
+        emitted = None
+        if self._block is not None and self._block["start"] != start:
+            # A new interval started before the previous one was reported
+            emitted = self._flush_block()
+        if self._block is None:
+            self._block = {"start": start, "end": end, "streams": {}}
+        if stream_id == "SUM":
+            return self._flush_block(total=mbps)
+        self._block["streams"][stream_id] = mbps
+        if self.streams == 1:
+            # No [SUM] line is printed for a single stream
+            return self._flush_block()
+        return emitted
+
+    def _flush_block(self, total: Optional[float] = None) -> Optional[float]:
+        block, self._block = self._block, None
+        if block is None:
+            return None
+        if total is None:
+            if not block["streams"]:
+                return None
+            total = sum(block["streams"].values())
+        total = round(total, 2)
+        block["mbps"] = total
+        self.intervals.append(block)
+        return total
+
+    def _add_summary(self, stream_id: str, kind: str, mbps: float) -> None:
+        if stream_id == "SUM":
+            self._summary[f"sum_{kind}"] = mbps
+        else:
+            key = f"streams_{kind}"
+            self._summary[key] = self._summary.get(key, 0.0) + mbps
+        for key in ("sum_receiver", "streams_receiver", "sum_sender", "streams_sender"):
+            if key in self._summary:
+                self.final_mbps = round(self._summary[key], 2)
+                break
+
+    def result_mbps(self) -> float:
+        """
+        Final throughput for the run.
+
+        Uses the iperf3 end-of-run summary when available, otherwise the mean
+        of the observed intervals (e.g. when the run was interrupted).
+        """
+        if self.final_mbps is not None:
+            return self.final_mbps
+        if self.intervals:
+            return round(sum(i["mbps"] for i in self.intervals) / len(self.intervals), 2)
+        return 0.0
+
+
+class BidirStreamParser:
+    """
+    Parser for one iperf3 --bidir run, split into download and upload.
+
+    Wraps one IperfStreamParser per direction; feed() returns the directions
+    that completed an interval on that line, e.g. {"dl": 94.1, "ul": 40.2}.
+    "dl" and "ul" mean the same as for the separate DL and UL stages (see
+    ROLE_CLIENT_TX).
+    """
+
+    def __init__(self, json_stream: bool = True, streams: int = 1):
+        self.json_stream = json_stream
+        self.parsers = {
+            "dl": IperfStreamParser(json_stream, streams, role=ROLE_CLIENT_TX),
+            "ul": IperfStreamParser(json_stream, streams, role=ROLE_CLIENT_RX)
+        }
+        self.last_was_report = False
+
+    @property
+    def intervals(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {key: parser.intervals for key, parser in self.parsers.items()}
+
+    @property
+    def error(self) -> Optional[str]:
+        return self.parsers["dl"].error or self.parsers["ul"].error
+
+    def feed(self, line: str) -> Optional[Dict[str, float]]:
+        """
+        Parse one output line.
+
+        Returns:
+            Interval throughput in Mbps per completed direction, or None
+        """
+        stripped = line.strip()
+        if self.json_stream and stripped.startswith("{"):
+            # Decode once for both directions
+            try:
+                record = json.loads(stripped)
+            except ValueError:
+                self.last_was_report = False
+                return None
+            values = {key: parser.feed_record(record) for key, parser in self.parsers.items()}
+            self.last_was_report = record.get("event") == "interval"
+        else:
+            values = {key: parser.feed(line) for key, parser in self.parsers.items()}
+            # Lines of one direction are reports for the other parser too
+            self.last_was_report = all(parser.last_was_report for parser in self.parsers.values())
+        values = {key: value for key, value in values.items() if value is not None}
+        return values or None
+
+    def result_mbps(self) -> Dict[str, float]:
+        """Final throughput per direction; see IperfStreamParser.result_mbps()."""
+        return {key: parser.result_mbps() for key, parser in self.parsers.items()}
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Job queue for WiFi Survey application.
+Admission control for measurement jobs: a bounded priority queue in front of
+the measurement engine, with a concurrency limit, queue positions and ETAs.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+from task_state import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first: single points go ahead of bulk surveys
+PRIORITY_POINT = 0
+PRIORITY_SURVEY = 1
+
+
+class QueueFull(Exception):
+    """Raised when a job cannot be admitted because the queue is full."""
+
+    def __init__(self, retry_after_s: Optional[float] = None):
+        super().__init__("job queue is full")
+        self.retry_after_s = retry_after_s
+
+
+class Job:
+    """One admitted job and its bookkeeping."""
+
+    __slots__ = ("task", "factory", "priority", "seq", "estimate_s", "started_at", "future")
+
+    def __init__(self, task, factory: Callable[[], Coroutine], priority: int, seq: int, estimate_s: float):
+        self.task = task
+        self.factory = factory
+        self.priority = priority
+        self.seq = seq
+        self.estimate_s = estimate_s
+        self.started_at: Optional[float] = None
+        self.future: Optional[asyncio.Task] = None
+
+    def __lt__(self, other: "Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class JobQueue:
+    """
+    Bounded priority queue feeding the measurement engine.
+
+    submit() is called from request threads: it either admits the job or
+    raises QueueFull. At most max_concurrent jobs run at once on the engine
+    loop; the rest wait, ordered by priority then arrival, with status
+    "queued" and their queue_position/eta_s kept up to date on the task.
+    """
+
+    def __init__(self, engine, max_concurrent: int = 1, max_queued: int = 20):
+        self.engine = engine
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queued = max(0, int(max_queued))
+        self._lock = threading.Lock()
+        self._heap: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        self._seq = itertools.count()
+        self._admitted = 0
+        self._rejected = 0
+
+    def submit(self, task, factory: Callable[[], Coroutine], priority: int = PRIORITY_POINT,
+               estimate_s: float = 60.0) -> None:
+        """
+        Admit a job for a task.
+
+        Args:
+            task: TaskState the job reports to
+            factory: Zero-argument callable returning the job coroutine
+            priority: PRIORITY_POINT or PRIORITY_SURVEY
+            estimate_s: Expected run time, used for ETAs
+
+        Raises:
+            QueueFull: If the job would have to wait and max_queued jobs already do
+        """
+        with self._lock:
+            busy = len(self._running) + len(self._heap) >= self.max_concurrent
+            if busy and len(self._heap) >= self.max_queued:
+                self._rejected += 1
+                raise QueueFull(retry_after_s=self._next_slot_s(time.monotonic()))
+            heapq.heappush(self._heap, Job(task, factory, priority, next(self._seq), estimate_s))
+            self._admitted += 1
+        self.engine.loop.call_soon_threadsafe(self._dispatch)
+        self.engine.loop.call_soon_threadsafe(self._publish_positions)
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Cancel a job: a queued job is dropped, a running one is interrupted.
+
+        Returns:
+            True if the task had a queued or running job
+        """
+        with self._lock:
+            running = self._running.get(task_id)
+            if running is not None:
+                if running.future is not None:
+                    # CancelledError reaches the job at its current await; its
+                    # subprocesses are terminated and reaped on the way out
+                    self.engine.loop.call_soon_threadsafe(running.future.cancel)
+                return True
+            for i, job in enumerate(self._heap):
+                if job.task.task_id == task_id:
+                    self._heap.pop(i)
+                    heapq.heapify(self._heap)
+                    break
+            else:
+                return False
+        with job.task.mutate():
+            job.task.status = "cancelled"
+            job.task.queue_position = None
+            job.task.eta_s = None
+            job.task.logs.append("Cancelled while queued")
+        self.engine.loop.call_soon_threadsafe(self._publish_positions)
+        return True
+
+    def _dispatch(self) -> None:
+        # Runs on the engine loop
+        started: List[Job] = []
+        with self._lock:
+            while self._heap and len(self._running) < self.max_concurrent:
+                job = heapq.heappop(self._heap)
+                job.started_at = time.monotonic()
+                self._running[job.task.task_id] = job
+                started.append(job)
+        for job in started:
+            job.task.update(queue_position=None, eta_s=None)
+            job.future = self.engine.loop.create_task(job.factory())
+            job.future.add_done_callback(lambda f, job=job: self._finished(job, f))
+        if started:
+            self._publish_positions()
+
+    def _finished(self, job: Job, future) -> None:
+        with self._lock:
+            self._running.pop(job.task.task_id, None)
+        exc = None if future.cancelled() else future.exception()
+        if future.cancelled() and job.task.status not in TERMINAL_STATUSES:
+            job.task.update(status="cancelled")
+        elif exc is not None:
+            logger.error(f"Job for task {job.task.task_id} failed", exc_info=exc)
+            with job.task.mutate():
+                if job.task.status not in TERMINAL_STATUSES:
+                    job.task.status = "error"
+                job.task.logs.append(f"Error: {exc}")
+        self._dispatch()
+
+    def _next_slot_s(self, now: float) -> float:
+        """Seconds until the earliest running job is expected to end (lock held)."""
+        if len(self._running) < self.max_concurrent:
+            return 0.0
+        return max(0.0, min(j.started_at + j.estimate_s - now for j in self._running.values()))
+
+    def _positions(self) -> List[Tuple[Any, int, float]]:
+        """(task, position, eta_s) for every queued job, simulating the slots."""
+        now = time.monotonic()
+        with self._lock:
+            slots = sorted(max(0.0, j.started_at + j.estimate_s - now) for j in self._running.values())
+            slots = [0.0] * (self.max_concurrent - len(slots)) + slots
+            order = sorted(self._heap)
+        out = []
+        for position, job in enumerate(order, start=1):
+            start = heapq.heappop(slots)
+            out.append((job.task, position, round(start, 1)))
+            heapq.heappush(slots, start + job.estimate_s)
+        return out
+
+    def _publish_positions(self) -> None:
+        # Runs on the engine loop only, so updates can't overtake a dispatch
+        for task, position, eta in self._positions():
+            if task.queue_position != position or task.eta_s != eta:
+                task.update(queue_position=position, eta_s=eta)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue counters for the health endpoint."""
+        with self._lock:
+            return {
+                "running": len(self._running),
+                "queued": len(self._heap),
+                "max_concurrent": self.max_concurrent,
+                "max_queued": self.max_queued,
+                "admitted": self._admitted,
+                "rejected": self._rejected
+            }
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Latency statistics for WiFi Survey application.
+Streaming accumulator for ping round-trip times: O(1) work per reply for live
+values, exact statistics computed once at the end of the stage.
+"""
+
+from array import array
+from bisect import insort
+from typing import Dict, List, Optional, Sequence
+
+
+def percentile(values: Sequence[float], p: float, presorted: bool = False) -> Optional[float]:
+    """
+    Exact percentile with linear interpolation between closest ranks.
+
+    Args:
+        values: Sample values
+        p: Percentile in [0, 100]
+        presorted: Skip sorting when values are already in ascending order
+
+    Returns:
+        Percentile value, or None for an empty sequence
+    """
+    if not values:
+        return None
+    arr = values if presorted else sorted(values)
+    k = (len(arr) - 1) * (p / 100.0)
+    f = int(k)
+    c = min(f + 1, len(arr) - 1)
+    if f == c:
+        return arr[f]
+    return arr[f] * (c - k) + arr[c] * (k - f)
+
+
+class P2Quantile:
+    """
+    P-square online quantile estimator (Jain & Chlamtac, 1985).
+
+    Tracks one quantile with five markers, in constant memory and O(1) time
+    per observation. Exact for the first five observations.
+    """
+
+    __slots__ = ("p", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []
+        self.positions = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        q = self.heights
+        if len(q) < 5:
+            insort(q, x)
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    # Parabolic prediction out of order: fall back to linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        if len(self.heights) < 5:
+            return percentile(self.heights, self.p * 100, presorted=True)
+        return self.heights[2]
+
+
+class LatencyStats:
+    """
+    Streaming latency accumulator.
+
+    Each add() updates the running mean, the running mean absolute difference
+    between consecutive replies (jitter) and P-square sketches for p50/p95/p99.
+    Raw values are kept in a compact array so summary(exact=True) can compute
+    exact percentiles once, at the end of the stage.
+    """
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self):
+        self.values = array("d")
+        self.mean = 0.0
+        self.jitter = 0.0
+        self._last: Optional[float] = None
+        self._sketches = {q: P2Quantile(q / 100.0) for q in self.QUANTILES}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, rtt_ms: float) -> None:
+        self.values.append(rtt_ms)
+        n = len(self.values)
+        self.mean += (rtt_ms - self.mean) / n
+        if self._last is not None:
+            # n - 1 consecutive differences so far
+            self.jitter += (abs(rtt_ms - self._last) - self.jitter) / (n - 1)
+        self._last = rtt_ms
+        for sketch in self._sketches.values():
+            sketch.add(rtt_ms)
+
+    def summary(self, expected: Optional[int] = None, exact: bool = False) -> Dict[str, Optional[float]]:
+        """
+        Current statistics.
+
+        Args:
+            expected: Number of probes sent (or due), used for the loss percentage
+            exact: Compute exact percentiles from all values instead of the sketches
+
+        Returns:
+            Dictionary with avg_ms, jitter_ms, p50_ms, p95_ms, p99_ms and loss_pct
+        """
+        n = len(self.values)
+        if exact and n:
+            ordered = sorted(self.values)
+            quantiles = {q: percentile(ordered, q, presorted=True) for q in self.QUANTILES}
+        else:
+            quantiles = {q: sketch.value() for q, sketch in self._sketches.items()}
+        loss = None
+        if expected:
+            loss = max(0.0, min(100.0, round((1.0 - n / expected) * 100.0, 2)))
+        return {
+            "avg_ms": self.mean if n else None,
+            "jitter_ms": self.jitter if n > 1 else None,
+            "p50_ms": quantiles[50],
+            "p95_ms": quantiles[95],
+            "p99_ms": quantiles[99],
+            "loss_pct": loss
+        }
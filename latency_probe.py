@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Latency probes for WiFi Survey application.
+Unprivileged UDP echo and TCP-connect probes sent at a fixed interval, so the
+number of samples depends on the probe interval instead of wall-clock seconds.
+"""
+
+import asyncio
+import os
+import struct
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+PROBE_MODES = ("icmp", "udp", "tcp")
+
+# Shortest `ping -i` interval iputils allows an unprivileged user
+ICMP_MIN_USER_INTERVAL_S = 0.2
+
+# Probes answered by nobody at the start of a run before the responder is
+# considered absent rather than the link lossy
+_UNANSWERED_LIMIT = 3
+
+# UDP probe payload: magic and sequence number
+_UDP_PROBE = struct.Struct("!4sI")
+_UDP_MAGIC = b"WSLP"
+
+
+class ProbeUnavailable(Exception):
+    """Raised when the echo responder does not answer at all (refused or silent)."""
+
+
+def ping_interval_s(interval_s: float) -> float:
+    """Interval usable with `ping -i`: unprivileged users can't go below 200 ms."""
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        return interval_s
+    return max(interval_s, ICMP_MIN_USER_INTERVAL_S)
+
+
+class _UdpProbeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, pending: Dict[int, asyncio.Future]):
+        self.pending = pending
+        self.error: Optional[Exception] = None
+
+    def datagram_received(self, data, addr):
+        if len(data) < _UDP_PROBE.size:
+            return
+        magic, seq = _UDP_PROBE.unpack_from(data)
+        future = self.pending.pop(seq, None)
+        if magic == _UDP_MAGIC and future is not None and not future.done():
+            future.set_result(asyncio.get_running_loop().time())
+
+    def error_received(self, exc):
+        # ICMP port unreachable surfaces here as ConnectionRefusedError
+        self.error = exc
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
+
+async def _tcp_connect(host: str, port: int) -> float:
+    _, writer = await asyncio.open_connection(host, port)
+    connected = asyncio.get_running_loop().time()
+    writer.close()
+    return connected
+
+
+async def probe_rtts(mode: str, host: str, port: int, count: int, interval_s: float,
+                     timeout_s: float = 1.0,
+                     should_stop: Optional[Callable[[], bool]] = None) -> AsyncIterator[Optional[float]]:
+    """
+    Send `count` probes, one every interval_s, and yield their round-trip times.
+
+    Probes are pipelined: a slow reply doesn't delay the next probe. Results
+    come out in probe order, as soon as each is answered or times out. Close
+    the iterator early with contextlib.aclosing() to stop probing.
+
+    Args:
+        mode: "udp" (echo through the responder) or "tcp" (connect handshake)
+        host: Responder host
+        port: Responder port
+        count: Number of probes
+        interval_s: Seconds between probes
+        timeout_s: Seconds after which an unanswered probe counts as lost
+        should_stop: Callable checked between probes; True ends the run
+
+    Yields:
+        Round-trip time in milliseconds, or None for a lost probe
+
+    Raises:
+        ProbeUnavailable: If the first probes are refused or all go unanswered
+        ValueError: If mode is not "udp" or "tcp"
+    """
+    if mode not in ("udp", "tcp"):
+        raise ValueError(f"unsupported probe mode {mode!r}")
+    loop = asyncio.get_running_loop()
+    pending: Dict[int, asyncio.Future] = {}
+    transport = protocol = None
+    if mode == "udp":
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _UdpProbeProtocol(pending), remote_addr=(host, port)
+            )
+        except OSError as e:
+            raise ProbeUnavailable(str(e)) from e
+
+    # (sent_at, seq, future) per unresolved probe, in probe order
+    inflight: Deque[Tuple[float, int, asyncio.Future]] = deque()
+    sent = answered = 0
+    next_send = loop.time()
+    try:
+        while sent < count or inflight:
+            if should_stop is not None and should_stop():
+                return
+            now = loop.time()
+            while inflight and (inflight[0][2].done() or now >= inflight[0][0] + timeout_s):
+                sent_at, seq, future = inflight.popleft()
+                pending.pop(seq, None)
+                rtt = error = None
+                if not future.done():
+                    future.cancel()
+                elif not future.cancelled():
+                    error = future.exception()
+                    if error is None:
+                        rtt = (future.result() - sent_at) * 1000.0
+                        answered += 1
+                if rtt is None and not answered:
+                    error = error or (protocol.error if protocol is not None else None)
+                    if isinstance(error, ConnectionRefusedError) or sent - len(inflight) >= _UNANSWERED_LIMIT:
+                        raise ProbeUnavailable(str(error) if error else "no reply from echo responder")
+                yield rtt
+                now = loop.time()
+            if sent < count and now >= next_send:
+                if mode == "udp":
+                    future = loop.create_future()
+                    pending[sent] = future
+                    transport.sendto(_UDP_PROBE.pack(_UDP_MAGIC, sent))
+                else:
+                    future = asyncio.ensure_future(_tcp_connect(host, port))
+                inflight.append((loop.time(), sent, future))
+                sent += 1
+                # Keep the cadence; after a stall, resume without a burst
+                next_send = max(next_send + interval_s, loop.time())
+                continue
+            if inflight:
+                wake = inflight[0][0] + timeout_s
+                if sent < count:
+                    wake = min(wake, next_send)
+                await asyncio.wait([inflight[0][2]], timeout=max(0.0, wake - now))
+            elif sent < count:
+                await asyncio.sleep(max(0.0, next_send - now))
+    finally:
+        for _, _, future in inflight:
+            future.cancel()
+        if transport is not None:
+            transport.close()
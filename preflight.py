@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pre-flight checks for WiFi Survey application.
+Server reachability results cached for a short TTL, so consecutive points of
+a survey don't each wait on their own check.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ReachabilityCache:
+    """
+    TTL cache of host reachability checks.
+
+    Must be used from a single event loop. Concurrent callers for the same
+    host share one in-flight check; a caller being cancelled doesn't cancel
+    the check for the others.
+    """
+
+    def __init__(self, probe: Callable[[str], Awaitable[bool]], ttl_s: float = 30.0):
+        self.probe = probe
+        self.ttl_s = ttl_s
+        self._results: Dict[str, Tuple[float, bool]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, host: str, now: Optional[float] = None) -> Optional[bool]:
+        """Fresh cached result for host, or None."""
+        entry = self._results.get(host)
+        if entry is None:
+            return None
+        now = asyncio.get_running_loop().time() if now is None else now
+        checked_at, reachable = entry
+        return reachable if now - checked_at < self.ttl_s else None
+
+    async def check(self, host: str) -> bool:
+        """Return whether host is reachable, probing it only if the cached result expired."""
+        reachable = self.cached(host)
+        if reachable is not None:
+            self.hits += 1
+            return reachable
+        future = self._inflight.get(host)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._probe(host))
+            self._inflight[host] = future
+        return await asyncio.shield(future)
+
+    async def _probe(self, host: str) -> bool:
+        try:
+            reachable = bool(await self.probe(host))
+        except Exception:
+            reachable = False
+        finally:
+            self._inflight.pop(host, None)
+        self._results[host] = (asyncio.get_running_loop().time(), reachable)
+        return reachable
+
+    def stats(self) -> Dict[str, object]:
+        """Cache counters for the health endpoint."""
+        return {"ttl_s": self.ttl_s, "hits": self.hits, "misses": self.misses}
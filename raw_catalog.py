@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Raw results catalog for WiFi Survey application.
+Keeps the raw result files (`{point}_{run}_{timestamp}.json[.gz|.zst]`) indexed by time
+and point, so listing them doesn't read and sort the whole directory on
+every request.
+"""
+
+import base64
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from raw_format import RAW_NAME_RE
+
+
+# Directory mtimes closer than this to the last scan may hide a later change
+_MTIME_GRANULARITY_S = 1.0
+
+
+class RawEntry(NamedTuple):
+    """One raw file; sorts by timestamp, then name."""
+    timestamp: str
+    name: str
+    point: Optional[str]
+    run: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "point": self.point, "run": self.run, "timestamp": self.timestamp or None}
+
+
+def parse_raw_name(name: str) -> RawEntry:
+    """
+    Catalog entry for a file name; names that don't follow the raw file
+    pattern get no point, run or timestamp (and sort oldest).
+    """
+    m = RAW_NAME_RE.match(name)
+    if not m:
+        return RawEntry("", name, None, None)
+    ts = m.group("ts")
+    iso = f"{ts[0:4]}-{ts[4:6]}-{ts[6:8]}T{ts[9:11]}:{ts[11:13]}:{ts[13:15]}Z"
+    return RawEntry(iso, name, m.group("point"), int(m.group("run")))
+
+
+def encode_cursor(entry: RawEntry) -> str:
+    return base64.urlsafe_b64encode(f"{entry.timestamp}|{entry.name}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Sort key after which a page starts; raises ValueError for a malformed cursor."""
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, name = text.split("|", 1)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+    return timestamp, name
+
+
+class RawCatalog:
+    """
+    Sorted, in-memory index of the files in a raw results directory.
+
+    The directory is scanned once; files written by this process are added
+    as they are written (see writing()). Before each query, refresh()
+    compares the directory mtime with the one seen last and rescans only
+    when it changed, parsing only names it hasn't seen. Safe to use from
+    several threads.
+    """
+
+    def __init__(self, raw_dir: str):
+        self.raw_dir = raw_dir
+        self._lock = threading.Lock()
+        self._entries: List[RawEntry] = []
+        self._by_point: Dict[str, List[RawEntry]] = {}
+        self._names: Dict[str, RawEntry] = {}
+        self._mtime_ns: Optional[int] = None
+        self._racy = True
+        self.scans = 0
+
+    def refresh(self) -> None:
+        """Rescan the directory if it changed since it was last seen."""
+        try:
+            mtime_ns = os.stat(self.raw_dir).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        with self._lock:
+            if mtime_ns == self._mtime_ns and not self._racy and self._mtime_ns is not None:
+                return
+            self._scan(mtime_ns)
+
+    @contextmanager
+    def writing(self, name: str) -> Iterator[None]:
+        """
+        Wrap the write of a new file: changes made before it are picked up
+        first, so accepting the mtime our write leaves behind can't hide them.
+        """
+        self.refresh()
+        yield
+        self.add(name)
+
+    def add(self, name: str) -> None:
+        """Record a file this process just wrote to the directory (prefer writing())."""
+        with self._lock:
+            if self._mtime_ns is None:
+                # Never scanned: the next refresh() picks the file up with everything else
+                return
+            self._insert(name)
+            try:
+                mtime_ns = os.stat(self.raw_dir).st_mtime_ns
+            except FileNotFoundError:
+                return
+            # Our own write changed the mtime; only a different one means an external change
+            self._mark_seen(mtime_ns)
+
+    def query(self, point: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[RawEntry], Optional[str]]:
+        """
+        Files newest first, filtered by point and timestamp range (inclusive,
+        "YYYY-MM-DDTHH:MM:SSZ"), one page at a time.
+
+        Returns:
+            Tuple (entries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If cursor is malformed
+        """
+        after = decode_cursor(cursor) if cursor else None
+        self.refresh()
+        with self._lock:
+            entries = self._entries if point is None else self._by_point.get(point, [])
+            # Upper bound (exclusive index) from until and the cursor, lower bound from since
+            hi = len(entries)
+            if until is not None:
+                hi = bisect_left(entries, (until + "\uffff",))
+            if after is not None:
+                hi = min(hi, bisect_left(entries, after))
+            lo = bisect_left(entries, (since,)) if since is not None else 0
+            if since is not None or until is not None:
+                # Files without a timestamp never match a time filter
+                lo = max(lo, bisect_left(entries, ("\u0000",)))
+            start = max(lo, hi - limit)
+            page = entries[start:hi][::-1]
+        next_cursor = encode_cursor(page[-1]) if page and start > lo else None
+        return page, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        """Catalog counters for the health endpoint."""
+        with self._lock:
+            return {"files": len(self._entries), "points": len(self._by_point), "scans": self.scans}
+
+    def _scan(self, mtime_ns: Optional[int]) -> None:
+        names = set()
+        if mtime_ns is not None:
+            with os.scandir(self.raw_dir) as it:
+                names = {e.name for e in it if e.is_file()}
+        for name in list(self._names):
+            if name not in names:
+                self._remove(name)
+        for name in names:
+            if name not in self._names:
+                self._insert(name)
+        self.scans += 1
+        self._mark_seen(mtime_ns)
+
+    def _mark_seen(self, mtime_ns: Optional[int]) -> None:
+        self._mtime_ns = mtime_ns
+        # A change within the mtime granularity of this scan could leave the mtime as is
+        self._racy = mtime_ns is None or time.time() - mtime_ns / 1e9 < _MTIME_GRANULARITY_S
+
+    def _insert(self, name: str) -> None:
+        if name in self._names:
+            return
+        entry = parse_raw_name(name)
+        self._names[name] = entry
+        insort(self._entries, entry)
+        if entry.point is not None:
+            insort(self._by_point.setdefault(entry.point, []), entry)
+
+    def _remove(self, name: str) -> None:
+        entry = self._names.pop(name)
+        self._entries.pop(bisect_left(self._entries, entry))
+        if entry.point is not None:
+            bucket = self._by_point[entry.point]
+            bucket.pop(bisect_left(bucket, entry))
+            if not bucket:
+                del self._by_point[entry.point]
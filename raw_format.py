@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Raw result file formats for WiFi Survey application.
+Raw files are written either as indented JSON (`.json`, the original layout)
+or in the compact format: one line of JSON with the samples stored once as
+columns, compressed with gzip (`.json.gz`) or zstd (`.json.zst`).
+load_raw() reads any of them back in the original layout.
+"""
+
+import gzip
+import json
+import re
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from task_state import SampleBuffer, json_default
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for zstd compressed raw files
+    zstandard = None
+
+RAW_FORMATS = ("json", "compact")
+RAW_COMPRESSIONS = ("gzip", "zstd")
+COMPACT_VERSION = 1
+
+# File name suffix per compression (None: original indented JSON)
+RAW_EXTENSIONS = {None: ".json", "gzip": ".json.gz", "zstd": ".json.zst"}
+
+RAW_NAME_RE = re.compile(r"^(?P<point>.+)_(?P<run>\d+)_(?P<ts>\d{8}T\d{6}Z)\.json(?:\.gz|\.zst)?$")
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Sample rows encoded per piece by iter_plain_json()
+ROWS_PER_CHUNK = 256
+
+
+def zstd_available() -> bool:
+    return zstandard is not None
+
+
+def compression_of(name: str) -> Optional[str]:
+    """Compression of a raw file, from its name (None for plain JSON)."""
+    for compression in RAW_COMPRESSIONS:
+        if name.endswith(RAW_EXTENSIONS[compression]):
+            return compression
+    return None
+
+
+def plain_name(name: str) -> str:
+    """Name of the decompressed file ("B3_1_<ts>.json.gz" -> "B3_1_<ts>.json")."""
+    compression = compression_of(name)
+    return name[:-len(RAW_EXTENSIONS[compression])] + ".json" if compression else name
+
+
+def _columns(samples: Any) -> Dict[str, List[Any]]:
+    if isinstance(samples, SampleBuffer):
+        return samples.columns()
+    rows = samples or []
+    keys = list(rows[0]) if rows else []
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+def compact_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact layout of a raw document: final["samples"] moves to a top-level
+    "samples" object holding one list per sample key.
+    """
+    final = dict(doc.get("final") or {})
+    samples = final.pop("samples", None)
+    compact = {"format": "compact", "version": COMPACT_VERSION}
+    compact.update((key, value) for key, value in doc.items() if key != "final")
+    compact["final"] = final
+    compact["samples"] = _columns(samples)
+    return compact
+
+
+def expand_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Original layout of a raw document (documents not in the compact format are returned as is)."""
+    if doc.get("format") != "compact":
+        return doc
+    columns = doc.get("samples") or {}
+    keys = list(columns)
+    expanded = {key: value for key, value in doc.items() if key not in ("format", "version", "samples")}
+    final = dict(expanded.get("final") or {})
+    final["samples"] = [dict(zip(keys, values)) for values in zip(*(columns[key] for key in keys))]
+    expanded["final"] = final
+    return expanded
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        # mtime=0: identical results give identical files
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"unknown compression {compression!r}")
+
+
+def encode_raw(doc: Dict[str, Any], compression: Optional[str] = None) -> bytes:
+    """
+    Serialize a raw document: indented JSON when compression is None,
+    otherwise the compact layout, compressed.
+    """
+    if compression is None:
+        return json.dumps(doc, indent=2, default=json_default).encode()
+    data = json.dumps(compact_document(doc), separators=(",", ":"), default=json_default).encode()
+    return compress(data, compression)
+
+
+def write_raw(path: str, doc: Dict[str, Any], compression: Optional[str] = None) -> None:
+    data = encode_raw(doc, compression)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def open_raw(path: str) -> BinaryIO:
+    """
+    Binary file object yielding the decompressed contents of a raw file.
+
+    Raises:
+        RuntimeError: If the file is zstd compressed and zstandard is not installed
+    """
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compressed raw files need the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def read_stored(path: str) -> Dict[str, Any]:
+    """Read a raw file's document as stored (compact documents stay compact)."""
+    with open_raw(path) as f:
+        return json.load(f)
+
+
+def load_raw(path: str) -> Dict[str, Any]:
+    """Read a raw file of any format, in the original layout."""
+    return expand_document(read_stored(path))
+
+
+def _indented(value: Any, level: int) -> str:
+    return json.dumps(value, indent=2, default=json_default).replace("\n", "\n" + "  " * level)
+
+
+def _member(key: str, text: str, level: int, first: bool) -> str:
+    return ("" if first else ",") + "\n" + "  " * level + json.dumps(key) + ": " + text
+
+
+def iter_plain_json(doc: Dict[str, Any]) -> Iterator[str]:
+    """
+    Indented JSON of a raw document in the original layout, in pieces.
+
+    Gives the same text as json.dumps(expand_document(doc), indent=2), but
+    the sample rows of a compact document are built and encoded
+    ROWS_PER_CHUNK at a time instead of expanding the whole document first.
+    """
+    if doc.get("format") != "compact":
+        yield _indented(doc, 0)
+        return
+    columns = doc.get("samples") or {}
+    keys = list(columns)
+    rows = zip(*(columns[key] for key in keys)) if keys else iter(())
+    yield "{"
+    for i, (key, value) in enumerate((k, v) for k, v in doc.items() if k not in ("format", "version", "samples")):
+        if key != "final":
+            yield _member(key, _indented(value, 1), 1, not i)
+            continue
+        yield _member("final", "{", 1, not i)
+        final = [(k, v) for k, v in (value or {}).items() if k != "samples"]
+        for j, (k, v) in enumerate(final):
+            yield _member(k, _indented(v, 2), 2, not j)
+        yield _member("samples", "", 2, not final)
+        first = True
+        while True:
+            batch = [dict(zip(keys, values)) for _, values in zip(range(ROWS_PER_CHUNK), rows)]
+            if not batch:
+                break
+            yield ("[" if first else ",") + ",".join("\n      " + _indented(row, 3) for row in batch)
+            first = False
+        yield "[]" if first else "\n    ]"
+        yield "\n  }"
+    yield "\n}"
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Results store for WiFi Survey application.
+Indexed SQLite copy of every measurement (surveys, runs and their samples),
+next to the CSV and raw JSON files, so history queries don't scan either.
+
+Backfill from existing raw files:
+    python3 results_store.py results.db raw_results/
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from raw_format import RAW_NAME_RE, load_raw
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS surveys (
+    id TEXT PRIMARY KEY,
+    device TEXT NOT NULL,
+    points TEXT NOT NULL,
+    repeats INTEGER,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    task_id TEXT UNIQUE,
+    survey_id TEXT REFERENCES surveys(id),
+    device TEXT NOT NULL,
+    point TEXT NOT NULL,
+    run_index INTEGER,
+    timestamp TEXT NOT NULL,
+    ssid TEXT,
+    bssid TEXT,
+    frequency_mhz REAL,
+    rssi_dbm REAL,
+    link_speed_mbps REAL,
+    iperf_dl_mbps REAL,
+    iperf_ul_mbps REAL,
+    ping_avg_ms REAL,
+    ping_jitter_ms REAL,
+    ping_p95_ms REAL,
+    ping_loss_pct REAL,
+    duration_s INTEGER,
+    raw_file TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_device_point_ts ON runs (device, point, timestamp);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS runs_survey ON runs (survey_id);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    t REAL,
+    dl REAL,
+    ul REAL,
+    ping REAL,
+    rssi REAL,
+    link REAL,
+    stage TEXT,
+    PRIMARY KEY (run_id, seq)
+) WITHOUT ROWID;
+"""
+
+# Result keys stored in their own columns (result key -> column)
+RUN_COLUMNS = {
+    "ssid": "ssid", "bssid": "bssid", "frequency": "frequency_mhz", "rssi": "rssi_dbm",
+    "link_speed": "link_speed_mbps", "iperf_dl_mbps": "iperf_dl_mbps", "iperf_ul_mbps": "iperf_ul_mbps",
+    "ping_avg_ms": "ping_avg_ms", "ping_jitter_ms": "ping_jitter_ms", "ping_p95_ms": "ping_p95_ms",
+    "ping_loss_pct": "ping_loss_pct", "duration_s": "duration_s",
+}
+_LISTED = ("id", "task_id", "survey_id", "device", "point", "run_index", "timestamp") + tuple(RUN_COLUMNS.values()) + ("raw_file",)
+_SAMPLE_KEYS = ("t", "dl", "ul", "ping", "rssi", "link", "stage")
+
+
+def _blank_to_none(value: Any) -> Any:
+    return None if value == "" else value
+
+
+def encode_cursor(timestamp: str, run_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}|{run_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Position after which a page starts; raises ValueError for a malformed cursor."""
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, run_id = text.rsplit("|", 1)
+        return timestamp, int(run_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+
+
+class ResultsStore:
+    """
+    SQLite results database in WAL mode.
+
+    Writes go through one connection under a lock; every read opens its own
+    short-lived connection, so Flask request threads never wait on a write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        # WAL + NORMAL: no fsync per commit, still consistent after a crash
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def start_survey(self, survey_id: str, device: str, points: Sequence[str], repeats: int, started_at: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO surveys (id, device, points, repeats, started_at, status) VALUES (?, ?, ?, ?, ?, 'running')",
+                (survey_id, device, json.dumps(list(points)), repeats, started_at)
+            )
+
+    def finish_survey(self, survey_id: str, status: str, finished_at: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE surveys SET status = ?, finished_at = ? WHERE id = ?",
+                               (status, finished_at, survey_id))
+
+    def add_run(self, result: Dict[str, Any], samples: Iterable[Dict[str, Any]] = (), task_id: Optional[str] = None,
+                survey_id: Optional[str] = None, run_index: Optional[int] = None,
+                raw_file: Optional[str] = None) -> int:
+        """
+        Insert one finished point measurement and its samples.
+
+        Args:
+            result: Final result dictionary (its "samples" key is ignored)
+            samples: Sample rows (t, dl, ul, ping, rssi, link, stage)
+            task_id: Task that produced the run; a second insert for it is ignored
+            survey_id: Survey the run belongs to, if any
+            run_index: Repetition number of the point
+            raw_file: Raw JSON file name
+
+        Returns:
+            Row id of the run
+        """
+        extra = {k: v for k, v in result.items()
+                 if k not in RUN_COLUMNS and k not in ("device", "point", "timestamp", "samples")}
+        values = [_blank_to_none(result.get(key)) for key in RUN_COLUMNS]
+        columns = ", ".join(RUN_COLUMNS.values())
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                f"INSERT OR IGNORE INTO runs (task_id, survey_id, device, point, run_index, timestamp, {columns}, raw_file, extra) "
+                f"VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 8))})",
+                [task_id, survey_id, result.get("device"), result.get("point"), run_index, result.get("timestamp")]
+                + values + [raw_file, json.dumps(extra, default=str)]
+            )
+            if not cur.rowcount:
+                return self._conn.execute("SELECT id FROM runs WHERE task_id = ?", (task_id,)).fetchone()[0]
+            run_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO samples (run_id, seq, t, dl, ul, ping, rssi, link, stage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, seq) + tuple(row.get(k) for k in _SAMPLE_KEYS) for seq, row in enumerate(samples))
+            )
+        return run_id
+
+    def query_runs(self, device: Optional[str] = None, point: Optional[str] = None, survey_id: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None, limit: int = 50,
+                   cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Runs newest first, filtered, one page at a time (keyset pagination).
+
+        Timestamps are compared as "YYYY-MM-DDTHH:MM:SSZ" strings.
+
+        Returns:
+            Tuple (runs, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If cursor is malformed
+        """
+        where, params = [], []
+        for column, value in (("device", device), ("point", point), ("survey_id", survey_id)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("timestamp <= ?")
+            params.append(until)
+        if cursor:
+            where.append("(timestamp, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        sql = f"SELECT {', '.join(_LISTED)} FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with closing(self._connect()) as conn:
+            rows = [dict(row) for row in conn.execute(sql, params)]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+        return rows, next_cursor
+
+    def get_run(self, run_id: int, with_samples: bool = True) -> Optional[Dict[str, Any]]:
+        """One run with its extra result fields and (optionally) its samples, or None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT {', '.join(_LISTED)}, extra FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            run = dict(row)
+            run.update(json.loads(run.pop("extra") or "{}"))
+            if with_samples:
+                run["samples"] = [dict(r) for r in conn.execute(
+                    f"SELECT {', '.join(_SAMPLE_KEYS)} FROM samples WHERE run_id = ? ORDER BY seq", (run_id,))]
+        return run
+
+    def stats(self) -> Dict[str, Any]:
+        """Row counts for the health endpoint."""
+        with closing(self._connect()) as conn:
+            runs, surveys = conn.execute("SELECT (SELECT COUNT(*) FROM runs), (SELECT COUNT(*) FROM surveys)").fetchone()
+        return {"runs": runs, "surveys": surveys}
+
+    def import_raw_dir(self, raw_dir: str) -> int:
+        """
+        Backfill runs from raw result files (any format); files already imported are skipped.
+
+        Returns:
+            Number of runs imported
+        """
+        with closing(self._connect()) as conn:
+            known = {row[0] for row in conn.execute("SELECT raw_file FROM runs WHERE raw_file IS NOT NULL")}
+        imported = 0
+        for name in sorted(os.listdir(raw_dir)):
+            m = RAW_NAME_RE.match(name)
+            if not m or name in known:
+                continue
+            try:
+                final = load_raw(os.path.join(raw_dir, name)).get("final") or {}
+            except (OSError, ValueError, EOFError, RuntimeError) as e:
+                logger.warning(f"Skipping raw file {name}: {e}")
+                continue
+            if not final.get("device") or not final.get("timestamp"):
+                continue
+            samples = final.get("samples") or []
+            self.add_run(final, samples if isinstance(samples, list) else [],
+                         run_index=int(m.group("run")), raw_file=name)
+            imported += 1
+        return imported
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python3 results_store.py <results.db> <raw_results dir>")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    store = ResultsStore(sys.argv[1])
+    print(f"Imported {store.import_raw_dir(sys.argv[2])} runs")
+    store.close()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Results CSV writer for WiFi Survey application.
+One background thread appends result rows in batches, so concurrent tasks
+never interleave rows and a finished point doesn't wait on flash storage.
+"""
+
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("never", "batch", "always")
+
+
+class _Flush:
+    """Queue marker: write everything queued before it, then set done."""
+
+    __slots__ = ("done", "stop")
+
+    def __init__(self, stop: bool = False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+def _encode(row: Sequence[Any]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(row)
+    return buf.getvalue().encode("utf-8")
+
+
+class ResultsWriter:
+    """
+    Write-behind appender for the results CSV.
+
+    write() only encodes the row and queues it; the writer thread appends
+    queued rows once batch_rows are pending or the oldest has waited
+    flush_interval_s. Each batch goes out in a single append write, so rows
+    are never split or interleaved, even with other processes appending.
+
+    fsync policy: "never" leaves it to the OS, "batch" syncs after each
+    batch, "always" writes and syncs every row on its own.
+    """
+
+    def __init__(self, path: str, header: Optional[Sequence[str]] = None, batch_rows: int = 32,
+                 flush_interval_s: float = 2.0, fsync: str = "batch", name: str = "results-writer"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.path = path
+        self.header = list(header) if header else None
+        self.batch_rows = 1 if fsync == "always" else max(1, int(batch_rows))
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._fd: Optional[int] = None
+        self._inode: Optional[int] = None
+        self._counts = {"rows": 0, "batches": 0, "fsyncs": 0, "errors": 0}
+
+    def write(self, row: Sequence[Any]) -> None:
+        """
+        Queue one row for appending.
+
+        Raises:
+            RuntimeError: If the writer has been closed
+        """
+        data = _encode(row)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("results writer is closed")
+            self._start()
+            self._queue.put(data)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row queued so far is written; False on timeout."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+            marker = _Flush()
+            self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Write everything still queued and stop the thread; later writes raise."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            marker = _Flush(stop=True)
+            self._queue.put(marker)
+        marker.done.wait(timeout)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters for the health endpoint."""
+        return dict(self._counts, queued=self._queue.qsize(), fsync=self.fsync,
+                    running=self._thread is not None and self._thread.is_alive())
+
+    def _start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        pending: List[bytes] = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if isinstance(item, bytes):
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval_s
+                    if len(pending) < self.batch_rows:
+                        continue
+                if pending and self._append(pending):
+                    pending = []
+                    deadline = None
+                elif pending:
+                    # Storage error: keep the rows and retry after another interval
+                    deadline = time.monotonic() + self.flush_interval_s
+                if isinstance(item, _Flush):
+                    item.done.set()
+                    if item.stop:
+                        return
+        finally:
+            self._close_fd()
+
+    def _append(self, rows: List[bytes]) -> bool:
+        try:
+            fd = self._open()
+            data = b"".join(rows)
+            while data:
+                data = data[os.write(fd, data):]
+            if self.fsync != "never":
+                os.fsync(fd)
+                self._counts["fsyncs"] += 1
+        except OSError as e:
+            self._counts["errors"] += 1
+            self._close_fd()
+            logger.error(f"Results CSV write error ({len(rows)} rows pending): {e}")
+            return False
+        self._counts["rows"] += len(rows)
+        self._counts["batches"] += 1
+        return True
+
+    def _open(self) -> int:
+        """Append descriptor for path, reopened if the file was removed or replaced."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._fd is not None and inode == self._inode:
+            return self._fd
+        self._close_fd()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if self.header and os.fstat(fd).st_size == 0:
+                os.write(fd, _encode(self.header))
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._inode = os.fstat(fd).st_ino
+        return fd
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+            self._inode = None
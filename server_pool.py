@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+iperf3 server pool for WiFi Survey application.
+A stock iperf3 server runs one test at a time, so each measurement stage
+leases a host:port endpoint from the pool and waits in a fair FIFO queue
+when all endpoints are busy.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 5201
+
+# Address local iperf3 servers bind to by default
+LOCAL_HOST = "127.0.0.1"
+
+# Seconds a freshly spawned local iperf3 server gets to bind its port
+_LOCAL_STARTUP_S = 0.3
+
+
+class LocalServerError(RuntimeError):
+    """Raised when a local iperf3 server could not be started."""
+
+
+class Endpoint(NamedTuple):
+    """iperf3 server address."""
+    host: str
+    port: int = DEFAULT_PORT
+
+    def __str__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def parse_endpoints(value: str, default_host: str) -> List[Endpoint]:
+    """
+    Parse a comma-separated endpoint list.
+
+    Each item is "host", "host:port" or ":port" (port on default_host).
+    An empty value yields default_host on the default iperf3 port.
+
+    Args:
+        value: Endpoint list from the [servers] config section
+        default_host: Host used when an item has none
+
+    Returns:
+        List of unique endpoints in configuration order
+
+    Raises:
+        ValueError: If a port is not a number in 1-65535
+    """
+    endpoints: List[Endpoint] = []
+    for item in (value or "").replace(" ", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":") if ":" in item else (item, "", "")
+        port_num = int(port) if port else DEFAULT_PORT
+        if not 1 <= port_num <= 65535:
+            raise ValueError(f"invalid port in {item!r}")
+        endpoint = Endpoint(host or default_host, port_num)
+        if endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints or [Endpoint(default_host, DEFAULT_PORT)]
+
+
+async def _log_stderr(endpoint: Endpoint, stream: asyncio.StreamReader) -> str:
+    """Log a local server's stderr lines until it exits; returns the last one."""
+    last = ""
+    async for raw in stream:
+        line = raw.decode(errors="replace").strip()
+        if line:
+            logger.warning(f"iperf3 server {endpoint}: {line}")
+            last = line
+    return last
+
+
+class ServerPool:
+    """
+    Fair lease manager for iperf3 endpoints.
+
+    Must be used from a single event loop (the measurement engine). Released
+    endpoints are handed directly to the longest-waiting caller, so a burst of
+    new requests cannot overtake queued ones. In local mode the pool spawns
+    `iperf3 -s -B <host> -p <port>` for each endpoint on first use and
+    respawns servers that have exited.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], local: bool = False, binary: str = "iperf3"):
+        if not endpoints:
+            raise ValueError("server pool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.local = local
+        self.binary = binary
+        self._free: Deque[Endpoint] = deque(self.endpoints)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._procs: Dict[Endpoint, asyncio.subprocess.Process] = {}
+        self._in_use = 0
+        self._leases = 0
+        self._queued = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    @classmethod
+    def local_servers(cls, count: int, host: str = LOCAL_HOST, base_port: int = DEFAULT_PORT,
+                      binary: str = "iperf3") -> "ServerPool":
+        """
+        Pool of `count` iperf3 servers spawned on consecutive local ports.
+
+        The servers run on this machine, so the stages never cross the Wi-Fi
+        link (the kernel routes traffic to any of its own addresses over
+        loopback): for testing the app and for setups where it runs on the
+        server host. host is the address the servers bind to and clients use.
+        """
+        return cls([Endpoint(host, base_port + i) for i in range(count)], local=True, binary=binary)
+
+    def hosts(self) -> List[str]:
+        """Distinct endpoint hosts, in configuration order."""
+        return list(dict.fromkeys(e.host for e in self.endpoints))
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers queued for an endpoint."""
+        return sum(1 for w in self._waiters if not w.done())
+
+    def would_wait(self) -> bool:
+        return not self._free or self.waiting > 0
+
+    async def acquire(self) -> Endpoint:
+        """Lease a free endpoint, waiting in FIFO order if none is free."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self._free and not self.waiting:
+            endpoint = self._free.popleft()
+        else:
+            self._queued += 1
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                endpoint = await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed an endpoint just as we were cancelled: pass it on
+                    self.release(waiter.result())
+                raise
+        waited = loop.time() - start
+        self._in_use += 1
+        self._leases += 1
+        self._wait_total_s += waited
+        self._wait_max_s = max(self._wait_max_s, waited)
+        if self.local:
+            try:
+                await self._ensure_server(endpoint)
+            except BaseException:
+                self.release(endpoint)
+                raise
+        return endpoint
+
+    def release(self, endpoint: Endpoint) -> None:
+        """Return an endpoint, handing it to the oldest waiter if any."""
+        self._in_use = max(0, self._in_use - 1)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(endpoint)
+                return
+        self._free.append(endpoint)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Endpoint]:
+        """Context manager form of acquire()/release()."""
+        endpoint = await self.acquire()
+        try:
+            yield endpoint
+        finally:
+            self.release(endpoint)
+
+    async def _ensure_server(self, endpoint: Endpoint) -> None:
+        proc = self._procs.get(endpoint)
+        if proc is not None and proc.returncode is None:
+            return
+        logger.info(f"Starting local iperf3 server on {endpoint}")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self.binary, "-s", "-B", endpoint.host, "-p", str(endpoint.port),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+        except OSError as e:
+            raise LocalServerError(f"cannot start local iperf3 server on {endpoint}: {e}") from e
+        # Drained for the server's lifetime so its errors are logged and the pipe never fills
+        output = asyncio.ensure_future(_log_stderr(endpoint, proc.stderr))
+        await asyncio.sleep(_LOCAL_STARTUP_S)
+        if proc.returncode is not None:
+            detail = await output
+            raise LocalServerError(f"local iperf3 server on {endpoint} exited with code {proc.returncode}"
+                                   + (f": {detail}" if detail else ""))
+        self._procs[endpoint] = proc
+
+    async def close(self) -> None:
+        """Stop any local servers spawned by the pool."""
+        procs, self._procs = list(self._procs.values()), {}
+        for proc in procs:
+            if proc.returncode is None:
+                proc.terminate()
+        for proc in procs:
+            try:
+                await asyncio.wait_for(proc.wait(), 5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+
+    def stats(self) -> Dict[str, object]:
+        """Pool usage counters for the health endpoint."""
+        return {
+            "endpoints": [str(e) for e in self.endpoints],
+            "local": self.local,
+            "in_use": self._in_use,
+            "waiting": self.waiting,
+            "leases": self._leases,
+            "queued": self._queued,
+            "wait_avg_s": round(self._wait_total_s / self._leases, 3) if self._leases else 0.0,
+            "wait_max_s": round(self._wait_max_s, 3)
+        }
@@ -804,8 +804,18 @@
     if(typeof(EventSource)==='undefined'){ pollTaskStatus(task_id, 1000); return; }
     if(currentSse) try{ currentSse.close(); }catch{}
     const es=new EventSource(`/stream/${encodeURIComponent(task_id)}`); currentSse=es;
-    es.addEventListener('error',()=>{ try{es.close();}catch{} pollTaskStatus(task_id,1000); });
-    es.addEventListener('update', ev=>{ try{ handlePartialUpdate(JSON.parse(ev.data)); }catch(e){ console.error(e); } });
+    // Updates carry only new samples since the last event id; rebuild the full timeline here
+    let streamSamples=[];
+    es.addEventListener('error', ev=>{
+      // Transport errors: EventSource reconnects by itself and resumes from Last-Event-ID
+      if(!ev.data && es.readyState!==EventSource.CLOSED) return;
+      try{es.close();}catch{} pollTaskStatus(task_id,1000);
+    });
+    es.addEventListener('update', ev=>{ try{
+      const data=JSON.parse(ev.data);
+      streamSamples = data.samples_reset ? (data.samples||[]) : streamSamples.concat(data.samples||[]);
+      handlePartialUpdate({...data, samples: streamSamples});
+    }catch(e){ console.error(e); } });
     es.addEventListener('finished', ev=>{ try{ handleFinalResult(JSON.parse(ev.data||'null')); }catch(e){ console.error(e); } try{es.close();}catch{} currentSse=null; });
     return es;
   }
@@ -865,6 +875,11 @@
   }
 
   function handlePartialUpdate(dataContainer){
+    if(dataContainer.status==='queued'){
+      const pos=dataContainer.queue_position, eta=num(dataContainer.eta_s);
+      liveSummary && (liveSummary.textContent = `En cola: posición ${pos ?? '?'}${eta!=null ? ` (inicio estimado en ${fmtTime(eta)})` : ''}`);
+      return;
+    }
     const partial=dataContainer.partial || dataContainer;
     if(!partial) return;
     const dl=num(partial.dl_mbps) ?? 0;
@@ -908,7 +923,7 @@
     updateRemaining(elapsed, partial);
     
     // Update live summary with current stage
-    const stageNames = { ping: 'Ping', download: 'Download', upload: 'Upload' };
+    const stageNames = { ping: 'Ping', download: 'Download', upload: 'Upload', bidir: 'Download + Upload' };
     const stageName = stageNames[stage] || stage;
     liveSummary && (liveSummary.textContent = `Ejecutando ${stageName}... ${progress}%`);
   }
@@ -1109,7 +1124,8 @@
       });
       clearTimeout(timeoutId);
       
-      if(!res.ok){
+      // 429: cola de mediciones llena, el cuerpo JSON trae el mensaje
+      if(!res.ok && res.status!==429){
         throw new Error(`Error del servidor: ${res.status} ${res.statusText}`);
       }
       
@@ -1210,7 +1226,8 @@
       });
       clearTimeout(timeoutId);
       
-      if(!res.ok){
+      // 429: cola de mediciones llena, el cuerpo JSON trae el mensaje
+      if(!res.ok && res.status!==429){
         throw new Error(`Error del servidor: ${res.status} ${res.statusText}`);
       }
       
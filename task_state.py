@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Task state management for WiFi Survey application.
+Each task owns its lock; readers take cheap copy-on-write snapshots instead of
+holding a global lock while serializing.
+"""
+
+import bisect
+import gzip
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("finished", "error", "cancelled")
+
+# Rough per-item memory costs used for the finished-task budget
+_BASE_BYTES = 2048
+_LOG_OVERHEAD_BYTES = 64
+
+# Seconds between scans of the spill directory when nothing new was spilled
+_PRUNE_INTERVAL_S = 60.0
+
+# Stage names stored as small integer codes in SampleBuffer
+STAGES = ("unknown", "ping", "download", "upload", "bidir")
+_STAGE_CODES = {name: code for code, name in enumerate(STAGES)}
+
+
+def _num(value: Any) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _out(value: float, ndigits: int) -> Optional[float]:
+    return None if math.isnan(value) else round(value, ndigits)
+
+
+class _StepColumn:
+    """
+    Column of a value that changes rarely (Wi-Fi readings, one per telemetry
+    poll): only the rows where the value changes are stored, with the value.
+    """
+
+    __slots__ = ("starts", "values", "_last")
+
+    def __init__(self):
+        self.starts = array("I")
+        self.values = array("f")
+        self._last: Optional[float] = None
+
+    def append(self, row: int, value: Optional[float]) -> None:
+        value = _num(value)
+        last = self._last
+        if last is not None and (value == last or (math.isnan(value) and math.isnan(last))):
+            return
+        self._last = value
+        # Value first: readers use the length of starts as the committed change count
+        self.values.append(value)
+        self.starts.append(row)
+
+    def expand(self, start: int, stop: int) -> List[float]:
+        """Value of every row in [start, stop)."""
+        if stop <= start:
+            return []
+        n = len(self.starts)
+        i = bisect.bisect_right(self.starts, start, 0, n)
+        value = self.values[i - 1] if i else math.nan
+        out: List[float] = []
+        row = start
+        while i < n and self.starts[i] < stop:
+            out.extend([value] * (self.starts[i] - row))
+            row, value = self.starts[i], self.values[i]
+            i += 1
+        out.extend([value] * (stop - row))
+        return out
+
+    def nbytes(self) -> int:
+        return self.starts.itemsize * len(self.starts) + self.values.itemsize * len(self.values)
+
+
+class SampleBuffer:
+    """
+    Columnar, append-only timeseries of live samples (t, dl, ul, ping, rssi,
+    link speed, stage).
+
+    Values are stored in typed arrays (missing values as NaN) with the stage
+    as a one-byte code, instead of one dict per sample; RSSI and link speed,
+    which only change once per telemetry poll, are stored where they change.
+    Rows are only built when serializing at the API edge.
+    """
+
+    __slots__ = ("t", "dl", "ul", "ping", "rssi", "link", "stage")
+
+    def __init__(self):
+        self.t = array("d")
+        self.dl = array("f")
+        self.ul = array("f")
+        self.ping = array("f")
+        self.rssi = _StepColumn()
+        self.link = _StepColumn()
+        self.stage = array("b")
+
+    def append(self, t: float, dl: Optional[float] = None, ul: Optional[float] = None,
+               ping: Optional[float] = None, stage: str = "unknown",
+               rssi: Optional[float] = None, link: Optional[float] = None) -> None:
+        self.t.append(float(t))
+        self.dl.append(_num(dl))
+        self.ul.append(_num(ul))
+        self.ping.append(_num(ping))
+        self.rssi.append(len(self.stage), rssi)
+        self.link.append(len(self.stage), link)
+        # Stage last: readers use its length as the committed row count
+        self.stage.append(_STAGE_CODES.get(stage, 0))
+
+    def __len__(self) -> int:
+        return len(self.stage)
+
+    def nbytes(self) -> int:
+        return (sum(col.itemsize * len(col) for col in (self.t, self.dl, self.ul, self.ping, self.stage))
+                + self.rssi.nbytes() + self.link.nbytes())
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Samples in [start, stop) as JSON-ready dictionaries."""
+        stop = len(self) if stop is None else stop
+        return [
+            {"t": round(t, 2), "dl": _out(dl, 3), "ul": _out(ul, 3), "ping": _out(ping, 3),
+             "rssi": _out(rssi, 1), "link": _out(link, 1), "stage": STAGES[code]}
+            for t, dl, ul, ping, rssi, link, code in zip(
+                self.t[start:stop], self.dl[start:stop], self.ul[start:stop], self.ping[start:stop],
+                self.rssi.expand(start, stop), self.link.expand(start, stop), self.stage[start:stop])
+        ]
+
+    def columns(self) -> Dict[str, List[Any]]:
+        """All samples as JSON-ready columns (the values of rows(), one list per key)."""
+        n = len(self)
+        return {
+            "t": [round(t, 2) for t in self.t[:n]],
+            "dl": [_out(v, 3) for v in self.dl[:n]],
+            "ul": [_out(v, 3) for v in self.ul[:n]],
+            "ping": [_out(v, 3) for v in self.ping[:n]],
+            "rssi": [_out(v, 1) for v in self.rssi.expand(0, n)],
+            "link": [_out(v, 1) for v in self.link.expand(0, n)],
+            "stage": [STAGES[code] for code in self.stage[:n]],
+        }
+
+
+class PartialState:
+    """
+    Live partial values of a running task.
+
+    Published copy-on-write: writers call copy(), change the copy and assign
+    it back to the task, so a published instance is never modified.
+    """
+
+    __slots__ = ("dl_mbps", "ul_mbps", "ping_avg_ms", "ping_jitter_ms", "ping_p50_ms",
+                 "ping_p95_ms", "ping_p99_ms", "ping_loss_pct", "rssi_dbm", "link_speed_mbps",
+                 "progress_pct", "elapsed_s", "stage")
+
+    def __init__(self, **values: Any):
+        for name in self.__slots__:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise AttributeError(f"Unknown partial fields: {', '.join(values)}")
+
+    def copy(self) -> "PartialState":
+        clone = PartialState.__new__(PartialState)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def json_default(obj: Any) -> Any:
+    """JSON encoder hook for task state objects (use as json.dumps(default=...))."""
+    if isinstance(obj, SampleBuffer):
+        return obj.rows()
+    if isinstance(obj, PartialState):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class TaskSnapshot:
+    """
+    Immutable view of a task at one sequence number.
+
+    Captured under the task lock by reference only: partial is never mutated
+    after publication and logs/samples/results are append-only lists, so the
+    snapshot records their lengths and slices them lazily, outside the lock.
+    """
+
+    __slots__ = ("task_id", "status", "total", "done", "seq", "samples_epoch", "partial",
+                 "result", "raw_file", "cancel", "waiting", "proceed", "parent_id", "active_child_id",
+                 "queue_position", "eta_s", "_logs", "_n_logs", "_samples", "_n_samples", "_results", "_n_results")
+
+    def __init__(self, task: "TaskState"):
+        self.task_id = task.task_id
+        self.status = task.status
+        self.total = task.total
+        self.done = task.done
+        self.seq = task.seq
+        self.samples_epoch = task.samples_epoch
+        self.partial = task.partial
+        self.result = task.result
+        self.raw_file = task.raw_file
+        self.cancel = task.cancel
+        self.waiting = task.waiting
+        self.proceed = task.proceed
+        self.parent_id = task.parent.task_id if task.parent is not None else None
+        self.active_child_id = task.active_child.task_id if task.active_child is not None else None
+        self.queue_position = task.queue_position
+        self.eta_s = task.eta_s
+        self._logs, self._n_logs = task.logs, len(task.logs)
+        self._samples, self._n_samples = task.samples, len(task.samples)
+        self._results, self._n_results = task.results, len(task.results)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    @property
+    def n_logs(self) -> int:
+        return self._n_logs
+
+    @property
+    def n_samples(self) -> int:
+        return self._n_samples
+
+    def logs(self, start: int = 0) -> List[str]:
+        """Log lines from index start up to the snapshot point."""
+        return self._logs[start:self._n_logs]
+
+    def samples(self, start: int = 0) -> List[Dict[str, Any]]:
+        """Samples from index start up to the snapshot point, as rows."""
+        return self._samples.rows(start, self._n_samples)
+
+    def results(self) -> List[Dict[str, Any]]:
+        return self._results[:self._n_results]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the snapshot to the dictionary format served by the API."""
+        data = {
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "seq": self.seq,
+            "samples_epoch": self.samples_epoch,
+            "logs": self.logs(),
+            "results": self.results(),
+            "partial": self.partial.to_dict(),
+            "samples": self.samples(),
+            "cancel": self.cancel,
+            "waiting": self.waiting,
+            "proceed": self.proceed,
+            "parent": self.parent_id,
+            "active_child": self.active_child_id
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.raw_file is not None:
+            data["raw_file"] = self.raw_file
+        if self.queue_position is not None:
+            data["queue_position"] = self.queue_position
+            data["eta_s"] = self.eta_s
+        return data
+
+
+class TaskState:
+    """
+    Mutable state of one measurement task.
+
+    Writers follow copy-on-write rules so snapshots stay valid without
+    locking: partial is replaced (never mutated in place), logs/samples/results
+    are only appended to, and reset_samples() swaps in a new buffer. Compound
+    updates go through mutate(), which publishes the change by bumping seq and
+    waking waiters once the lock is released.
+    """
+
+    __slots__ = ("task_id", "lock", "cond", "status", "total", "done", "seq", "logs", "results",
+                 "partial", "samples", "samples_epoch", "result", "raw_file", "cancel", "waiting",
+                 "proceed", "parent", "active_child", "queue_position", "eta_s", "finished_at",
+                 "last_access", "size_bytes")
+
+    def __init__(self, task_id: str, total: int = 1, parent: Optional["TaskState"] = None):
+        self.task_id = task_id
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.status = "queued"
+        self.total = total
+        self.done = 0
+        self.seq = 0
+        self.logs: List[str] = []
+        self.results: List[Dict[str, Any]] = []
+        self.partial = PartialState()
+        self.samples = SampleBuffer()
+        self.samples_epoch = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.raw_file: Optional[str] = None
+        self.cancel = False
+        self.waiting = False
+        self.proceed = False
+        self.parent = parent
+        self.active_child: Optional["TaskState"] = None
+        self.queue_position: Optional[int] = None
+        self.eta_s: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.last_access = time.monotonic()
+        self.size_bytes = 0
+
+    @contextmanager
+    def mutate(self) -> Iterator["TaskState"]:
+        """Hold the task lock for a compound update, then publish it."""
+        with self.lock:
+            yield self
+            self.seq += 1
+            if self.finished_at is None and self.status in TERMINAL_STATUSES:
+                self.finished_at = time.monotonic()
+            self.cond.notify_all()
+        # Outside our lock: locks are only ever taken child -> parent, one at a time
+        if self.parent is not None:
+            self.parent.bump()
+
+    def bump(self) -> None:
+        """Publish a change without modifying any field."""
+        with self.mutate():
+            pass
+
+    def update(self, **fields: Any) -> None:
+        """Set one or more fields atomically."""
+        with self.mutate():
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def log(self, message: str) -> None:
+        with self.mutate():
+            self.logs.append(message)
+
+    def reset_samples(self) -> None:
+        """Start a new, empty samples timeline (also invalidating the parent's cursor)."""
+        with self.mutate():
+            self.samples = SampleBuffer()
+            self.samples_epoch += 1
+        if self.parent is not None:
+            with self.parent.mutate():
+                self.parent.samples_epoch += 1
+
+    def wait_for_change(self, last_seq: int, timeout: float) -> None:
+        """Block until seq moves past last_seq, the task finishes, or timeout passes."""
+        with self.cond:
+            if self.seq == last_seq and self.status not in TERMINAL_STATUSES:
+                self.cond.wait(timeout=timeout)
+
+    def estimate_size(self) -> int:
+        """Approximate memory held by this task, in bytes."""
+        with self.lock:
+            buffers = [self.samples] + [r.get("samples") for r in self.results]
+            if self.result:
+                buffers.append(self.result.get("samples"))
+            samples_bytes = sum(b.nbytes() for b in buffers if isinstance(b, SampleBuffer))
+            logs_bytes = sum(len(line) + _LOG_OVERHEAD_BYTES for line in self.logs)
+        return _BASE_BYTES + samples_bytes + logs_bytes
+
+    def snapshot(self) -> TaskSnapshot:
+        """
+        Take an immutable snapshot without blocking writers beyond a few reference copies.
+
+        A survey task reads through to its active child, so its partial and
+        samples are the running point's live data, shared by reference.
+        """
+        with self.lock:
+            snap = TaskSnapshot(self)
+            child = self.active_child
+        if child is not None:
+            with child.lock:
+                snap.partial = child.partial
+                snap._samples, snap._n_samples = child.samples, len(child.samples)
+        return snap
+
+
+class TaskRegistry:
+    """
+    Registry of tasks by id.
+
+    The registry lock only guards creation and deletion; lookups are plain
+    dictionary reads and all per-task work happens under each task's own lock.
+
+    Finished tasks are kept in memory only while they are within the TTL, the
+    count limit and the memory budget. Beyond that the least recently used
+    ones are spilled to spill_dir as compressed JSON and served from there.
+    A task over the count or memory limit that can't be spilled (no spill_dir,
+    or the write failed) stays in memory; past the TTL it is dropped anyway.
+
+    Spill files are kept for at most spill_ttl_s seconds and spill_max_files
+    files (0 = no limit), oldest removed first. Eviction runs on create() and,
+    with sweep_interval_s, from a background thread, so an idle server still
+    releases finished tasks.
+    """
+
+    def __init__(self, spill_dir: Optional[str] = None, max_finished: int = 200,
+                 finished_ttl_s: float = 3600, memory_budget_bytes: int = 32 * 1024 * 1024,
+                 spill_max_files: int = 1000, spill_ttl_s: float = 7 * 86400,
+                 sweep_interval_s: Optional[float] = None):
+        self._tasks: Dict[str, TaskState] = {}
+        self._lock = threading.Lock()
+        self.spill_dir = spill_dir
+        self.max_finished = max_finished
+        self.finished_ttl_s = finished_ttl_s
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_max_files = spill_max_files
+        self.spill_ttl_s = spill_ttl_s
+        self._stats = {"evicted_ttl": 0, "evicted_count": 0, "evicted_memory": 0,
+                       "spilled": 0, "spill_errors": 0, "spill_reads": 0, "spill_pruned": 0}
+        self._pruned_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        if sweep_interval_s:
+            self._sweeper = threading.Thread(target=self._sweep, args=(sweep_interval_s,),
+                                             name="task-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def create(self, task_id: str, total: int = 1, parent: Optional[TaskState] = None) -> TaskState:
+        task = TaskState(task_id, total=total, parent=parent)
+        with self._lock:
+            self._tasks[task_id] = task
+        self.evict()
+        return task
+
+    def get(self, task_id: str) -> Optional[TaskState]:
+        task = self._tasks.get(task_id)
+        if task is not None:
+            task.last_access = time.monotonic()
+        return task
+
+    def delete(self, task_id: str) -> Optional[TaskState]:
+        with self._lock:
+            return self._tasks.pop(task_id, None)
+
+    def snapshot(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Dictionary view of a task (from memory or its spill file), or None if it does not exist."""
+        task = self.get(task_id)
+        if task is not None:
+            return task.snapshot().to_dict()
+        return self._read_spill(task_id)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        """Registry size and eviction counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_memory"] = len(self._tasks)
+        stats["evicted"] = stats["evicted_ttl"] + stats["evicted_count"] + stats["evicted_memory"]
+        return stats
+
+    def close(self) -> None:
+        """Stop the background sweeper, if any."""
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+
+    def _sweep(self, interval_s: float) -> None:
+        while not self._stop.wait(interval_s):
+            try:
+                self.evict()
+            except Exception as e:
+                logger.warning(f"Task eviction failed: {e}")
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Evict finished tasks that are past the TTL or over the count/memory limits,
+        then prune old spill files.
+
+        Tasks still referenced as a running survey's active child are kept.
+        Returns the number of tasks evicted.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tasks = list(self._tasks.values())
+        pinned = {id(t.active_child) for t in tasks if t.active_child is not None}
+        finished = [t for t in tasks if t.finished_at is not None and id(t) not in pinned]
+        evicted = self._evict_finished(finished, now) if finished else 0
+        if evicted or self._pruned_at is None or now - self._pruned_at >= _PRUNE_INTERVAL_S:
+            self._pruned_at = now
+            self.prune_spill()
+        return evicted
+
+    def _evict_finished(self, finished: List[TaskState], now: float) -> int:
+        for task in finished:
+            if not task.size_bytes:
+                task.size_bytes = task.estimate_size()
+        # Least recently used first
+        finished.sort(key=lambda t: t.last_access)
+        total_bytes = sum(t.size_bytes for t in finished)
+        remaining = len(finished)
+        evicted = 0
+        for task in finished:
+            if now - task.finished_at > self.finished_ttl_s:
+                reason = "evicted_ttl"
+            elif remaining > self.max_finished:
+                reason = "evicted_count"
+            elif total_bytes > self.memory_budget_bytes:
+                reason = "evicted_memory"
+            else:
+                continue
+            if not self._spill(task) and reason != "evicted_ttl":
+                # Dropping it would lose a task that just finished
+                continue
+            with self._lock:
+                self._tasks.pop(task.task_id, None)
+                self._stats[reason] += 1
+            remaining -= 1
+            total_bytes -= task.size_bytes
+            evicted += 1
+        return evicted
+
+    def _spill_path(self, task_id: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{os.path.basename(task_id)}.json.gz")
+
+    def _spill(self, task: TaskState) -> bool:
+        """Write a task's spill file; returns whether it was written."""
+        path = self._spill_path(task.task_id)
+        if path is None:
+            return False
+        try:
+            data = task.snapshot().to_dict()
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"), default=json_default)
+            with self._lock:
+                self._stats["spilled"] += 1
+            return True
+        except Exception as e:
+            logger.warning(f"Could not spill task {task.task_id}: {e}")
+            with self._lock:
+                self._stats["spill_errors"] += 1
+            return False
+
+    def prune_spill(self, now: Optional[float] = None) -> int:
+        """
+        Remove spill files older than spill_ttl_s, then the oldest ones beyond
+        spill_max_files.
+
+        Returns:
+            Number of files removed
+        """
+        if not self.spill_dir:
+            return 0
+        now = time.time() if now is None else now
+        files = []
+        try:
+            with os.scandir(self.spill_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json.gz"):
+                        try:
+                            files.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            continue
+        except OSError as e:
+            logger.warning(f"Could not list task spill directory: {e}")
+            return 0
+        files.sort()
+        expired = sum(1 for mtime, _ in files if self.spill_ttl_s and now - mtime > self.spill_ttl_s)
+        excess = len(files) - self.spill_max_files if self.spill_max_files else 0
+        removed = 0
+        for _, path in files[:max(expired, excess)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove spilled task {path}: {e}")
+        if removed:
+            with self._lock:
+                self._stats["spill_pruned"] += removed
+        return removed
+
+    def _read_spill(self, task_id: str) -> Optional[Dict[str, Any]]:
+        path = self._spill_path(task_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read spilled task {task_id}: {e}")
+            return None
+        with self._lock:
+            self._stats["spill_reads"] += 1
+        return data
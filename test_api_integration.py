@@ -5,10 +5,25 @@ Tests the Flask routes with various input scenarios.
 """
 
 import unittest
+import csv
+import gzip
+import io
 import json
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
 
 try:
-    from app import app
+    import app as app_module
+    from app import app, engine, job_queue, tasks
+    from job_queue import QueueFull
+    from raw_catalog import RawCatalog
+    from raw_format import write_raw
+    from results_store import ResultsStore
+    from server_pool import ServerPool, parse_endpoints
+    from api_test_support import redirect_results
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
@@ -26,6 +41,7 @@ class BaseAPITest(unittest.TestCase):
         self.app = app
         self.app.config['TESTING'] = True
         self.client = self.app.test_client()
+        redirect_results(self)
 
 
 class TestRunPointEndpoint(BaseAPITest):
@@ -140,6 +156,47 @@ class TestRunPointEndpoint(BaseAPITest):
         self.assertIn('error', data)
         self.assertEqual(data.get('field'), 'parallel')
 
+    def test_run_point_invalid_latency_mode(self):
+        """Test with an unknown latency mode."""
+        response = self.client.post(
+            '/run_point',
+            data=json.dumps({
+                'device': 'phone',
+                'point': 'P1',
+                'latency_mode': 'busy'
+            }),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertFalse(data.get('ok'))
+        self.assertEqual(data.get('field'), 'latency_mode')
+
+    def test_run_point_queue_full(self):
+        """Test that a full job queue answers 429 with Retry-After."""
+        rejected = []
+        
+        def full(task, *args, **kwargs):
+            rejected.append(task.task_id)
+            raise QueueFull(retry_after_s=42.4)
+        
+        with mock.patch.object(job_queue, 'submit', side_effect=full):
+            response = self.client.post(
+                '/run_point',
+                data=json.dumps({'device': 'phone', 'point': 'P1', 'run': 1}),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers.get('Retry-After'), '42')
+        data = json.loads(response.data)
+        self.assertFalse(data.get('ok'))
+        self.assertIn('error', data)
+        # The rejected task is not left behind in the registry
+        self.assertEqual(len(rejected), 1)
+        self.assertNotIn(rejected[0], tasks)
+
 
 class TestStartSurveyEndpoint(BaseAPITest):
     """Test /start_survey endpoint validation."""
@@ -262,6 +319,8 @@ class TestHealthEndpoint(BaseAPITest):
         self.assertIn('status', data)
         self.assertIn('checks', data)
         self.assertIn('timestamp', data)
+        self.assertIn('evicted', data['tasks'])
+        self.assertIn('queued', data['jobs'])
 
 
 class TestConfigEndpoint(BaseAPITest):
@@ -278,5 +337,197 @@ class TestConfigEndpoint(BaseAPITest):
         self.assertIn('SERVER_IP', data)
 
 
+
+class TestPreflightCheck(BaseAPITest):
+    """Test the pre-flight reachability check against the iperf3 pool."""
+    
+    def test_checks_each_pool_host(self):
+        """Test that every distinct pool host is checked and unreachable ones are logged."""
+        pool = ServerPool(parse_endpoints("10.0.0.2:5201, 10.0.0.2:5202, 10.0.0.3", "10.0.0.1"))
+        check = mock.AsyncMock(side_effect=lambda host: host == "10.0.0.2")
+        task = tasks.create(str(uuid.uuid4()))
+        with mock.patch("app.server_pool", pool), mock.patch.object(app_module.reachability, "check", check):
+            engine.run(app_module._check_server(task), timeout=5)
+        self.assertEqual(sorted(c.args[0] for c in check.call_args_list), ["10.0.0.2", "10.0.0.3"])
+        warnings = [line for line in task.snapshot().logs() if "Advertencia" in line]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("10.0.0.3", warnings[0])
+
+
+class TestResultsEndpoint(BaseAPITest):
+    """Test /results history queries."""
+    
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.tmpdir, "results.db"))
+        patcher = mock.patch("app.results_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+    
+    def test_results_pages(self):
+        """Test filtered, paginated history and run detail."""
+        for minute in range(3):
+            self.store.add_run({"device": "S24FE", "point": "B3", "timestamp": f"2026-10-01T10:0{minute}:00Z",
+                                "iperf_dl_mbps": 100.0}, [{"t": 0.0, "stage": "ping"}])
+        response = self.client.get('/results?device=S24FE&point=B3&since=2026-10-01&limit=2')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next_cursor'])
+        
+        data = json.loads(self.client.get(f"/results?device=S24FE&limit=2&cursor={data['next_cursor']}").data)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next_cursor'])
+        
+        run_id = data['results'][0]['id']
+        detail = json.loads(self.client.get(f'/results/{run_id}').data)
+        self.assertEqual(detail['result']['samples'][0]['stage'], 'ping')
+        self.assertEqual(self.client.get('/results/999').status_code, 404)
+    
+    def test_results_invalid_query(self):
+        """Test that bad limits, dates and cursors are rejected with 400."""
+        for query in ('limit=0', 'limit=abc', 'since=yesterday', 'cursor=%21%21'):
+            response = self.client.get(f'/results?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertFalse(json.loads(response.data)['ok'])
+
+
+
+class TestListRawEndpoint(BaseAPITest):
+    """Test /list_raw paging and filters."""
+    
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ("B3_1_20261001T100000Z.json", "B3_2_20261002T100000Z.json", "C1_1_20261002T110000Z.json"):
+            with open(os.path.join(self.tmpdir, name), "w") as f:
+                f.write("{}")
+        patcher = mock.patch("app.raw_catalog", RawCatalog(self.tmpdir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+    
+    def test_list_raw_pages(self):
+        """Test filtered listing with a cursor to the next page."""
+        data = json.loads(self.client.get('/list_raw?point=B3&limit=1').data)
+        self.assertEqual(data['files'], ["B3_2_20261002T100000Z.json"])
+        self.assertEqual(data['entries'][0]['run'], 2)
+        data = json.loads(self.client.get(f"/list_raw?point=B3&limit=1&cursor={data['next_cursor']}").data)
+        self.assertEqual(data['files'], ["B3_1_20261001T100000Z.json"])
+        self.assertIsNone(data['next_cursor'])
+        data = json.loads(self.client.get('/list_raw?since=2026-10-02').data)
+        self.assertEqual(len(data['files']), 2)
+    
+    def test_list_raw_invalid_query(self):
+        """Test that bad parameters are rejected with 400."""
+        for query in ('limit=1000', 'until=mañana', 'cursor=%21%21'):
+            self.assertEqual(self.client.get(f'/list_raw?{query}').status_code, 400, query)
+
+
+
+class TestRawFileEndpoint(BaseAPITest):
+    """Test /raw downloads of plain and compressed raw files."""
+    
+    DOC = {"final": {"point": "B3", "samples": [{"t": 0.0, "dl": 1.5, "stage": "download"}]}}
+    
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        write_raw(os.path.join(self.tmpdir, "B3_1_20261001T100000Z.json.gz"), self.DOC, "gzip")
+        write_raw(os.path.join(self.tmpdir, "B3_2_20261001T110000Z.json"), self.DOC)
+        patcher = mock.patch("app.RAW_DIR", self.tmpdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+    
+    def test_compressed_file_sent_as_stored(self):
+        """Test Content-Encoding and Range requests on the stored gzip bytes."""
+        with open(os.path.join(self.tmpdir, "B3_1_20261001T100000Z.json.gz"), "rb") as f:
+            stored = f.read()
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        response = self.client.get('/raw/B3_1_20261001T100000Z.json.gz', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertTrue(response.headers['Content-Disposition'].endswith('filename=B3_1_20261001T100000Z.json'))
+        self.assertEqual(response.data, stored)
+        response = self.client.get('/raw/B3_1_20261001T100000Z.json.gz', headers=dict(headers, Range='bytes=0-9'))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, stored[:10])
+    
+    def test_plain_json_on_request(self):
+        """Test that format=json, or no accepted encoding, returns the original layout."""
+        for url, headers in (('/raw/B3_1_20261001T100000Z.json.gz?format=json', {'Accept-Encoding': 'gzip'}),
+                             ('/raw/B3_1_20261001T100000Z.json.gz', {})):
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(json.loads(response.data), self.DOC)
+        response = self.client.get('/raw/B3_2_20261001T110000Z.json?format=json')
+        self.assertEqual(json.loads(response.data), self.DOC)
+    
+    def test_missing_file_and_bad_format(self):
+        """Test 404 for unknown files and 400 for unknown formats."""
+        self.assertEqual(self.client.get('/raw/nope.json').status_code, 404)
+        self.assertEqual(self.client.get('/raw/B3_2_20261001T110000Z.json?format=xml').status_code, 400)
+
+
+class TestDownloadCsvEndpoint(BaseAPITest):
+    """Test filtered, compressed and conditional CSV downloads."""
+    
+    ROWS = [["device", "point_id", "timestamp", "notes"],
+            ["S24FE", "B3", "2026-10-01T10:00:00Z", "run:1"],
+            ["Pixel", "C1", "2026-10-02T10:00:00Z", "run:1"]]
+    
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "results.csv")
+        with open(self.path, "w", newline="") as f:
+            csv.writer(f).writerows(self.ROWS)
+        patcher = mock.patch("app.CSV_FILE", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+    
+    def test_filtered_download(self):
+        """Test that filters select rows and keep the header."""
+        response = self.client.get('/download_csv?device=Pixel&since=2026-10-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(list(csv.reader(io.StringIO(response.data.decode()))), [self.ROWS[0], self.ROWS[2]])
+        self.assertEqual(self.client.get('/download_csv?until=ayer').status_code, 400)
+    
+    def test_gzip_and_etag(self):
+        """Test gzip transfer and 304 for an unchanged export."""
+        response = self.client.get('/download_csv', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        with open(self.path, "rb") as f:
+            self.assertEqual(gzip.decompress(response.data), f.read())
+        etag = response.headers['ETag']
+        headers = {'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+        self.assertEqual(self.client.get('/download_csv', headers=headers).status_code, 304)
+        with open(self.path, "a", newline="") as f:
+            csv.writer(f).writerow(["S24FE", "D4", "2026-10-03T10:00:00Z", "run:1"])
+        self.assertEqual(self.client.get('/download_csv', headers=headers).status_code, 200)
+        self.assertNotEqual(self.client.get('/download_csv').headers['ETag'], etag)
+    
+    def test_missing_csv(self):
+        """Test 404 when there is no CSV yet."""
+        os.remove(self.path)
+        self.assertEqual(self.client.get('/download_csv').status_code, 404)
+
+
 if __name__ == "__main__":
     unittest.main()
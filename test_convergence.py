@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit tests for throughput convergence.
+Tests the early-stop rules of ConvergenceMonitor and the repeat decisions
+of RepeatPlanner.
+"""
+
+import unittest
+from convergence import ConvergenceMonitor, RepeatPlanner, relative_error_pct, t_critical
+
+
+def _feed(monitor, values):
+    """Feed one-second intervals; return the 1-based index of the first converged interval."""
+    for i, mbps in enumerate(values):
+        if monitor.add(i, i + 1, mbps):
+            return i + 1
+    return None
+
+
+class TestTCritical(unittest.TestCase):
+    """Test the Student t critical values."""
+
+    def test_table_and_approximation(self):
+        """Test table lookups and the large-df approximation."""
+        self.assertEqual(t_critical(0.95, 1), 12.706)
+        self.assertEqual(t_critical(0.95, 30), 2.042)
+        self.assertAlmostEqual(t_critical(0.95, 40), 2.021, places=2)
+        self.assertAlmostEqual(t_critical(0.95, 10000), 1.960, places=3)
+
+
+class TestConvergenceMonitor(unittest.TestCase):
+    """Test early-stop decisions on synthetic throughput series."""
+
+    def test_steady_throughput_converges_after_minimum(self):
+        """Test that a flat series stops right at the minimum duration."""
+        monitor = ConvergenceMonitor(tolerance_pct=5, min_duration_s=5, omit_s=2)
+        stopped_at = _feed(monitor, [10, 40, 100, 101, 99, 100, 100, 101, 99, 100])
+        self.assertEqual(stopped_at, 5)
+        summary = monitor.summary()
+        self.assertEqual(summary["intervals"], 3)
+        self.assertAlmostEqual(summary["mean_mbps"], 100, places=0)
+        self.assertLessEqual(summary["ci_pct"], 5)
+
+    def test_slow_start_is_omitted(self):
+        """Test that intervals starting within omit_s don't enter the mean."""
+        monitor = ConvergenceMonitor(omit_s=2)
+        _feed(monitor, [5, 50, 100, 100])
+        self.assertEqual(monitor.count, 2)
+        self.assertEqual(monitor.mean_mbps(), 100)
+
+    def test_noisy_throughput_does_not_converge(self):
+        """Test that a noisy series never reaches a tight tolerance."""
+        monitor = ConvergenceMonitor(tolerance_pct=2, min_duration_s=5, omit_s=0)
+        self.assertIsNone(_feed(monitor, [50, 150, 60, 140, 55, 145, 70, 130, 50, 150]))
+        self.assertGreater(monitor.summary()["ci_pct"], 2)
+
+    def test_zero_throughput_does_not_converge(self):
+        """Test that a dead link is not reported as converged."""
+        monitor = ConvergenceMonitor(omit_s=0, min_duration_s=1)
+        self.assertIsNone(_feed(monitor, [0, 0, 0, 0, 0]))
+        self.assertIsNone(monitor.summary()["ci_pct"])
+
+    def test_invalid_confidence(self):
+        """Test that unsupported confidence levels are rejected."""
+        with self.assertRaises(ValueError):
+            ConvergenceMonitor(confidence=0.8)
+
+
+def _result(dl, ul=50.0, ping=10.0):
+    return {"iperf_dl_mbps": dl, "iperf_ul_mbps": ul, "ping_avg_ms": ping}
+
+
+class TestRepeatPlanner(unittest.TestCase):
+    """Test sequential repeat decisions for survey points."""
+
+    def test_relative_error(self):
+        """Test the relative error edge cases."""
+        self.assertIsNone(relative_error_pct([100.0]))
+        self.assertEqual(relative_error_pct([5.0, 5.0, 5.0]), 0.0)
+        self.assertAlmostEqual(relative_error_pct([90.0, 110.0]), 12.706 * 10 / 100 * 100, places=1)
+
+    def test_consistent_point_stops_at_minimum(self):
+        """Test that a point with tight results gets no further runs."""
+        planner = RepeatPlanner(["A", "B"], min_repeats=2, max_repeats=6, target_pct=10)
+        self.assertEqual(planner.projected_remaining(), 4)
+        for dl in (100.0, 101.0):
+            planner.add("A", _result(dl))
+        self.assertTrue(planner.settled("A"))
+        self.assertEqual(planner.pending(), ["B"])
+        self.assertEqual(planner.projected_remaining(), 2)
+
+    def test_noisy_point_gets_more_runs_up_to_maximum(self):
+        """Test that a noisy point is projected and capped at max_repeats."""
+        planner = RepeatPlanner(["A"], min_repeats=2, max_repeats=5, target_pct=10)
+        for dl in (60.0, 140.0):
+            planner.add("A", _result(dl))
+        self.assertFalse(planner.settled("A"))
+        self.assertEqual(planner.projected_runs("A"), 5)
+        for dl in (70.0, 130.0, 100.0):
+            planner.add("A", _result(dl))
+        self.assertTrue(planner.settled("A"))
+        self.assertEqual(planner.pending(), [])
+
+    def test_failed_runs_count_towards_maximum(self):
+        """Test that a failing point is retried, but only up to max_repeats."""
+        planner = RepeatPlanner(["A"], min_repeats=1, max_repeats=3, target_pct=10)
+        for _ in range(2):
+            planner.add("A", None)
+            self.assertFalse(planner.settled("A"))
+        planner.add("A", None)
+        self.assertTrue(planner.settled("A"))
+
+    def test_failing_point_is_not_settled_at_minimum(self):
+        """Test that failed runs don't settle a point at min_repeats, and don't shrink the total."""
+        planner = RepeatPlanner(["A", "B"], min_repeats=2, max_repeats=5, target_pct=10)
+        total = planner.completed_runs() + planner.projected_remaining()
+        for _ in range(2):
+            planner.add("A", None)
+            self.assertGreaterEqual(planner.completed_runs() + planner.projected_remaining(), total)
+        self.assertEqual(planner.pending(), ["A", "B"])
+        planner.add("A", _result(100.0))
+        self.assertFalse(planner.settled("A"))
+        planner.add("A", _result(100.5))
+        self.assertTrue(planner.settled("A"))
+
+    def test_single_repeat_still_measures_spread(self):
+        """Test that with min_repeats=1 a stable point gets a second run and a noisy one gets extra runs."""
+        planner = RepeatPlanner(["A", "B"], min_repeats=1, max_repeats=6, target_pct=10)
+        self.assertEqual(planner.projected_remaining(), 4)
+        planner.add("A", _result(100.0))
+        planner.add("B", _result(100.0))
+        self.assertEqual(planner.pending(), ["A", "B"])
+        planner.add("A", _result(100.5))
+        self.assertTrue(planner.settled("A"))
+        planner.add("B", _result(40.0))
+        self.assertFalse(planner.settled("B"))
+        self.assertGreater(planner.projected_runs("B"), 2)
+        planner.add("B", None)
+        self.assertFalse(planner.settled("B"))
+        self.assertEqual(planner.completed_runs() + planner.projected_remaining(), 2 + 6)
+
+    def test_missing_metric_is_ignored(self):
+        """Test that a metric without values (e.g. ping down) doesn't hold a point back."""
+        planner = RepeatPlanner(["A"], min_repeats=2, max_repeats=10, target_pct=10)
+        for dl in (100.0, 100.5):
+            planner.add("A", _result(dl, ping=None))
+        self.assertTrue(planner.settled("A"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the results CSV export.
+Tests filtered streaming, bounded reads, gzip chunks and ETags.
+"""
+
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import csv_export
+from csv_export import export_etag, gzip_chunks, iter_csv
+
+HEADER = ["device", "point_id", "timestamp", "ssid", "iperf_dl_mbps", "notes"]
+ROWS = [
+    ["S24FE", "B3", "2026-10-01T10:00:00Z", "lab", "98.5", "run:1"],
+    ["S24FE", "C1", "2026-10-01T11:00:00Z", "lab, 5 GHz", "101.0", "run:1"],
+    ["Pixel", "B3", "2026-10-02T09:30:00Z", "lab", "87.25", "run:1"],
+    ["S24FE", "B3", "2026-10-02T10:00:00Z", "lab", "99.0", "run:2"],
+]
+
+
+def _rows(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+class TestIterCsv(unittest.TestCase):
+    """Test streaming the file with and without filters."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "results.csv")
+        with open(self.path, "w", newline="") as f:
+            csv.writer(f).writerows([HEADER] + ROWS)
+        with open(self.path, "rb") as f:
+            self.stored = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _export(self, size=None, **filters):
+        return b"".join(iter_csv(open(self.path, "rb"), len(self.stored) if size is None else size, filters))
+
+    def test_unfiltered_passes_bytes_through(self):
+        """Test that an unfiltered export is the stored file, in chunks."""
+        with mock.patch.object(csv_export, "CHUNK_BYTES", 16):
+            chunks = list(iter_csv(open(self.path, "rb"), len(self.stored)))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), self.stored)
+        self.assertEqual(self._export(device=None, point=None), self.stored)
+
+    def test_filters(self):
+        """Test device, point and time range filters, keeping the header."""
+        self.assertEqual(_rows(self._export(device="S24FE", point="B3")), [HEADER, ROWS[0], ROWS[3]])
+        self.assertEqual(_rows(self._export(since="2026-10-01T11:00:00Z", until="2026-10-02T09:59:59Z")),
+                         [HEADER, ROWS[1], ROWS[2]])
+        self.assertEqual(_rows(self._export(point="D4")), [HEADER])
+
+    def test_filtered_chunks(self):
+        """Test that filtered rows are sent in several chunks when large."""
+        with mock.patch.object(csv_export, "CHUNK_BYTES", 40):
+            chunks = list(iter_csv(open(self.path, "rb"), len(self.stored), {"device": "S24FE"}))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(_rows(b"".join(chunks)), [HEADER, ROWS[0], ROWS[1], ROWS[3]])
+
+    def test_reads_only_size(self):
+        """Test that rows past the given size (appended later) are left out."""
+        size = self.stored.index(b"Pixel")
+        self.assertEqual(_rows(self._export(size=size)), [HEADER, ROWS[0], ROWS[1]])
+        self.assertEqual(_rows(self._export(size=size, point="B3")), [HEADER, ROWS[0]])
+
+    def test_gzip_chunks(self):
+        """Test that compressed chunks form one gzip stream."""
+        with mock.patch.object(csv_export, "CHUNK_BYTES", 16):
+            data = b"".join(gzip_chunks(iter_csv(open(self.path, "rb"), len(self.stored))))
+        self.assertEqual(gzip.decompress(data), self.stored)
+
+
+class TestExportEtag(unittest.TestCase):
+    """Test ETags for file state, filters and encoding."""
+
+    def test_etag(self):
+        """Test that appends, filters and encoding change the ETag."""
+        st = os.stat_result((0o644, 7, 0, 1, 0, 0, 100, 0, 0, 0))
+        etag = export_etag(st, {"device": "S24FE", "point": None})
+        self.assertEqual(etag, export_etag(st, {"point": None, "device": "S24FE"}))
+        appended = os.stat_result((0o644, 7, 0, 1, 0, 0, 150, 0, 0, 0))
+        self.assertNotEqual(etag, export_etag(appended, {"device": "S24FE"}))
+        self.assertNotEqual(etag, export_etag(st, {}))
+        self.assertEqual(export_etag(st, {"device": "S24FE"}, "gzip"), etag + "-gzip")
+
+
+if __name__ == "__main__":
+    unittest.main()
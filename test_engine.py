@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the measurement engine.
+Tests the loop thread bridge and subprocess handling without a shell.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from engine import MeasurementEngine, ProcessCancelled, aclosing, run_exec, stream_lines, supervisor, until_set
+
+
+def _running(pid):
+    """True if pid exists and is not a zombie waiting to be reaped by init."""
+    if not os.path.isdir("/proc"):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+class TestMeasurementEngine(unittest.TestCase):
+    """Test the event loop thread and its bridges."""
+
+    def setUp(self):
+        self.engine = MeasurementEngine(name="test-engine")
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_run(self):
+        """Test that coroutines run on the engine thread."""
+        async def where():
+            await asyncio.sleep(0)
+            return threading.current_thread().name
+        self.assertEqual(self.engine.run(where()), "test-engine")
+
+    def test_thread_count_is_constant(self):
+        """Test that concurrent subprocesses don't add threads."""
+        self.engine.start()
+        before = threading.active_count()
+
+        async def many():
+            argv = [sys.executable, "-c", "import time; time.sleep(0.3)"]
+            return await asyncio.gather(*(run_exec(argv, timeout=10) for _ in range(5)))
+
+        future = asyncio.run_coroutine_threadsafe(many(), self.engine.loop)
+        peak = before
+        while not future.done():
+            peak = max(peak, threading.active_count())
+            time.sleep(0.05)
+        self.assertTrue(all(rc == 0 for _, _, rc in future.result()))
+        if hasattr(os, "pidfd_open"):
+            self.assertEqual(peak, before)
+
+
+class TestSubprocesses(unittest.TestCase):
+    """Test running commands without a shell."""
+
+    def setUp(self):
+        self.engine = MeasurementEngine(name="test-engine")
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_stream_lines(self):
+        """Test that output lines are yielded as they arrive, stderr merged."""
+        argv = [sys.executable, "-c", "import sys; print('a'); print('b', file=sys.stderr); print('c')"]
+
+        async def collect():
+            return [line async for line in stream_lines(argv, timeout=10)]
+        self.assertEqual(sorted(self.engine.run(collect())), ["a", "b", "c"])
+
+    def test_early_close_and_timeout_reap_process(self):
+        """Test that closing early or timing out terminates the child."""
+        argv = [sys.executable, "-u", "-c", "import time\nwhile True:\n    print('x'); time.sleep(0.05)"]
+
+        async def first_line():
+            async with aclosing(stream_lines(argv, timeout=10)) as lines:
+                async for line in lines:
+                    return line
+
+        async def until_timeout():
+            with self.assertRaises(asyncio.TimeoutError):
+                async for _ in stream_lines(argv, timeout=0.3):
+                    pass
+
+        self.assertEqual(self.engine.run(first_line(), timeout=10), "x")
+        self.engine.run(until_timeout(), timeout=10)
+
+    def test_run_exec(self):
+        """Test output capture, launch failures and shell metacharacters."""
+        out, _, rc = self.engine.run(run_exec([sys.executable, "-c", "import sys; print(sys.argv[1])", "a;b"]))
+        self.assertEqual((out.strip(), rc), ("a;b", 0))
+        _, err, rc = self.engine.run(run_exec(["/nonexistent/binary"]))
+        self.assertEqual(rc, -1)
+        self.assertTrue(err)
+
+
+
+class TestProcessSupervisor(unittest.TestCase):
+    """Test deadlines, cancellation and reaping of process groups."""
+
+    def setUp(self):
+        self.engine = MeasurementEngine(name="test-engine")
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_cancel_kills_process_group_quickly(self):
+        """Test that should_stop terminates the whole group within a few ticks."""
+        flag = {"stop": False}
+        # The child starts a grandchild in the same group; both must go
+        argv = [sys.executable, "-u", "-c",
+                "import subprocess, sys, time\n"
+                "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+                "print(p.pid)\n"
+                "time.sleep(60)"]
+
+        async def run():
+            pids = []
+            with self.assertRaises(ProcessCancelled):
+                async for line in stream_lines(argv, timeout=30, should_stop=lambda: flag["stop"]):
+                    pids.append(int(line))
+                    flag["stop"] = True
+                    start = time.monotonic()
+            return pids[0], time.monotonic() - start
+
+        grandchild, elapsed = self.engine.run(run(), timeout=20)
+        self.assertLess(elapsed, 1.0)
+        time.sleep(0.2)
+        self.assertFalse(_running(grandchild))
+        self.assertEqual(supervisor.stats()["running"], 0)
+
+    def test_early_close_drains_chatty_child(self):
+        """Test that closing early reaps a child that keeps writing past the pipe buffer."""
+        argv = [sys.executable, "-c",
+                "import signal, sys\n"
+                "signal.signal(signal.SIGTERM, lambda *a: (sys.stdout.write('x' * 1000000), sys.exit(0)))\n"
+                "print('ready', flush=True)\n"
+                "signal.pause()"]
+
+        async def run():
+            start = time.monotonic()
+            async with aclosing(stream_lines(argv, timeout=30)) as lines:
+                async for _ in lines:
+                    break
+            return time.monotonic() - start
+
+        self.assertLess(self.engine.run(run(), timeout=20), 2.0)
+
+    def test_until_set_ends_process_without_cancelling(self):
+        """Test that the event ends a silent process quickly and it isn't counted as cancelled."""
+        argv = [sys.executable, "-u", "-c", "import time\nprint('x')\ntime.sleep(60)"]
+
+        async def run():
+            finished = asyncio.Event()
+            seen = []
+            async with aclosing(stream_lines(argv, timeout=30, should_stop=lambda: False)) as lines:
+                async for line in until_set(lines, finished):
+                    seen.append(line)
+                    asyncio.get_running_loop().call_later(0.2, finished.set)
+            return seen
+
+        before = supervisor.stats()
+        start = time.monotonic()
+        self.assertEqual(self.engine.run(run(), timeout=20), ["x"])
+        self.assertLess(time.monotonic() - start, 3.0)
+        after = supervisor.stats()
+        self.assertEqual(after["killed_cancelled"], before["killed_cancelled"])
+        self.assertEqual(after["reaped"], before["reaped"] + 1)
+        self.assertEqual(after["running"], 0)
+
+    def test_run_exec_deadline(self):
+        """Test that run_exec stops a process at its deadline."""
+        start = time.monotonic()
+        _, err, rc = self.engine.run(run_exec([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.3))
+        self.assertEqual((err, rc), ("timeout", -1))
+        self.assertLess(time.monotonic() - start, 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the iperf3 output parser.
+Covers --json-stream records and the plain text fallback.
+"""
+
+import json
+import unittest
+from iperf_parser import BidirStreamParser, IperfStreamParser
+
+
+def _record(event, data):
+    return json.dumps({"event": event, "data": data})
+
+
+class TestIperfJsonStream(unittest.TestCase):
+    """Test parsing of --json-stream output."""
+
+    def test_interval_and_end(self):
+        """Test that intervals are live values and end gives the final result."""
+        parser = IperfStreamParser(json_stream=True)
+        self.assertIsNone(parser.feed(_record("start", {"version": "iperf 3.17"})))
+        self.assertEqual(parser.feed(_record("interval", {"sum": {"start": 0, "end": 1, "bits_per_second": 90e6}})), 90.0)
+        self.assertEqual(parser.feed(_record("interval", {"sum": {"start": 1, "end": 2, "bits_per_second": 110e6}})), 110.0)
+        parser.feed(_record("end", {"sum_sent": {"bits_per_second": 101e6}, "sum_received": {"bits_per_second": 100e6}}))
+        self.assertEqual(len(parser.intervals), 2)
+        self.assertEqual(parser.result_mbps(), 100.0)
+
+    def test_interval_keeps_per_stream_values(self):
+        """Test that per-stream rates from the interval record are kept."""
+        parser = IperfStreamParser(json_stream=True, streams=2)
+        parser.feed(_record("interval", {
+            "streams": [{"socket": 5, "bits_per_second": 40e6}, {"socket": 7, "bits_per_second": 45e6}],
+            "sum": {"start": 0, "end": 1, "bits_per_second": 85e6}}))
+        self.assertEqual(parser.intervals[0]["streams"], {"5": 40.0, "7": 45.0})
+
+    def test_error_event(self):
+        """Test that iperf3 error events are captured."""
+        parser = IperfStreamParser(json_stream=True)
+        parser.feed(_record("error", "the server is busy running a test"))
+        self.assertIn("busy", parser.error)
+        self.assertEqual(parser.result_mbps(), 0.0)
+
+    def test_interrupted_run_uses_interval_mean(self):
+        """Test fallback to the interval mean when no end record arrives."""
+        parser = IperfStreamParser(json_stream=True)
+        parser.feed(_record("interval", {"sum": {"bits_per_second": 80e6}}))
+        parser.feed(_record("interval", {"sum": {"bits_per_second": 100e6}}))
+        self.assertEqual(parser.result_mbps(), 90.0)
+
+
+class TestIperfTextFallback(unittest.TestCase):
+    """Test parsing of plain text output from older iperf3 builds."""
+
+    def test_text_output(self):
+        """Test live interval values and receiver summary."""
+        parser = IperfStreamParser(json_stream=False)
+        self.assertIsNone(parser.feed("Connecting to host 192.168.1.10, port 5201"))
+        self.assertEqual(parser.feed("[  5]   0.00-1.00   sec  11.2 MBytes  94.1 Mbits/sec    0    338 KBytes"), 94.1)
+        parser.feed("[  5]   0.00-10.00  sec   112 MBytes  94.5 Mbits/sec    0             sender")
+        parser.feed("[  5]   0.00-10.04  sec   111 MBytes  93.2 Mbits/sec                  receiver")
+        self.assertEqual(parser.result_mbps(), 93.2)
+
+    def test_text_error(self):
+        """Test that iperf3 errors are captured in text mode."""
+        parser = IperfStreamParser(json_stream=False)
+        parser.feed("iperf3: error - unable to connect to server: Connection refused")
+        self.assertIsNotNone(parser.error)
+
+    def test_parallel_streams_coalesced_per_interval(self):
+        """Test that -P N output gives one value per interval, from the [SUM] line."""
+        parser = IperfStreamParser(json_stream=False, streams=2)
+        lines = [
+            "[  5]   0.00-1.00   sec  5.50 MBytes  46.1 Mbits/sec    0    200 KBytes",
+            "[  7]   0.00-1.00   sec  5.62 MBytes  47.2 Mbits/sec    0    210 KBytes",
+            "[SUM]   0.00-1.00   sec  11.1 MBytes  93.3 Mbits/sec    0",
+            "- - - - - - - - - - - - - - - - - - - - - - - - -",
+            "[  5]   1.00-2.00   sec  5.00 MBytes  42.0 Mbits/sec    0    200 KBytes",
+            "[  7]   1.00-2.00   sec  6.00 MBytes  51.0 Mbits/sec    0    210 KBytes",
+            "[SUM]   1.00-2.00   sec  11.0 MBytes  93.0 Mbits/sec    0",
+        ]
+        values = [v for v in (parser.feed(line) for line in lines) if v is not None]
+        self.assertEqual(values, [93.3, 93.0])
+        self.assertEqual(parser.intervals[0]["streams"], {"5": 46.1, "7": 47.2})
+        self.assertEqual(parser.intervals[1]["start"], 1.0)
+
+        parser.feed("[SUM]   0.00-2.00   sec  22.1 MBytes  93.1 Mbits/sec    0             sender")
+        self.assertFalse(parser.last_was_report)
+        parser.feed("[SUM]   0.00-2.04   sec  22.0 MBytes  92.8 Mbits/sec                  receiver")
+        self.assertEqual(parser.result_mbps(), 92.8)
+
+    def test_units_and_missing_sum(self):
+        """Test Kbits/Gbits conversion and stream totals when no [SUM] is printed."""
+        parser = IperfStreamParser(json_stream=False, streams=2)
+        self.assertIsNone(parser.feed("[  5]   0.00-1.00   sec   120 KBytes   980 Kbits/sec"))
+        self.assertIsNone(parser.feed("[  7]   0.00-1.00   sec   118 MBytes  1.02 Gbits/sec"))
+        # Next interval flushes the previous block as the sum of its streams
+        self.assertEqual(parser.feed("[  5]   1.00-2.00   sec   120 KBytes   500 Kbits/sec"), 1020.98)
+        self.assertTrue(parser.last_was_report)
+
+    def test_single_stream_summary_fallback(self):
+        """Test per-stream summary lines when iperf3 prints no [SUM] summary."""
+        parser = IperfStreamParser(json_stream=False, streams=1)
+        self.assertEqual(parser.feed("[  5]   0.00-1.00   sec  1.12 GBytes  9.41 Gbits/sec"), 9410.0)
+        parser.feed("[  5]   0.00-10.00  sec  11.0 GBytes  9.40 Gbits/sec    0             sender")
+        self.assertEqual(parser.result_mbps(), 9400.0)
+
+
+class TestIperfBidir(unittest.TestCase):
+    """Test splitting --bidir output into download and upload."""
+
+    def test_json_stream_directions(self):
+        """Test sum/sum_bidir_reverse intervals and per-direction end totals."""
+        parser = BidirStreamParser(json_stream=True, streams=1)
+        values = parser.feed(_record("interval", {
+            "streams": [{"socket": 5, "bits_per_second": 40e6, "sender": True},
+                        {"socket": 7, "bits_per_second": 90e6, "sender": False}],
+            "sum": {"start": 0, "end": 1, "bits_per_second": 40e6, "sender": True},
+            "sum_bidir_reverse": {"start": 0, "end": 1, "bits_per_second": 90e6, "sender": False}}))
+        self.assertEqual(values, {"dl": 40.0, "ul": 90.0})
+        self.assertTrue(parser.last_was_report)
+        self.assertEqual(parser.intervals["ul"][0]["streams"], {"7": 90.0})
+        parser.feed(_record("end", {
+            "sum_sent": {"bits_per_second": 41e6}, "sum_received": {"bits_per_second": 40e6},
+            "sum_sent_bidir_reverse": {"bits_per_second": 92e6},
+            "sum_received_bidir_reverse": {"bits_per_second": 91e6}}))
+        self.assertEqual(parser.result_mbps(), {"dl": 40.0, "ul": 91.0})
+
+    def test_text_roles(self):
+        """Test [TX-C]/[RX-C] report lines and summaries in text mode."""
+        parser = BidirStreamParser(json_stream=False, streams=2)
+        lines = [
+            "[  5][TX-C]   0.00-1.00   sec  2.50 MBytes  21.0 Mbits/sec    0    200 KBytes",
+            "[  7][TX-C]   0.00-1.00   sec  2.50 MBytes  19.0 Mbits/sec    0    200 KBytes",
+            "[SUM][TX-C]   0.00-1.00   sec  5.00 MBytes  40.0 Mbits/sec    0",
+            "[  9][RX-C]   0.00-1.00   sec  5.50 MBytes  46.0 Mbits/sec",
+            "[ 11][RX-C]   0.00-1.00   sec  5.30 MBytes  44.0 Mbits/sec",
+            "[SUM][RX-C]   0.00-1.00   sec  10.8 MBytes  90.0 Mbits/sec",
+        ]
+        values = [v for v in (parser.feed(line) for line in lines) if v is not None]
+        self.assertEqual(values, [{"dl": 40.0}, {"ul": 90.0}])
+        parser.feed("[SUM][TX-C]   0.00-1.00   sec  5.00 MBytes  40.0 Mbits/sec    0             sender")
+        self.assertFalse(parser.last_was_report)
+        parser.feed("[SUM][TX-C]   0.00-1.04   sec  4.90 MBytes  39.5 Mbits/sec                  receiver")
+        parser.feed("[SUM][RX-C]   0.00-1.04   sec  10.7 MBytes  89.0 Mbits/sec                  receiver")
+        self.assertEqual(parser.result_mbps(), {"dl": 39.5, "ul": 89.0})
+
+    def test_same_directions_as_separate_stages(self):
+        """Test that bidir dl/ul match the DL (plain) and UL (-R) stages for the same traffic."""
+        client_tx = {"socket": 5, "bits_per_second": 40e6, "sender": True}
+        client_rx = {"socket": 7, "bits_per_second": 90e6, "sender": False}
+        tx_sum = {"start": 0, "end": 1, "bits_per_second": 40e6, "sender": True}
+        rx_sum = {"start": 0, "end": 1, "bits_per_second": 90e6, "sender": False}
+        separate = {"dl": IperfStreamParser(json_stream=True), "ul": IperfStreamParser(json_stream=True)}
+        separate["dl"].feed(_record("interval", {"streams": [client_tx], "sum": tx_sum}))
+        separate["dl"].feed(_record("end", {"sum_sent": {"bits_per_second": 40e6},
+                                            "sum_received": {"bits_per_second": 39e6}}))
+        separate["ul"].feed(_record("interval", {"streams": [client_rx], "sum": rx_sum}))
+        separate["ul"].feed(_record("end", {"sum_sent": {"bits_per_second": 91e6},
+                                            "sum_received": {"bits_per_second": 90e6}}))
+        bidir = BidirStreamParser(json_stream=True)
+        bidir.feed(_record("interval", {"streams": [client_tx, client_rx], "sum": tx_sum,
+                                        "sum_bidir_reverse": rx_sum}))
+        bidir.feed(_record("end", {
+            "sum_sent": {"bits_per_second": 40e6}, "sum_received": {"bits_per_second": 39e6},
+            "sum_sent_bidir_reverse": {"bits_per_second": 91e6},
+            "sum_received_bidir_reverse": {"bits_per_second": 90e6}}))
+        self.assertEqual(bidir.result_mbps(), {key: p.result_mbps() for key, p in separate.items()})
+        for key, parser in separate.items():
+            self.assertEqual(bidir.intervals[key][0]["mbps"], parser.intervals[0]["mbps"])
+
+
+if __name__ == "__main__":
+    unittest.main()
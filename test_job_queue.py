@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the job queue.
+Tests the concurrency limit, priorities, admission control and positions.
+"""
+
+import asyncio
+import time
+import unittest
+from engine import MeasurementEngine
+from job_queue import JobQueue, QueueFull, PRIORITY_POINT, PRIORITY_SURVEY
+from task_state import TaskState
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestJobQueue(unittest.TestCase):
+    """Test admission control and scheduling."""
+
+    def setUp(self):
+        self.engine = MeasurementEngine(name="test-jobs")
+        self.order = []
+        self.gate = None
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def _job(self, task):
+        async def run():
+            self.order.append(task.task_id)
+            task.update(status="running")
+            while not self.gate.is_set():
+                await asyncio.sleep(0.01)
+            task.update(status="finished")
+        return run
+
+    def _open_gate(self):
+        self.engine.run(self._set_gate())
+
+    async def _set_gate(self):
+        self.gate.set()
+
+    def _make_gate(self):
+        async def make():
+            return asyncio.Event()
+        self.gate = self.engine.run(make())
+
+    def test_limit_priority_and_positions(self):
+        """Test that points overtake queued surveys and positions/ETAs are published."""
+        self._make_gate()
+        queue = JobQueue(self.engine, max_concurrent=1, max_queued=5)
+        first, survey, point = TaskState("first"), TaskState("survey"), TaskState("point")
+        queue.submit(first, self._job(first), PRIORITY_POINT, estimate_s=10)
+        self.assertTrue(_wait_until(lambda: first.status == "running"))
+        queue.submit(survey, self._job(survey), PRIORITY_SURVEY, estimate_s=100)
+        queue.submit(point, self._job(point), PRIORITY_POINT, estimate_s=10)
+
+        self.assertTrue(_wait_until(lambda: survey.queue_position == 2 and point.queue_position == 1))
+        self.assertEqual(survey.status, "queued")
+        self.assertGreater(survey.eta_s, point.eta_s)
+        self.assertEqual(survey.snapshot().to_dict()["queue_position"], 2)
+        self.assertEqual(queue.stats()["running"], 1)
+
+        self._open_gate()
+        self.assertTrue(_wait_until(lambda: survey.status == "finished"))
+        self.assertEqual(self.order, ["first", "point", "survey"])
+        self.assertIsNone(survey.queue_position)
+
+    def test_queue_full_and_cancel(self):
+        """Test rejection when the queue is full and cancelling a queued job."""
+        self._make_gate()
+        queue = JobQueue(self.engine, max_concurrent=1, max_queued=1)
+        running, waiting, extra = TaskState("a"), TaskState("b"), TaskState("c")
+        queue.submit(running, self._job(running), estimate_s=30)
+        self.assertTrue(_wait_until(lambda: running.status == "running"))
+        queue.submit(waiting, self._job(waiting), estimate_s=30)
+        with self.assertRaises(QueueFull) as ctx:
+            queue.submit(extra, self._job(extra))
+        self.assertGreater(ctx.exception.retry_after_s, 0)
+        self.assertEqual(queue.stats()["rejected"], 1)
+
+        self.assertTrue(queue.cancel("b"))
+        self.assertEqual(waiting.status, "cancelled")
+        self.assertFalse(queue.cancel("b"))
+        queue.submit(extra, self._job(extra))
+
+        self._open_gate()
+        self.assertTrue(_wait_until(lambda: extra.status == "finished"))
+        self.assertNotIn("b", self.order)
+
+    def test_cancel_running_job(self):
+        """Test that cancelling a running job interrupts it right away."""
+        self._make_gate()
+        queue = JobQueue(self.engine, max_concurrent=1)
+        task = TaskState("run")
+        queue.submit(task, self._job(task))
+        self.assertTrue(_wait_until(lambda: task.status == "running"))
+        self.assertTrue(queue.cancel("run"))
+        self.assertTrue(_wait_until(lambda: task.status == "cancelled", timeout=1))
+        self.assertTrue(_wait_until(lambda: queue.stats()["running"] == 0))
+
+    def test_failed_job_marks_task_error(self):
+        """Test that an exception in a job ends its task with status error."""
+        queue = JobQueue(self.engine, max_concurrent=1)
+        task = TaskState("bad")
+
+        async def boom():
+            raise RuntimeError("boom")
+        queue.submit(task, boom)
+        self.assertTrue(_wait_until(lambda: task.status == "error"))
+        self.assertIn("Error: boom", task.snapshot().logs())
+        self.assertTrue(_wait_until(lambda: queue.stats()["running"] == 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
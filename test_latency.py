@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the latency statistics module.
+Tests the streaming accumulator against the exact computation.
+"""
+
+import random
+import unittest
+from latency import LatencyStats, P2Quantile, percentile
+
+
+class TestPercentile(unittest.TestCase):
+    """Test the exact percentile helper."""
+
+    def test_interpolation(self):
+        """Test linear interpolation between ranks."""
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([4.0, 1.0, 3.0, 2.0], 50), 2.5)
+        self.assertEqual(percentile([1.0, 2.0, 3.0], 100), 3.0)
+
+
+class TestP2Quantile(unittest.TestCase):
+    """Test the P-square estimator."""
+
+    def test_exact_for_few_values(self):
+        """Test that the first five observations give the exact percentile."""
+        sketch = P2Quantile(0.5)
+        for v in (5.0, 1.0, 3.0):
+            sketch.add(v)
+        self.assertEqual(sketch.value(), 3.0)
+
+    def test_converges_on_large_stream(self):
+        """Test that the estimate stays close to the exact quantile."""
+        rng = random.Random(42)
+        values = [rng.gauss(20.0, 4.0) for _ in range(5000)]
+        for p in (0.5, 0.95, 0.99):
+            sketch = P2Quantile(p)
+            for v in values:
+                sketch.add(v)
+            self.assertAlmostEqual(sketch.value(), percentile(values, p * 100), delta=1.0)
+
+
+class TestLatencyStats(unittest.TestCase):
+    """Test the streaming latency accumulator."""
+
+    def test_running_values_match_batch(self):
+        """Test that mean and jitter match the batch formulas."""
+        values = [10.0, 12.0, 11.0, 15.0, 9.0, 10.5]
+        stats = LatencyStats()
+        for v in values:
+            stats.add(v)
+        summary = stats.summary(expected=8)
+        diffs = [abs(values[i] - values[i - 1]) for i in range(1, len(values))]
+        self.assertAlmostEqual(summary["avg_ms"], sum(values) / len(values))
+        self.assertAlmostEqual(summary["jitter_ms"], sum(diffs) / len(diffs))
+        self.assertEqual(summary["loss_pct"], 25.0)
+
+    def test_exact_summary(self):
+        """Test that exact=True uses all values."""
+        rng = random.Random(7)
+        values = [rng.expovariate(0.1) for _ in range(500)]
+        stats = LatencyStats()
+        for v in values:
+            stats.add(v)
+        summary = stats.summary(exact=True)
+        self.assertEqual(summary["p50_ms"], percentile(values, 50))
+        self.assertEqual(summary["p99_ms"], percentile(values, 99))
+        self.assertIsNone(summary["loss_pct"])
+
+    def test_empty(self):
+        """Test that an empty accumulator reports no values."""
+        summary = LatencyStats().summary(expected=5, exact=True)
+        self.assertIsNone(summary["avg_ms"])
+        self.assertIsNone(summary["jitter_ms"])
+        self.assertIsNone(summary["p95_ms"])
+        self.assertEqual(summary["loss_pct"], 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
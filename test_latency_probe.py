@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the latency probes.
+Runs UDP and TCP probes against a local echo responder.
+"""
+
+import asyncio
+import time
+import unittest
+from echo_responder import serve
+from engine import aclosing
+from latency_probe import ICMP_MIN_USER_INTERVAL_S, ProbeUnavailable, ping_interval_s, probe_rtts
+
+
+async def _collect(mode, port, count, interval_s, **kwargs):
+    return [rtt async for rtt in probe_rtts(mode, "127.0.0.1", port, count, interval_s, **kwargs)]
+
+
+class TestProbeRtts(unittest.TestCase):
+    """Test interval-driven UDP and TCP-connect probes."""
+
+    def _with_responder(self, body):
+        async def run():
+            udp, tcp = await serve("127.0.0.1", 0)
+            try:
+                return await body(tcp.sockets[0].getsockname()[1])
+            finally:
+                udp.close()
+                tcp.close()
+        return asyncio.run(run())
+
+    def test_udp_and_tcp_probes(self):
+        """Test that every probe is answered and the run lasts about count x interval."""
+        for mode in ("udp", "tcp"):
+            start = time.monotonic()
+            rtts = self._with_responder(lambda port: _collect(mode, port, 10, 0.02))
+            elapsed = time.monotonic() - start
+            self.assertEqual(len(rtts), 10, mode)
+            self.assertTrue(all(rtt is not None and rtt >= 0 for rtt in rtts), mode)
+            self.assertLess(elapsed, 2.0, mode)
+
+    def test_should_stop_ends_run(self):
+        """Test that should_stop ends the run early."""
+        stop_at = time.monotonic() + 0.1
+        rtts = self._with_responder(
+            lambda port: _collect("udp", port, 1000, 0.01, should_stop=lambda: time.monotonic() >= stop_at)
+        )
+        self.assertLess(len(rtts), 100)
+
+    def test_refused_responder(self):
+        """Test that a closed port raises ProbeUnavailable right away."""
+        async def closed_port():
+            udp, tcp = await serve("127.0.0.1", 0)
+            port = tcp.sockets[0].getsockname()[1]
+            udp.close()
+            tcp.close()
+            await tcp.wait_closed()
+            return port
+
+        port = asyncio.run(closed_port())
+        for mode in ("udp", "tcp"):
+            with self.assertRaises(ProbeUnavailable, msg=mode):
+                asyncio.run(_collect(mode, port, 5, 0.01, timeout_s=0.5))
+
+    def test_early_close(self):
+        """Test that closing the iterator early stops probing cleanly."""
+        async def first_three(port):
+            out = []
+            async with aclosing(probe_rtts("udp", "127.0.0.1", port, 100, 0.01)) as rtts:
+                async for rtt in rtts:
+                    out.append(rtt)
+                    if len(out) == 3:
+                        break
+            return out
+
+        self.assertEqual(len(self._with_responder(first_three)), 3)
+
+
+class TestPingInterval(unittest.TestCase):
+    """Test the ping -i interval clamp."""
+
+    def test_clamp(self):
+        """Test that sub-200 ms intervals are only kept for root."""
+        self.assertEqual(ping_interval_s(0.5), 0.5)
+        self.assertGreaterEqual(ping_interval_s(0.05), 0.05)
+        self.assertLessEqual(ping_interval_s(0.05), ICMP_MIN_USER_INTERVAL_S)
+
+
+if __name__ == "__main__":
+    unittest.main()
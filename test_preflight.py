@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pre-flight checks.
+Tests the reachability TTL cache with a fake probe.
+"""
+
+import asyncio
+import unittest
+from preflight import ReachabilityCache
+
+
+class TestReachabilityCache(unittest.TestCase):
+    """Test caching and sharing of reachability checks."""
+
+    def setUp(self):
+        self.calls = []
+        self.result = True
+
+    async def _probe(self, host):
+        self.calls.append(host)
+        await asyncio.sleep(0.01)
+        return self.result
+
+    def test_result_reused_within_ttl(self):
+        """Test that consecutive checks within the TTL probe once."""
+        async def run():
+            cache = ReachabilityCache(self._probe, ttl_s=60)
+            results = [await cache.check("10.0.0.1") for _ in range(3)]
+            return results, cache.stats()
+
+        results, stats = asyncio.run(run())
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(self.calls, ["10.0.0.1"])
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_expired_result_is_probed_again(self):
+        """Test that a zero TTL probes every time and caches failures too."""
+        self.result = False
+
+        async def run():
+            cache = ReachabilityCache(self._probe, ttl_s=0)
+            return [await cache.check("10.0.0.1") for _ in range(2)]
+
+        self.assertEqual(asyncio.run(run()), [False, False])
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_checks_share_probe(self):
+        """Test that concurrent callers share one in-flight probe, even if one is cancelled."""
+        async def run():
+            cache = ReachabilityCache(self._probe, ttl_s=60)
+            first = asyncio.ensure_future(cache.check("10.0.0.1"))
+            second = asyncio.ensure_future(cache.check("10.0.0.1"))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(self.calls, ["10.0.0.1"])
+
+    def test_probe_error_means_unreachable(self):
+        """Test that a failing probe reports the host as unreachable."""
+        async def broken(host):
+            raise OSError("no ping binary")
+
+        async def run():
+            return await ReachabilityCache(broken).check("10.0.0.1")
+
+        self.assertFalse(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()
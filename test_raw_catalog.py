@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the raw results catalog.
+Tests filename parsing, filtered cursor pages and picking up external changes.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from raw_catalog import RawCatalog, parse_raw_name
+
+
+class TestParseRawName(unittest.TestCase):
+    """Test catalog entries parsed from file names."""
+
+    def test_names(self):
+        """Test point names with underscores and foreign files."""
+        entry = parse_raw_name("Lab_B3_12_20261001T101500Z.json")
+        self.assertEqual((entry.point, entry.run, entry.timestamp), ("Lab_B3", 12, "2026-10-01T10:15:00Z"))
+        compressed = parse_raw_name("B3_2_20261001T101500Z.json.gz")
+        self.assertEqual((compressed.point, compressed.run), ("B3", 2))
+        other = parse_raw_name("notes.txt")
+        self.assertEqual((other.point, other.timestamp), (None, ""))
+
+
+class TestRawCatalog(unittest.TestCase):
+    """Test listing, filters and refresh."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for day in range(1, 10):
+            for point in ("B3", "C1"):
+                self._touch(f"{point}_1_202610{day:02d}T100000Z.json")
+        self._touch("README.txt")
+        self.catalog = RawCatalog(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _touch(self, name):
+        with open(os.path.join(self.tmpdir, name), "w") as f:
+            f.write("{}")
+
+    def _all(self, **kwargs):
+        names, cursor = [], None
+        while True:
+            entries, cursor = self.catalog.query(cursor=cursor, **kwargs)
+            names.extend(e.name for e in entries)
+            if cursor is None:
+                return names
+
+    def test_pages_newest_first(self):
+        """Test that cursor pages cover every file once, newest first."""
+        names = self._all(limit=4)
+        self.assertEqual(len(names), 19)
+        self.assertEqual(names[0], "C1_1_20261009T100000Z.json")
+        self.assertEqual(names[-1], "README.txt")
+
+    def test_point_and_time_filters(self):
+        """Test point and inclusive date filters, which exclude foreign files."""
+        names = self._all(point="B3", since="2026-10-03T00:00:00Z", until="2026-10-05T23:59:59Z", limit=2)
+        self.assertEqual(names, [f"B3_1_202610{d:02d}T100000Z.json" for d in (5, 4, 3)])
+        self.assertEqual(self._all(point="Z9"), [])
+        self.assertNotIn("README.txt", self._all(since="2026-01-01T00:00:00Z"))
+
+    def test_own_writes_and_external_changes(self):
+        """Test that written files are added and external changes picked up."""
+        self.catalog.query()
+        scans = self.catalog.scans
+        with self.catalog.writing("B3_2_20261010T100000Z.json"):
+            self._touch("B3_2_20261010T100000Z.json")
+        entries, _ = self.catalog.query(point="B3", limit=1)
+        self.assertEqual(entries[0].run, 2)
+
+        os.unlink(os.path.join(self.tmpdir, "C1_1_20261009T100000Z.json"))
+        self._touch("D4_1_20261011T100000Z.json")
+        names = self._all()
+        self.assertNotIn("C1_1_20261009T100000Z.json", names)
+        self.assertEqual(names[0], "D4_1_20261011T100000Z.json")
+        self.assertGreater(self.catalog.scans, scans)
+
+    def test_unchanged_directory_is_not_rescanned(self):
+        """Test that queries reuse the catalog while the directory is unchanged."""
+        os.utime(self.tmpdir, (1_000_000_000, 1_000_000_000))
+        self.catalog.query()
+        scans = self.catalog.scans
+        self.catalog.query(point="B3")
+        self.assertEqual(self.catalog.scans, scans)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor raises ValueError."""
+        with self.assertRaises(ValueError):
+            self.catalog.query(cursor="!!")
+
+
+if __name__ == "__main__":
+    unittest.main()
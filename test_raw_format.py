@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the raw result file formats.
+Tests the compact columnar layout, compressed round trips and file names.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import raw_format
+from raw_format import (compact_document, compression_of, expand_document, iter_plain_json, load_raw, plain_name,
+                        write_raw, zstd_available, RAW_EXTENSIONS, RAW_NAME_RE)
+from task_state import SampleBuffer, json_default
+
+
+def _doc():
+    samples = SampleBuffer()
+    samples.append(0.0, dl=0.0, ul=0.0, stage="ping", ping=12.5, rssi=-60)
+    samples.append(0.5, dl=95.25, ul=0.0, stage="download", rssi=-61, link=433)
+    samples.append(1.0, dl=101.5, ul=None, stage="download")
+    return {"wifi": {"ssid": "lab"}, "partial": {"dl_mbps": 101.5},
+            "final": {"device": "S24FE", "point": "B3", "iperf_dl_mbps": 98.0, "samples": samples},
+            "iperf_intervals": [{"start": 0, "end": 1, "mbps": 98.0}]}
+
+
+def _plain(doc):
+    return json.loads(json.dumps(doc, default=json_default))
+
+
+class TestCompactLayout(unittest.TestCase):
+    """Test moving samples to columns and back."""
+
+    def test_samples_stored_once_as_columns(self):
+        """Test that the compact layout holds the samples once, as columns."""
+        compact = compact_document(_doc())
+        self.assertNotIn("samples", compact["final"])
+        self.assertEqual(compact["samples"]["dl"], [0.0, 95.25, 101.5])
+        self.assertEqual(compact["samples"]["stage"], ["ping", "download", "download"])
+        self.assertEqual(compact["format"], "compact")
+
+    def test_expand_restores_original_layout(self):
+        """Test that expanding gives the same document as the indented format."""
+        doc = _doc()
+        expanded = expand_document(_plain(compact_document(doc)))
+        self.assertEqual(expanded, _plain(doc))
+        self.assertEqual(expanded["final"]["samples"], doc["final"]["samples"].rows())
+
+    def test_row_samples_and_plain_documents(self):
+        """Test compacting sample rows and leaving original documents untouched."""
+        doc = _plain(_doc())
+        self.assertEqual(expand_document(_plain(compact_document(doc))), doc)
+        self.assertIs(expand_document(doc), doc)
+
+    def test_plain_json_pieces(self):
+        """Test that the streamed original layout matches json.dumps of the expanded document."""
+        compact = _plain(compact_document(_doc()))
+        expected = json.dumps(expand_document(compact), indent=2)
+        with mock.patch.object(raw_format, "ROWS_PER_CHUNK", 2):
+            pieces = list(iter_plain_json(compact))
+        self.assertEqual("".join(pieces), expected)
+        self.assertGreater(len(pieces), 4)
+        empty = _plain(compact_document({"final": {"point": "B3", "samples": []}}))
+        self.assertEqual("".join(iter_plain_json(empty)), json.dumps(expand_document(empty), indent=2))
+        self.assertEqual("".join(iter_plain_json(_plain(_doc()))), json.dumps(_plain(_doc()), indent=2))
+
+
+class TestRawFiles(unittest.TestCase):
+    """Test writing and loading raw files."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _round_trip(self, compression):
+        path = os.path.join(self.tmpdir, "B3_1_20261001T100000Z" + RAW_EXTENSIONS[compression])
+        write_raw(path, _doc(), compression)
+        self.assertEqual(load_raw(path), _plain(_doc()))
+        return path
+
+    def test_plain_json(self):
+        """Test that the default format is the original indented JSON."""
+        path = self._round_trip(None)
+        with open(path) as f:
+            self.assertEqual(json.load(f), _plain(_doc()))
+
+    def test_gzip(self):
+        """Test that gzip files hold compact single-line JSON and are smaller."""
+        path = self._round_trip("gzip")
+        with gzip.open(path, "rt") as f:
+            text = f.read()
+        self.assertNotIn("\n", text)
+        self.assertLess(os.path.getsize(path), os.path.getsize(self._round_trip(None)))
+
+    @unittest.skipUnless(zstd_available(), "zstandard not installed")
+    def test_zstd(self):
+        """Test zstd compressed files."""
+        self._round_trip("zstd")
+
+    def test_names(self):
+        """Test compression detection and raw file name matching."""
+        self.assertEqual(compression_of("B3_1_20261001T100000Z.json.gz"), "gzip")
+        self.assertEqual(compression_of("B3_1_20261001T100000Z.json.zst"), "zstd")
+        self.assertIsNone(compression_of("B3_1_20261001T100000Z.json"))
+        self.assertEqual(plain_name("B3_1_20261001T100000Z.json.gz"), "B3_1_20261001T100000Z.json")
+        self.assertEqual(RAW_NAME_RE.match("Lab_B3_2_20261001T100000Z.json.zst").group("point"), "Lab_B3")
+        self.assertIsNone(RAW_NAME_RE.match("B3_1_20261001T100000Z.json.bz2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
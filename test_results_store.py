@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SQLite results store.
+Tests run inserts, filtered keyset pagination and raw file backfill.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from raw_format import write_raw
+from results_store import ResultsStore, decode_cursor
+
+
+def _result(device, point, timestamp, dl=100.0):
+    return {"device": device, "point": point, "timestamp": timestamp, "ssid": "lab", "rssi": -60,
+            "link_speed": "", "iperf_dl_mbps": dl, "iperf_ul_mbps": 50.0, "ping_avg_ms": 12.5,
+            "latency_mode": "idle", "samples": [{"t": 0.0}]}
+
+
+class TestResultsStore(unittest.TestCase):
+    """Test storing and querying runs."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ResultsStore(os.path.join(self.tmpdir, "results.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_run_round_trip(self):
+        """Test that a run keeps its columns, extra fields and samples."""
+        samples = [{"t": 0.0, "dl": 0.0, "ul": 0.0, "ping": None, "rssi": -60.0, "link": None, "stage": "ping"},
+                   {"t": 0.5, "dl": 99.0, "ul": 0.0, "ping": 12.0, "rssi": -61.0, "link": 433.0, "stage": "download"}]
+        run_id = self.store.add_run(_result("S24FE", "B3", "2026-10-01T10:00:00Z"), samples,
+                                    task_id="t1", run_index=2, raw_file="B3_2_20261001T100000Z.json")
+        run = self.store.get_run(run_id)
+        self.assertEqual((run["device"], run["point"], run["run_index"]), ("S24FE", "B3", 2))
+        self.assertEqual(run["rssi_dbm"], -60)
+        self.assertIsNone(run["link_speed_mbps"])
+        self.assertEqual(run["latency_mode"], "idle")
+        self.assertEqual(run["samples"], samples)
+        self.assertIsNone(self.store.get_run(run_id + 1))
+
+    def test_duplicate_task_is_ignored(self):
+        """Test that storing the same task twice keeps one run."""
+        first = self.store.add_run(_result("S24FE", "B3", "2026-10-01T10:00:00Z"), task_id="t1")
+        second = self.store.add_run(_result("S24FE", "B3", "2026-10-01T10:00:00Z"), task_id="t1")
+        self.assertEqual(first, second)
+        self.assertEqual(self.store.stats()["runs"], 1)
+
+    def test_filters_and_pagination(self):
+        """Test device/point/time filters and cursor pages, newest first."""
+        for day in range(1, 8):
+            for point in ("B3", "C1"):
+                self.store.add_run(_result("S24FE", point, f"2026-10-0{day}T10:00:00Z"))
+        self.store.add_run(_result("Pixel", "B3", "2026-10-05T10:00:00Z"))
+
+        runs, cursor = self.store.query_runs(device="S24FE", point="B3", since="2026-10-03T00:00:00Z",
+                                             until="2026-10-06T23:59:59Z", limit=3)
+        self.assertEqual([r["timestamp"][:10] for r in runs], ["2026-10-06", "2026-10-05", "2026-10-04"])
+        runs, cursor = self.store.query_runs(device="S24FE", point="B3", since="2026-10-03T00:00:00Z",
+                                             until="2026-10-06T23:59:59Z", limit=3, cursor=cursor)
+        self.assertEqual([r["timestamp"][:10] for r in runs], ["2026-10-03"])
+        self.assertIsNone(cursor)
+
+        seen = []
+        cursor = None
+        while True:
+            runs, cursor = self.store.query_runs(limit=4, cursor=cursor)
+            seen.extend(r["id"] for r in runs)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor raises ValueError."""
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+        with self.assertRaises(ValueError):
+            self.store.query_runs(cursor="!!")
+
+    def test_survey_rows(self):
+        """Test that surveys are recorded and runs can be listed by survey."""
+        self.store.start_survey("s1", "S24FE", ["B3", "C1"], 2, "2026-10-01T10:00:00Z")
+        self.store.add_run(_result("S24FE", "B3", "2026-10-01T10:01:00Z"), survey_id="s1")
+        self.store.finish_survey("s1", "finished", "2026-10-01T10:05:00Z")
+        with closing(sqlite3.connect(os.path.join(self.tmpdir, "results.db"))) as conn:
+            status, points = conn.execute("SELECT status, points FROM surveys WHERE id = 's1'").fetchone()
+        self.assertEqual((status, json.loads(points)), ("finished", ["B3", "C1"]))
+        runs, _ = self.store.query_runs(survey_id="s1")
+        self.assertEqual(len(runs), 1)
+
+    def test_import_raw_dir(self):
+        """Test backfilling from plain and compressed raw files, skipping ones already imported."""
+        raw_dir = os.path.join(self.tmpdir, "raw")
+        os.makedirs(raw_dir)
+        for name, point in (("B3_1_20261001T100000Z.json", "B3"), ("C1_2_20261001T101000Z.json", "C1")):
+            with open(os.path.join(raw_dir, name), "w") as f:
+                json.dump({"final": _result("S24FE", point, "2026-10-01T10:00:00Z")}, f)
+        write_raw(os.path.join(raw_dir, "D4_1_20261001T102000Z.json.gz"),
+                  {"final": _result("S24FE", "D4", "2026-10-01T10:20:00Z")}, "gzip")
+        with open(os.path.join(raw_dir, "notes.txt"), "w") as f:
+            f.write("ignored")
+        self.assertEqual(self.store.import_raw_dir(raw_dir), 3)
+        self.assertEqual(self.store.import_raw_dir(raw_dir), 0)
+        runs, _ = self.store.query_runs(point="C1")
+        self.assertEqual(runs[0]["run_index"], 2)
+        runs, _ = self.store.query_runs(point="D4")
+        self.assertEqual(self.store.get_run(runs[0]["id"])["samples"][0]["t"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the results CSV writer.
+Tests batching, flush and close, and row integrity under concurrent writers.
+"""
+
+import csv
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from results_writer import ResultsWriter
+
+HEADER = ["device", "point_id", "notes"]
+
+
+class TestResultsWriter(unittest.TestCase):
+    """Test the write-behind CSV appender."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "results.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _rows(self):
+        with open(self.path, newline="") as f:
+            return list(csv.reader(f))
+
+    def test_rows_wait_for_batch_or_flush(self):
+        """Test that rows are held until the batch fills or flush() is called."""
+        writer = ResultsWriter(self.path, header=HEADER, batch_rows=3, flush_interval_s=60)
+        try:
+            writer.write(["phone", "P1", "run:1"])
+            writer.write(["phone", "P2", "run:1"])
+            self.assertFalse(os.path.exists(self.path))
+            writer.write(["phone", "P3", "run:1"])
+            self.assertTrue(writer.flush(timeout=5))
+            self.assertEqual(len(self._rows()), 4)
+            writer.write(["phone", "P4", "run:1"])
+            self.assertTrue(writer.flush(timeout=5))
+            self.assertEqual(self._rows()[-1], ["phone", "P4", "run:1"])
+            self.assertEqual(writer.stats()["batches"], 2)
+        finally:
+            writer.close()
+
+    def test_interval_flush(self):
+        """Test that a partial batch is written after flush_interval_s."""
+        writer = ResultsWriter(self.path, batch_rows=100, flush_interval_s=0.05)
+        try:
+            writer.write(["phone", "P1", "run:1"])
+            for _ in range(100):
+                if os.path.exists(self.path) and os.path.getsize(self.path):
+                    break
+                threading.Event().wait(0.01)
+            self.assertEqual(self._rows(), [["phone", "P1", "run:1"]])
+        finally:
+            writer.close()
+
+    def test_close_writes_pending_rows(self):
+        """Test that close() writes queued rows and later writes are refused."""
+        writer = ResultsWriter(self.path, header=HEADER, batch_rows=100, flush_interval_s=60, fsync="never")
+        writer.write(["phone", "P1", 'quoted, "notes"\nwith newline'])
+        writer.close()
+        self.assertEqual(self._rows()[1], ["phone", "P1", 'quoted, "notes"\nwith newline'])
+        with self.assertRaises(RuntimeError):
+            writer.write(["phone", "P2", "run:1"])
+
+    def test_concurrent_writers_keep_rows_whole(self):
+        """Test that rows from many threads are never interleaved."""
+        writer = ResultsWriter(self.path, header=HEADER, batch_rows=7, flush_interval_s=0.01, fsync="never")
+
+        def produce(n):
+            for i in range(200):
+                writer.write([f"dev{n}", f"P{i}", "x" * (i % 50)])
+
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        writer.close()
+        rows = self._rows()
+        self.assertEqual(rows[0], HEADER)
+        self.assertEqual(len(rows), 1 + 8 * 200)
+        for row in rows[1:]:
+            i = int(row[1][1:])
+            self.assertEqual(row[2], "x" * (i % 50))
+
+    def test_recreated_file_gets_header(self):
+        """Test that a removed CSV is recreated with its header."""
+        writer = ResultsWriter(self.path, header=HEADER, batch_rows=1)
+        try:
+            writer.write(["phone", "P1", "run:1"])
+            writer.flush(timeout=5)
+            os.unlink(self.path)
+            writer.write(["phone", "P2", "run:1"])
+            writer.flush(timeout=5)
+            self.assertEqual(self._rows(), [HEADER, ["phone", "P2", "run:1"]])
+        finally:
+            writer.close()
+
+    def test_invalid_fsync_policy(self):
+        """Test that unknown fsync policies are rejected."""
+        with self.assertRaises(ValueError):
+            ResultsWriter(self.path, fsync="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the iperf3 server pool.
+Tests endpoint parsing and fair leasing.
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+import server_pool
+from server_pool import Endpoint, LocalServerError, ServerPool, parse_endpoints
+
+
+def _stderr(data):
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    return stream
+
+
+class TestParseEndpoints(unittest.TestCase):
+    """Test the [servers] endpoints syntax."""
+
+    def test_parse(self):
+        """Test host, host:port and :port items."""
+        self.assertEqual(parse_endpoints("", "10.0.0.1"), [Endpoint("10.0.0.1", 5201)])
+        self.assertEqual(
+            parse_endpoints("10.0.0.2:5202, :5203 10.0.0.3", "10.0.0.1"),
+            [Endpoint("10.0.0.2", 5202), Endpoint("10.0.0.1", 5203), Endpoint("10.0.0.3", 5201)]
+        )
+        self.assertEqual(len(parse_endpoints("a:5201,a:5201", "x")), 1)
+
+    def test_invalid_port(self):
+        """Test that bad ports are rejected."""
+        with self.assertRaises(ValueError):
+            parse_endpoints("host:http", "x")
+        with self.assertRaises(ValueError):
+            parse_endpoints("host:70000", "x")
+
+
+class TestServerPool(unittest.TestCase):
+    """Test leasing and the fair queue."""
+
+    def test_parallel_leases_up_to_pool_size(self):
+        """Test that N endpoints serve N stages at once."""
+        pool = ServerPool([Endpoint("a", 1), Endpoint("b", 2)])
+
+        async def main():
+            first = await pool.acquire()
+            second = await pool.acquire()
+            self.assertNotEqual(first, second)
+            self.assertTrue(pool.would_wait())
+            pool.release(first)
+            self.assertEqual(await pool.acquire(), first)
+        asyncio.run(main())
+        self.assertEqual(pool.stats()["leases"], 3)
+
+    def test_fifo_order(self):
+        """Test that waiters are served in arrival order, ahead of newcomers."""
+        pool = ServerPool([Endpoint("a", 1)])
+        order = []
+
+        async def job(name, hold):
+            async with pool.lease():
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        async def main():
+            first = asyncio.create_task(job("first", 0.05))
+            await asyncio.sleep(0)
+            queued = [asyncio.create_task(job(f"w{i}", 0.01)) for i in range(3)]
+            await asyncio.sleep(0.02)
+            late = asyncio.create_task(job("late", 0))
+            await asyncio.gather(first, late, *queued)
+        asyncio.run(main())
+        self.assertEqual(order, ["first", "w0", "w1", "w2", "late"])
+        self.assertEqual(pool.stats()["queued"], 4)
+
+    def test_cancelled_waiter_does_not_leak_endpoint(self):
+        """Test that a cancelled waiter leaves the endpoint to the next caller."""
+        pool = ServerPool([Endpoint("a", 1)])
+
+        async def main():
+            held = await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            pool.release(held)
+            self.assertEqual(await asyncio.wait_for(pool.acquire(), 1), held)
+        asyncio.run(main())
+        self.assertEqual(pool.stats()["in_use"], 1)
+
+    def test_hosts(self):
+        """Test distinct hosts in configuration order."""
+        pool = ServerPool(parse_endpoints("10.0.0.2:5202, 10.0.0.3, 10.0.0.2:5203", "10.0.0.1"))
+        self.assertEqual(pool.hosts(), ["10.0.0.2", "10.0.0.3"])
+
+    def test_local_servers_use_configured_host(self):
+        """Test that local leases carry the configured host and servers bind to it."""
+        pool = ServerPool.local_servers(2, "192.168.1.20", 5301)
+        spawn = mock.AsyncMock()
+
+        async def main():
+            spawn.return_value = mock.Mock(returncode=None, stderr=_stderr(b""))
+            with mock.patch("asyncio.create_subprocess_exec", spawn), \
+                    mock.patch.object(server_pool, "_LOCAL_STARTUP_S", 0):
+                return [await pool.acquire(), await pool.acquire()]
+        leases = asyncio.run(main())
+        self.assertEqual(leases, [Endpoint("192.168.1.20", 5301), Endpoint("192.168.1.20", 5302)])
+        args = spawn.call_args_list[0].args
+        self.assertEqual(args[:6], ("iperf3", "-s", "-B", "192.168.1.20", "-p", "5301"))
+
+    def test_local_server_failures(self):
+        """Test that a server that exits at startup or can't be spawned raises, freeing the endpoint."""
+        pool = ServerPool.local_servers(1)
+        spawn = mock.AsyncMock()
+
+        async def exited():
+            spawn.return_value = mock.Mock(returncode=1, stderr=_stderr(
+                b"iperf3: error - unable to start listener for connections: Address already in use\n"))
+            with mock.patch("asyncio.create_subprocess_exec", spawn), \
+                    mock.patch.object(server_pool, "_LOCAL_STARTUP_S", 0):
+                await pool.acquire()
+        with self.assertLogs("server_pool", "WARNING"), \
+                self.assertRaisesRegex(LocalServerError, "exited with code 1: .*Address already in use"):
+            asyncio.run(exited())
+        self.assertEqual(pool.stats()["in_use"], 0)
+
+        pool = ServerPool.local_servers(1, binary="/nonexistent/iperf3")
+        with self.assertRaisesRegex(LocalServerError, "cannot start"):
+            asyncio.run(pool.acquire())
+        self.assertEqual(pool.stats()["in_use"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
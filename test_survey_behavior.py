@@ -10,7 +10,9 @@ import time
 import threading
 
 try:
-    from app import app, tasks, tasks_lock
+    from app import app, tasks
+    from task_state import PartialState
+    from api_test_support import redirect_results
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
@@ -27,6 +29,7 @@ class TestSurveyBehavior(unittest.TestCase):
         self.app = app
         self.app.config['TESTING'] = True
         self.client = self.app.test_client()
+        redirect_results(self)
     
     def test_sse_stream_includes_samples(self):
         """Test that SSE stream includes samples array in updates."""
@@ -51,11 +54,10 @@ class TestSurveyBehavior(unittest.TestCase):
         time.sleep(0.5)
         
         # Check that task has samples array
-        with tasks_lock:
-            task = tasks.get(task_id)
-            self.assertIsNotNone(task)
-            self.assertIn('samples', task)
-            self.assertIsInstance(task['samples'], list)
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        self.assertIn('samples', task)
+        self.assertIsInstance(task['samples'], list)
     
     def test_task_status_includes_samples(self):
         """Test that task_status endpoint returns task with samples."""
@@ -108,15 +110,119 @@ class TestSurveyBehavior(unittest.TestCase):
         time.sleep(0.5)
         
         # Check task structure
-        with tasks_lock:
-            task = tasks.get(task_id)
-            self.assertIsNotNone(task)
-            self.assertIn('waiting', task)
-            self.assertIn('proceed', task)
-            self.assertIn('cancel', task)
-            self.assertIn('samples', task)
-            self.assertIsInstance(task['samples'], list)
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        self.assertIn('waiting', task)
+        self.assertIn('proceed', task)
+        self.assertIn('cancel', task)
+        self.assertIn('samples', task)
+        self.assertIsInstance(task['samples'], list)
 
+    def test_sse_stream_wakes_on_seq_bump(self):
+        """Test that the SSE stream emits an update as soon as seq changes."""
+        import uuid
+        task_id = str(uuid.uuid4())
+        task = tasks.create(task_id)
+        task.update(status="running")
+        
+        response = self.client.get(f'/stream/{task_id}')
+        stream = iter(response.response)
+        self.assertIn('retry:', next(stream).decode())
+        first = next(stream).decode()
+        self.assertIn('event: update', first)
+        
+        def bump():
+            time.sleep(0.2)
+            with task.mutate():
+                task.samples.append(0.1, dl=1.0, ul=0.0, stage="download")
+        threading.Thread(target=bump, daemon=True).start()
+        
+        start = time.time()
+        second = next(stream).decode()
+        self.assertLess(time.time() - start, 1.0)
+        self.assertIn('event: update', second)
+        self.assertIn('"download"', second)
+        
+        task.update(status="finished")
+        self.assertTrue(any(b'event: finished' in ev for ev in stream))
+        response.close()
+    
+    def test_sse_stream_sends_deltas_and_resumes(self):
+        """Test that updates carry only new samples and resume from Last-Event-ID."""
+        import uuid
+        task_id = str(uuid.uuid4())
+        sample = {"t": 0.0, "dl": 1.0, "ul": 0.0, "ping": None, "stage": "download"}
+        task = tasks.create(task_id)
+        with task.mutate():
+            task.status = "running"
+            task.logs.extend(["a", "b"])
+            for _ in range(3):
+                task.samples.append(**sample)
+            task.samples_epoch = 1
+        
+        def read_update(stream):
+            for chunk in stream:
+                text = chunk.decode()
+                if 'event: update' in text:
+                    event_id = text.split('\n')[0][len('id: '):]
+                    data = json.loads(text.split('data: ', 1)[1])
+                    return event_id, data
+        
+        response = self.client.get(f'/stream/{task_id}')
+        stream = iter(response.response)
+        event_id, data = read_update(stream)
+        self.assertEqual(event_id, '1:3:2')
+        self.assertTrue(data['samples_reset'])
+        self.assertEqual(len(data['samples']), 3)
+        
+        with task.mutate():
+            task.samples.append(**dict(sample, t=0.1))
+            task.logs.append("c")
+        event_id, data = read_update(stream)
+        self.assertEqual(event_id, '1:4:3')
+        self.assertFalse(data['samples_reset'])
+        self.assertEqual([s['t'] for s in data['samples']], [0.1])
+        self.assertEqual(data['logs'], ["c"])
+        response.close()
+        
+        # Reconnect with the last cursor: nothing new to send yet
+        response = self.client.get(f'/stream/{task_id}', headers={'Last-Event-ID': event_id})
+        stream = iter(response.response)
+        event_id, data = read_update(stream)
+        self.assertFalse(data['samples_reset'])
+        self.assertEqual(data['samples'], [])
+        response.close()
+        
+        # A cursor from an older samples epoch gets the full timeline
+        response = self.client.get(f'/stream/{task_id}', headers={'Last-Event-ID': '0:4:3'})
+        event_id, data = read_update(iter(response.response))
+        self.assertTrue(data['samples_reset'])
+        self.assertEqual(len(data['samples']), 4)
+        response.close()
+        task.update(status="finished")
+    
+    def test_survey_parent_reads_active_child_by_reference(self):
+        """Test that a survey task exposes its running child's live data without copying."""
+        import uuid
+        sample = {"t": 0.5, "dl": 12.5, "ul": 0.0, "ping": None, "stage": "download"}
+        parent_id = str(uuid.uuid4())
+        parent = tasks.create(parent_id)
+        child = tasks.create(str(uuid.uuid4()), parent=parent)
+        parent.update(status="running", active_child=child)
+        seq = parent.seq
+        with child.mutate():
+            child.partial = PartialState(dl_mbps=12.5, stage="download")
+            child.samples.append(**sample)
+        self.assertEqual(parent.seq, seq + 1)
+        
+        response = self.client.get(f'/task_status/{parent_id}')
+        data = json.loads(response.data)
+        self.assertEqual(data['partial']['dl_mbps'], 12.5)
+        self.assertEqual(data['samples'], [dict(sample, rssi=None, link=None)])
+        
+        parent.update(status="finished", active_child=None)
+        data = json.loads(self.client.get(f'/task_status/{parent_id}').data)
+        self.assertEqual(data['samples'], [])
 
 if __name__ == "__main__":
     unittest.main()
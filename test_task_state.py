@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the task state module.
+Tests copy-on-write snapshots, change notification and the registry.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from task_state import PartialState, SampleBuffer, TaskRegistry, TaskState, json_default
+
+
+class TestTaskSnapshot(unittest.TestCase):
+    """Test that snapshots are stable while writers continue."""
+
+    def test_snapshot_is_not_affected_by_later_writes(self):
+        """Test that appends and partial replacement don't change an earlier snapshot."""
+        task = TaskState("t1")
+        with task.mutate():
+            task.partial = PartialState(dl_mbps=1.0)
+            task.samples.append(0.0)
+            task.logs.append("a")
+        snap = task.snapshot()
+
+        with task.mutate():
+            partial = task.partial.copy()
+            partial.dl_mbps = 2.0
+            task.partial = partial
+            task.samples.append(0.1)
+            task.logs.append("b")
+
+        self.assertEqual(snap.partial.dl_mbps, 1.0)
+        self.assertEqual([s["t"] for s in snap.samples()], [0.0])
+        self.assertEqual(snap.logs(), ["a"])
+        self.assertEqual(task.snapshot().n_samples, 2)
+
+    def test_reset_samples_changes_epoch(self):
+        """Test that resetting samples swaps the list and advances the epoch."""
+        parent = TaskState("p")
+        child = TaskState("c", parent=parent)
+        child.samples.append(0.0)
+        snap = child.snapshot()
+        child.reset_samples()
+        self.assertEqual(len(snap.samples()), 1)
+        self.assertEqual(child.snapshot().samples(), [])
+        self.assertEqual(child.samples_epoch, 1)
+        self.assertEqual(parent.samples_epoch, 1)
+
+    def test_parent_snapshot_reads_active_child(self):
+        """Test that a parent snapshot shares the active child's live data."""
+        parent = TaskState("p")
+        child = TaskState("c", parent=parent)
+        parent.update(active_child=child)
+        with child.mutate():
+            child.partial = PartialState(stage="upload")
+            child.samples.append(1.0, stage="upload")
+        snap = parent.snapshot()
+        self.assertEqual(snap.partial.stage, "upload")
+        self.assertEqual(snap.samples(), [{"t": 1.0, "dl": None, "ul": None, "ping": None,
+                                           "rssi": None, "link": None, "stage": "upload"}])
+        self.assertEqual(snap.to_dict()["active_child"], "c")
+
+
+class TestSampleBuffer(unittest.TestCase):
+    """Test the columnar sample buffer and partial state."""
+
+    def test_rows_round_trip(self):
+        """Test that rows reproduce the appended values, with None for missing ones."""
+        buf = SampleBuffer()
+        buf.append(0.0, dl=None, ul=None, ping=12.345, stage="ping")
+        buf.append(0.5, dl=94.12, ul=0.0, ping=None, stage="download")
+        buf.append(1.0, dl=95.5, ul=0.0, ping=None, stage="not-a-stage", rssi=-61.0, link=866.7)
+        self.assertEqual(len(buf), 3)
+        rows = buf.rows()
+        self.assertEqual(rows[0], {"t": 0.0, "dl": None, "ul": None, "ping": 12.345,
+                                   "rssi": None, "link": None, "stage": "ping"})
+        self.assertAlmostEqual(rows[1]["dl"], 94.12, places=3)
+        self.assertEqual(rows[2]["stage"], "unknown")
+        self.assertEqual((rows[2]["rssi"], rows[2]["link"]), (-61.0, 866.7))
+        self.assertEqual(buf.rows(1, 2)[0]["t"], 0.5)
+
+    def test_wifi_readings_between_changes(self):
+        """Test that RSSI and link speed are kept per row across stored changes."""
+        buf = SampleBuffer()
+        for i, rssi in enumerate([None, -60.0, -60.0, -62.0, -62.0, None]):
+            buf.append(i * 0.1, stage="download", rssi=rssi, link=None if rssi is None else 433.0)
+        self.assertEqual([row["rssi"] for row in buf.rows()], [None, -60.0, -60.0, -62.0, -62.0, None])
+        self.assertEqual([row["link"] for row in buf.rows(2, 6)], [433.0, 433.0, 433.0, None])
+        self.assertEqual(buf.columns()["rssi"], [row["rssi"] for row in buf.rows()])
+
+    def test_compact_storage(self):
+        """Test that a sample costs a few bytes rather than a dict."""
+        buf = SampleBuffer()
+        for i in range(1000):
+            # Wi-Fi readings change once per 2 s telemetry poll (every 20 samples at 10 Hz)
+            buf.append(i * 0.1, dl=100.0, ul=50.0, ping=5.0, stage="upload",
+                       rssi=-60.0 - i // 20 % 5, link=433.0 + i // 20 % 3)
+        self.assertLessEqual(buf.nbytes(), 22 * 1000)
+
+    def test_partial_state(self):
+        """Test copy-on-write partial state and JSON serialization."""
+        partial = PartialState(dl_mbps=1.5, stage="download")
+        clone = partial.copy()
+        clone.dl_mbps = 2.0
+        self.assertEqual(partial.dl_mbps, 1.5)
+        self.assertEqual(json_default(clone)["dl_mbps"], 2.0)
+        with self.assertRaises(AttributeError):
+            PartialState(bogus=1)
+
+
+class TestTaskNotification(unittest.TestCase):
+    """Test change notification."""
+
+    def test_wait_for_change_wakes_on_mutation(self):
+        """Test that a waiter is released as soon as seq changes."""
+        task = TaskState("t1")
+        seq = task.seq
+
+        def writer():
+            time.sleep(0.1)
+            task.log("hello")
+        threading.Thread(target=writer, daemon=True).start()
+
+        start = time.time()
+        task.wait_for_change(seq, timeout=5)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(task.seq, seq + 1)
+
+    def test_child_mutation_bumps_parent(self):
+        """Test that child updates advance the parent's seq."""
+        parent = TaskState("p")
+        child = TaskState("c", parent=parent)
+        child.log("x")
+        self.assertEqual(parent.seq, 1)
+
+    def test_update_rejects_unknown_fields(self):
+        """Test that update() only accepts known task fields."""
+        task = TaskState("t1")
+        with self.assertRaises(AttributeError):
+            task.update(not_a_field=1)
+
+
+class TestTaskRegistry(unittest.TestCase):
+    """Test the task registry."""
+
+    def test_create_get_delete(self):
+        """Test basic registry operations."""
+        registry = TaskRegistry()
+        task = registry.create("a", total=3)
+        self.assertIs(registry.get("a"), task)
+        self.assertIn("a", registry)
+        self.assertEqual(registry.snapshot("a")["total"], 3)
+        self.assertEqual(registry.ids(), ["a"])
+        registry.delete("a")
+        self.assertIsNone(registry.get("a"))
+        self.assertIsNone(registry.snapshot("a"))
+
+
+class TestTaskRegistryEviction(unittest.TestCase):
+    """Test eviction and spill-to-disk of finished tasks."""
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _finished_task(self, registry, task_id, n_samples=0):
+        task = registry.create(task_id)
+        with task.mutate():
+            for i in range(n_samples):
+                task.samples.append(i * 0.1, dl=50.0, ul=20.0, ping=5.0, stage="download")
+            task.result = {"point": task_id}
+            task.status = "finished"
+        return task
+
+    def test_count_limit_evicts_least_recently_used(self):
+        """Test that the oldest-accessed finished tasks are spilled first."""
+        registry = TaskRegistry(spill_dir=self.spill_dir, max_finished=2)
+        for task_id in ("a", "b", "c"):
+            self._finished_task(registry, task_id)
+            time.sleep(0.01)
+        registry.get("a")  # touch: "b" is now least recently used
+        registry.evict()
+        self.assertIn("a", registry)
+        self.assertNotIn("b", registry)
+        self.assertEqual(registry.stats()["evicted_count"], 1)
+
+        spilled = registry.snapshot("b")
+        self.assertEqual(spilled["status"], "finished")
+        self.assertEqual(spilled["result"], {"point": "b"})
+        self.assertEqual(registry.stats()["spill_reads"], 1)
+
+    def test_ttl_and_memory_budget(self):
+        """Test TTL expiry and the memory budget."""
+        registry = TaskRegistry(spill_dir=self.spill_dir, finished_ttl_s=60, memory_budget_bytes=20_000)
+        self._finished_task(registry, "old")
+        self._finished_task(registry, "big", n_samples=1000)
+        running = registry.create("running")
+        registry.evict(now=time.monotonic() + 120)
+        stats = registry.stats()
+        self.assertEqual(stats["evicted"], 2)
+        self.assertIn("running", registry)
+        self.assertIsNotNone(running.snapshot())
+
+        registry = TaskRegistry(spill_dir=self.spill_dir, memory_budget_bytes=20_000)
+        self._finished_task(registry, "big", n_samples=1000)
+        registry.evict()
+        self.assertEqual(registry.stats()["evicted_memory"], 1)
+        self.assertEqual(len(registry.snapshot("big")["samples"]), 1000)
+
+    def test_active_child_is_not_evicted(self):
+        """Test that a running survey's active child stays in memory."""
+        registry = TaskRegistry(spill_dir=self.spill_dir, max_finished=0)
+        parent = registry.create("parent")
+        child = self._finished_task(registry, "child")
+        parent.update(active_child=child)
+        registry.evict()
+        self.assertIn("child", registry)
+
+    def test_unspillable_task_is_kept(self):
+        """Test that tasks over the limits stay in memory when they can't be spilled."""
+        registry = TaskRegistry(spill_dir=None, max_finished=0, finished_ttl_s=60)
+        self._finished_task(registry, "a")
+        registry.evict()
+        self.assertIn("a", registry)
+        self.assertEqual(registry.snapshot("a")["status"], "finished")
+        registry.evict(now=time.monotonic() + 120)
+        self.assertNotIn("a", registry)
+
+        registry = TaskRegistry(spill_dir=self.spill_dir, max_finished=0)
+        self._finished_task(registry, "b")
+        with mock.patch("gzip.open", side_effect=OSError("disk full")):
+            registry.evict()
+        self.assertIn("b", registry)
+        self.assertEqual(registry.stats()["spill_errors"], 1)
+
+    def test_spill_retention(self):
+        """Test that spill files are pruned by age, then oldest beyond the count limit."""
+        registry = TaskRegistry(spill_dir=self.spill_dir, max_finished=0, spill_max_files=0, spill_ttl_s=0)
+        now = time.time()
+        for i, task_id in enumerate(("a", "b", "c", "d")):
+            self._finished_task(registry, task_id)
+            registry.evict()
+            mtime = now - 7200 if task_id == "a" else now - 100 + i
+            os.utime(os.path.join(self.spill_dir, f"{task_id}.json.gz"), (mtime, mtime))
+        registry.spill_max_files, registry.spill_ttl_s = 2, 3600
+        self.assertEqual(registry.prune_spill(now), 2)
+        self.assertEqual(sorted(os.listdir(self.spill_dir)), ["c.json.gz", "d.json.gz"])
+        self.assertIsNone(registry.snapshot("a"))
+        self.assertEqual(registry.stats()["spill_pruned"], 2)
+
+    def test_sweeper_evicts_without_new_tasks(self):
+        """Test that the background sweeper evicts expired tasks on an idle registry."""
+        registry = TaskRegistry(spill_dir=self.spill_dir, finished_ttl_s=0, sweep_interval_s=0.05)
+        self.addCleanup(registry.close)
+        self._finished_task(registry, "a")
+        deadline = time.time() + 2
+        while "a" in registry and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertNotIn("a", registry)
+        self.assertEqual(registry.snapshot("a")["status"], "finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,9 +10,11 @@ from executing.
 import unittest
 import json
 import time
+from unittest import mock
 
 try:
-    from app import app, tasks, tasks_lock, worker_run_point
+    from app import app, engine, tasks, worker_run_point
+    from api_test_support import redirect_results
     FLASK_AVAILABLE = True
 except ImportError:
     FLASK_AVAILABLE = False
@@ -29,6 +31,7 @@ class TestUploadDownloadFix(unittest.TestCase):
         self.app = app
         self.app.config['TESTING'] = True
         self.client = self.app.test_client()
+        redirect_results(self)
     
     def test_quick_mode_runs_all_tests(self):
         """Test that quick mode runs ping, download, and upload tests."""
@@ -39,26 +42,76 @@ class TestUploadDownloadFix(unittest.TestCase):
         worker_run_point(task_id, "test_device", "P1", 1, duration=3, parallel=2)
         
         # Check that all tests started
-        with tasks_lock:
-            task = tasks.get(task_id)
-            self.assertIsNotNone(task)
-            
-            logs = task.get('logs', [])
-            
-            # Verify ping test started
-            has_ping = any('ping test' in log.lower() for log in logs)
-            self.assertTrue(has_ping, "Ping test should have started")
-            
-            # Verify download test started
-            has_download = any('download test' in log.lower() for log in logs)
-            self.assertTrue(has_download, "Download test should have started")
-            
-            # Verify upload test started
-            has_upload = any('upload test' in log.lower() for log in logs)
-            self.assertTrue(has_upload, "Upload test should have started")
-            
-            # Verify task completed (not aborted by connectivity check)
-            self.assertEqual(task.get('status'), 'finished')
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        
+        logs = task.get('logs', [])
+        
+        # Verify ping test started
+        has_ping = any('ping test' in log.lower() for log in logs)
+        self.assertTrue(has_ping, "Ping test should have started")
+        
+        # Verify download test started
+        has_download = any('download test' in log.lower() for log in logs)
+        self.assertTrue(has_download, "Download test should have started")
+        
+        # Verify upload test started
+        has_upload = any('upload test' in log.lower() for log in logs)
+        self.assertTrue(has_upload, "Upload test should have started")
+        
+        # Verify task completed (not aborted by connectivity check)
+        self.assertEqual(task.get('status'), 'finished')
+    
+    def test_loaded_latency_mode(self):
+        """Test that loaded mode reports the idle and loaded latency series."""
+        import uuid
+        
+        task_id = str(uuid.uuid4())
+        worker_run_point(task_id, "test_device", "P1", 1, duration=3, parallel=2, latency_mode="loaded")
+        
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        self.assertEqual(task.get('status'), 'finished')
+        
+        result = task.get('result')
+        self.assertEqual(result.get('latency_mode'), 'loaded')
+        for key in ('ping_avg_ms', 'ping_dl_loaded_avg_ms', 'ping_dl_loaded_p95_ms',
+                    'ping_ul_loaded_avg_ms', 'ping_ul_loaded_loss_pct'):
+            self.assertIn(key, result)
+    
+    def test_bidir_mode_finishes(self):
+        """Test that bidir mode (or its fallback) gives per-direction results."""
+        import uuid
+        
+        task_id = str(uuid.uuid4())
+        worker_run_point(task_id, "test_device", "P1", 1, duration=3, parallel=2, bidir=True)
+        
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        self.assertEqual(task.get('status'), 'finished')
+        
+        result = task.get('result')
+        self.assertIn('bidir', result)
+        self.assertIn('iperf_dl_mbps', result)
+        self.assertIn('iperf_ul_mbps', result)
+    
+    def test_results_saved_off_the_engine_loop(self):
+        """Test that the raw file and results DB writes don't run on the engine loop thread."""
+        import uuid
+        import app as app_module
+        on_loop = {}
+        
+        def recording(name, func):
+            def wrapper(*args, **kwargs):
+                on_loop[name] = engine.in_loop_thread()
+                return func(*args, **kwargs)
+            return wrapper
+        
+        with mock.patch("app.write_raw", recording("raw", app_module.write_raw)), \
+                mock.patch.object(app_module.results_store, "add_run",
+                                  recording("db", app_module.results_store.add_run)):
+            worker_run_point(str(uuid.uuid4()), "test_device", "P1", 1, duration=1, parallel=1)
+        self.assertEqual(on_loop, {"raw": False, "db": False})
     
     def test_survey_mode_runs_all_tests(self):
         """Test that survey mode runs ping, download, and upload tests for each point."""
@@ -83,27 +136,27 @@ class TestUploadDownloadFix(unittest.TestCase):
         time.sleep(8)
         
         # Find child task and verify tests ran
-        with tasks_lock:
-            # Look for child tasks (created by survey_worker)
-            child_task = None
-            for task_id in tasks.keys():
-                if task_id != parent_task_id:
-                    child_task = tasks.get(task_id)
-                    break
-            
-            self.assertIsNotNone(child_task, "Survey should create child task for point measurement")
-            
-            logs = child_task.get('logs', [])
-            
-            # Verify all three tests started in the child task
-            has_ping = any('ping test' in log.lower() for log in logs)
-            self.assertTrue(has_ping, "Ping test should have started in survey child task")
-            
-            has_download = any('download test' in log.lower() for log in logs)
-            self.assertTrue(has_download, "Download test should have started in survey child task")
-            
-            has_upload = any('upload test' in log.lower() for log in logs)
-            self.assertTrue(has_upload, "Upload test should have started in survey child task")
+        # Look for child tasks (created by survey_worker)
+        child_task = None
+        for task_id in tasks.ids():
+            snapshot = tasks.snapshot(task_id)
+            if snapshot and snapshot.get('parent') == parent_task_id:
+                child_task = snapshot
+                break
+        
+        self.assertIsNotNone(child_task, "Survey should create child task for point measurement")
+        
+        logs = child_task.get('logs', [])
+        
+        # Verify all three tests started in the child task
+        has_ping = any('ping test' in log.lower() for log in logs)
+        self.assertTrue(has_ping, "Ping test should have started in survey child task")
+        
+        has_download = any('download test' in log.lower() for log in logs)
+        self.assertTrue(has_download, "Download test should have started in survey child task")
+        
+        has_upload = any('upload test' in log.lower() for log in logs)
+        self.assertTrue(has_upload, "Upload test should have started in survey child task")
     
     def test_connectivity_check_does_not_abort(self):
         """Test that failed connectivity check logs warning but doesn't abort tests."""
@@ -112,23 +165,22 @@ class TestUploadDownloadFix(unittest.TestCase):
         task_id = str(uuid.uuid4())
         worker_run_point(task_id, "test_device", "P1", 1, duration=3, parallel=2)
         
-        with tasks_lock:
-            task = tasks.get(task_id)
-            self.assertIsNotNone(task)
-            
-            logs = task.get('logs', [])
-            
-            # Should have warning about server not reachable
-            has_warning = any('advertencia' in log.lower() and 'servidor' in log.lower() for log in logs)
-            self.assertTrue(has_warning, "Should log warning about server connectivity")
-            
-            # But task should still finish, not error out
-            self.assertEqual(task.get('status'), 'finished')
-            
-            # And tests should have run
-            has_download = any('download test' in log.lower() for log in logs)
-            has_upload = any('upload test' in log.lower() for log in logs)
-            self.assertTrue(has_download and has_upload, "Tests should run despite connectivity warning")
+        task = tasks.snapshot(task_id)
+        self.assertIsNotNone(task)
+        
+        logs = task.get('logs', [])
+        
+        # Should have warning about server not reachable
+        has_warning = any('advertencia' in log.lower() and 'servidor' in log.lower() for log in logs)
+        self.assertTrue(has_warning, "Should log warning about server connectivity")
+        
+        # But task should still finish, not error out
+        self.assertEqual(task.get('status'), 'finished')
+        
+        # And tests should have run
+        has_download = any('download test' in log.lower() for log in logs)
+        has_upload = any('upload test' in log.lower() for log in logs)
+        self.assertTrue(has_download and has_upload, "Tests should run despite connectivity warning")
 
 
 if __name__ == "__main__":
@@ -243,6 +243,73 @@ class TestValidatorPointsList(unittest.TestCase):
         self.assertIn("lista", ctx.exception.message.lower())
 
 
+class TestValidatorLatencyMode(unittest.TestCase):
+    """Test latency mode validation."""
+    
+    def test_valid_latency_mode(self):
+        """Test with valid latency modes."""
+        self.assertEqual(Validator.validate_latency_mode("idle"), "idle")
+        self.assertEqual(Validator.validate_latency_mode(" Loaded "), "loaded")
+    
+    def test_invalid_latency_mode(self):
+        """Test with an unknown latency mode."""
+        with self.assertRaises(ValidationError) as ctx:
+            Validator.validate_latency_mode("busy")
+        self.assertEqual(ctx.exception.field, "latency_mode")
+        with self.assertRaises(ValidationError):
+            Validator.validate_latency_mode(None)
+
+
+class TestValidatorFlag(unittest.TestCase):
+    """Test boolean option validation."""
+    
+    def test_valid_flags(self):
+        """Test booleans, 0/1 and common strings."""
+        self.assertTrue(Validator.validate_flag(True, "bidir"))
+        self.assertTrue(Validator.validate_flag("yes", "bidir"))
+        self.assertFalse(Validator.validate_flag(0, "bidir"))
+        self.assertFalse(Validator.validate_flag("False", "bidir"))
+    
+    def test_invalid_flag(self):
+        """Test with a value that is not a boolean."""
+        with self.assertRaises(ValidationError) as ctx:
+            Validator.validate_flag("maybe", "bidir")
+        self.assertEqual(ctx.exception.field, "bidir")
+        with self.assertRaises(ValidationError):
+            Validator.validate_flag(2, "bidir")
+
+
+class TestValidatorResultsQuery(unittest.TestCase):
+    """Test history query validation."""
+    
+    def test_timestamps(self):
+        """Test date and date-time bounds normalized to UTC."""
+        self.assertEqual(Validator.validate_timestamp("2026-10-01", "since"), "2026-10-01T00:00:00Z")
+        self.assertEqual(Validator.validate_timestamp("2026-10-01", "until", end_of_day=True), "2026-10-01T23:59:59Z")
+        self.assertEqual(Validator.validate_timestamp("2026-10-01T12:00:00+02:00", "since"), "2026-10-01T10:00:00Z")
+        with self.assertRaises(ValidationError):
+            Validator.validate_timestamp("01/10/2026", "since")
+    
+    def test_query(self):
+        """Test defaults, filters and page limits."""
+        query = Validator.validate_results_query({"point": " B3 ", "until": "2026-10-01"})
+        self.assertEqual(query["point"], "B3")
+        self.assertEqual(query["until"], "2026-10-01T23:59:59Z")
+        self.assertEqual(query["limit"], 50)
+        self.assertIsNone(query["device"])
+        with self.assertRaises(ValidationError) as ctx:
+            Validator.validate_results_query({"limit": "501"})
+        self.assertEqual(ctx.exception.field, "limit")
+    
+    def test_csv_query(self):
+        """Test CSV export filters, which take no page parameters."""
+        query = Validator.validate_csv_query({"device": "S24FE", "since": "2026-10-01", "limit": "9999"})
+        self.assertEqual(query, {"device": "S24FE", "point": None, "since": "2026-10-01T00:00:00Z", "until": None})
+        with self.assertRaises(ValidationError) as ctx:
+            Validator.validate_csv_query({"until": "ayer"})
+        self.assertEqual(ctx.exception.field, "until")
+
+
 class TestValidatorRunPointPayload(unittest.TestCase):
     """Test complete run_point payload validation."""
     
@@ -261,6 +328,22 @@ class TestValidatorRunPointPayload(unittest.TestCase):
         self.assertEqual(result["run"], 1)
         self.assertEqual(result["duration"], 20)
         self.assertEqual(result["parallel"], 4)
+        self.assertEqual(result["latency_mode"], "idle")
+    
+    def test_run_point_payload_latency_mode(self):
+        """Test latency mode from payload and from defaults."""
+        result = Validator.validate_run_point_payload({"latency_mode": "loaded"})
+        self.assertEqual(result["latency_mode"], "loaded")
+        result = Validator.validate_run_point_payload({}, {"latency_mode": "loaded"})
+        self.assertEqual(result["latency_mode"], "loaded")
+        self.assertFalse(result["bidir"])
+    
+    def test_run_point_payload_bidir(self):
+        """Test bidir flag from payload and from defaults."""
+        self.assertTrue(Validator.validate_run_point_payload({"bidir": True})["bidir"])
+        self.assertTrue(Validator.validate_run_point_payload({}, {"bidir": True})["bidir"])
+        with self.assertRaises(ValidationError):
+            Validator.validate_run_point_payload({"bidir": "sometimes"})
     
     def test_run_point_payload_with_defaults(self):
         """Test with partial payload using defaults."""
@@ -318,6 +401,21 @@ class TestValidatorStartSurveyPayload(unittest.TestCase):
         payload = {"device": "phone", "points": []}
         with self.assertRaises(ValidationError):
             Validator.validate_start_survey_payload(payload)
+    
+    def test_start_survey_payload_adaptive_repeats(self):
+        """Test adaptive repeats flag and maximum."""
+        payload = {"device": "phone", "points": ["P1"], "repeats": 2, "adaptive_repeats": True}
+        result = Validator.validate_start_survey_payload(payload, {"max_repeats": 8})
+        self.assertTrue(result["adaptive_repeats"])
+        self.assertEqual(result["max_repeats"], 8)
+        
+        # The configured maximum doesn't cap a larger minimum
+        result = Validator.validate_start_survey_payload(dict(payload, repeats=12), {"max_repeats": 8})
+        self.assertEqual(result["max_repeats"], 12)
+        
+        with self.assertRaises(ValidationError) as ctx:
+            Validator.validate_start_survey_payload(dict(payload, max_repeats=1))
+        self.assertEqual(ctx.exception.field, "max_repeats")
 
 
 class TestValidationError(unittest.TestCase):
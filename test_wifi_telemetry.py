@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Wi-Fi telemetry sampler.
+Uses the file-backed source with a temporary JSON file.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from wifi_telemetry import FileWifiSource, TermuxWifiSource, WifiReading, WifiTelemetry, make_source
+
+
+class TestWifiReading(unittest.TestCase):
+    """Test parsing of connection info JSON."""
+
+    def test_termux_and_short_keys(self):
+        """Test that both termux-api and short key names are read."""
+        termux = WifiReading.from_info({"ssid": "lab", "bssid": "aa:bb", "rssi": -61,
+                                        "link_speed_mbps": 433, "frequency_mhz": 5180}, t=1.0)
+        short = WifiReading.from_info({"rssi": "-70", "linkSpeed": 144, "frequency": 2437}, t=2.0)
+        self.assertEqual((termux.rssi_dbm, termux.link_speed_mbps, termux.frequency_mhz), (-61.0, 433.0, 5180.0))
+        self.assertEqual((termux.ssid, termux.bssid), ("lab", "aa:bb"))
+        self.assertEqual((short.rssi_dbm, short.link_speed_mbps, short.frequency_mhz), (-70.0, 144.0, 2437.0))
+        self.assertIsNone(WifiReading.from_info({"rssi": "n/a"}).rssi_dbm)
+
+
+class TestMakeSource(unittest.TestCase):
+    """Test source selection from config values."""
+
+    def test_specs(self):
+        """Test termux, file and unknown sources."""
+        self.assertIsInstance(make_source("termux"), TermuxWifiSource)
+        source = make_source("file:/tmp/wifi.json")
+        self.assertIsInstance(source, FileWifiSource)
+        self.assertEqual(source.path, "/tmp/wifi.json")
+        for spec in ("", "file:", "nl80211"):
+            with self.assertRaises(ValueError, msg=spec):
+                make_source(spec)
+
+
+class TestWifiTelemetry(unittest.TestCase):
+    """Test polling, caching and the ring buffer."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        self._write(-60)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def _write(self, rssi):
+        with open(self.path, "w") as f:
+            json.dump({"ssid": "lab", "bssid": "aa:bb", "rssi": rssi, "link_speed_mbps": 300}, f)
+
+    def test_ring_buffer_keeps_latest(self):
+        """Test that only the last capacity readings are kept."""
+        async def run():
+            telemetry = WifiTelemetry(FileWifiSource(self.path), capacity=3)
+            for rssi in range(-60, -65, -1):
+                self._write(rssi)
+                await telemetry.poll_once()
+            return telemetry
+
+        telemetry = asyncio.run(run())
+        self.assertEqual([r.rssi_dbm for r in telemetry.readings], [-62.0, -63.0, -64.0])
+        self.assertEqual(telemetry.latest().rssi_dbm, -64.0)
+        self.assertEqual(telemetry.info["rssi"], -64)
+        self.assertIsNone(telemetry.latest(max_age_s=-1))
+
+    def test_failed_read_keeps_cache(self):
+        """Test that a broken source is counted and the last reading is still served."""
+        async def run():
+            telemetry = WifiTelemetry(FileWifiSource(self.path))
+            await telemetry.poll_once()
+            with open(self.path, "w") as f:
+                f.write("{not json")
+            await telemetry.poll_once()
+            return telemetry
+
+        telemetry = asyncio.run(run())
+        self.assertEqual(telemetry.latest().rssi_dbm, -60.0)
+        self.assertEqual((telemetry.stats()["polls"], telemetry.stats()["errors"]), (2, 1))
+
+    def test_sessions_share_one_poller(self):
+        """Test that overlapping sessions share the poller and the last one stops it."""
+        async def run():
+            telemetry = WifiTelemetry(FileWifiSource(self.path), interval_s=0.01)
+            async with telemetry.session():
+                first = await telemetry.wait_latest(1.0)
+                async with telemetry.session():
+                    self._write(-75)
+                    await asyncio.sleep(0.05)
+                self.assertTrue(telemetry.stats()["running"])
+            await asyncio.sleep(0)
+            return telemetry, first
+
+        telemetry, first = asyncio.run(run())
+        self.assertEqual(first.rssi_dbm, -60.0)
+        self.assertEqual(telemetry.latest().rssi_dbm, -75.0)
+        self.assertFalse(telemetry.stats()["running"])
+        self.assertGreater(telemetry.stats()["polls"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
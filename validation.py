@@ -4,6 +4,7 @@ Centralized validation module for WiFi Survey application.
 Provides consistent validation rules and descriptive error messages.
 """
 
+from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Any, Optional
 
 
@@ -44,6 +45,9 @@ class Validator:
     REPEATS_MIN = 1
     REPEATS_MAX = 100
     POINTS_MAX_COUNT = 1000
+    LATENCY_MODES = ("idle", "loaded")
+    PAGE_LIMIT_MIN = 1
+    PAGE_LIMIT_MAX = 500
     
     @staticmethod
     def validate_device_name(device: Any, field_name: str = "device") -> str:
@@ -257,6 +261,129 @@ class Validator:
         
         return repeats_int
     
+    @staticmethod
+    def validate_latency_mode(mode: Any, field_name: str = "latency_mode") -> str:
+        """
+        Validate latency stage mode.
+        
+        "idle" measures latency alone before the throughput stages; "loaded"
+        also measures it while download and upload run.
+        
+        Args:
+            mode: Latency mode to validate
+            field_name: Name of the field for error reporting
+            
+        Returns:
+            Validated latency mode (lowercase string)
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        mode_str = str(mode).strip().lower() if mode is not None else ""
+        if mode_str not in Validator.LATENCY_MODES:
+            raise ValidationError(
+                f"El modo de latencia debe ser uno de: {', '.join(Validator.LATENCY_MODES)}",
+                field=field_name,
+                details={"allowed": list(Validator.LATENCY_MODES), "actual": str(mode)}
+            )
+        
+        return mode_str
+    
+    @staticmethod
+    def validate_flag(value: Any, field_name: str) -> bool:
+        """
+        Validate a boolean option.
+        
+        Args:
+            value: Boolean, 0/1 or a string such as "true"/"false"
+            field_name: Name of the field for error reporting
+            
+        Returns:
+            Validated flag (boolean)
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int) and value in (0, 1):
+            return bool(value)
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in ("true", "1", "yes", "on"):
+                return True
+            if text in ("false", "0", "no", "off"):
+                return False
+        raise ValidationError(
+            f"El campo {field_name} debe ser verdadero o falso",
+            field=field_name,
+            details={"type": "boolean"}
+        )
+    
+    @staticmethod
+    def validate_timestamp(value: Any, field_name: str, end_of_day: bool = False) -> str:
+        """
+        Validate an ISO 8601 date or date-time used as a query bound.
+        
+        Args:
+            value: "YYYY-MM-DD" or a date-time, with or without offset (UTC assumed)
+            field_name: Name of the field for error reporting
+            end_of_day: For a bare date, use its last second instead of midnight
+            
+        Returns:
+            UTC timestamp in the results format ("YYYY-MM-DDTHH:MM:SSZ")
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        text = str(value).strip() if value is not None else ""
+        try:
+            parsed = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+        except ValueError:
+            raise ValidationError(
+                f"El campo {field_name} debe ser una fecha ISO 8601 (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SSZ)",
+                field=field_name,
+                details={"format": "ISO 8601"}
+            )
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        if end_of_day and len(text) == 10:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime("%Y-%m-%dT%H:%M:%SZ")
+    
+    @staticmethod
+    def validate_page_limit(limit: Any, field_name: str = "limit") -> int:
+        """
+        Validate a page size.
+        
+        Args:
+            limit: Page size to validate
+            field_name: Name of the field for error reporting
+            
+        Returns:
+            Validated page size (integer)
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        try:
+            limit_int = int(limit)
+        except (ValueError, TypeError):
+            raise ValidationError(
+                f"El tamaño de página debe ser un número entero",
+                field=field_name,
+                details={"type": "integer"}
+            )
+        
+        if limit_int < Validator.PAGE_LIMIT_MIN or limit_int > Validator.PAGE_LIMIT_MAX:
+            raise ValidationError(
+                f"El tamaño de página debe estar entre {Validator.PAGE_LIMIT_MIN} y {Validator.PAGE_LIMIT_MAX}",
+                field=field_name,
+                details={"min": Validator.PAGE_LIMIT_MIN, "max": Validator.PAGE_LIMIT_MAX, "actual": limit_int}
+            )
+        
+        return limit_int
+    
     @staticmethod
     def validate_points_list(points: Any, field_name: str = "points") -> List[str]:
         """
@@ -336,6 +463,84 @@ class Validator:
         validated["run"] = Validator.validate_run_index(payload.get("run", defaults.get("run", 1)))
         validated["duration"] = Validator.validate_duration(payload.get("duration", defaults.get("duration", 20)))
         validated["parallel"] = Validator.validate_parallel_streams(payload.get("parallel", defaults.get("parallel", 4)))
+        validated["latency_mode"] = Validator.validate_latency_mode(
+            payload.get("latency_mode", defaults.get("latency_mode", "idle"))
+        )
+        validated["bidir"] = Validator.validate_flag(payload.get("bidir", defaults.get("bidir", False)), "bidir")
+        
+        return validated
+    
+    @staticmethod
+    def validate_raw_query(args: Dict[str, Any], default_limit: int = 100) -> Dict[str, Any]:
+        """
+        Validate raw file listing parameters (/list_raw).
+        
+        Args:
+            args: Query string arguments
+            default_limit: Page size when none is given
+            
+        Returns:
+            Dictionary with point, since, until (None when absent), limit and cursor
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        validated = {"point": None, "since": None, "until": None}
+        if args.get("point"):
+            validated["point"] = Validator.validate_point_id(args.get("point"))
+        if args.get("since"):
+            validated["since"] = Validator.validate_timestamp(args.get("since"), "since")
+        if args.get("until"):
+            validated["until"] = Validator.validate_timestamp(args.get("until"), "until", end_of_day=True)
+        validated["limit"] = Validator.validate_page_limit(args.get("limit", default_limit))
+        validated["cursor"] = args.get("cursor") or None
+        
+        return validated
+    
+    @staticmethod
+    def validate_results_query(args: Dict[str, Any], default_limit: int = 50) -> Dict[str, Any]:
+        """
+        Validate history query parameters (/results).
+        
+        Args:
+            args: Query string arguments
+            default_limit: Page size when none is given
+            
+        Returns:
+            The validate_raw_query() dictionary plus device and survey_id
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        validated = Validator.validate_raw_query(args, default_limit)
+        validated["device"] = Validator.validate_device_name(args.get("device")) if args.get("device") else None
+        validated["survey_id"] = str(args.get("survey_id")).strip() if args.get("survey_id") else None
+        
+        return validated
+    
+    @staticmethod
+    def validate_csv_query(args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate CSV export filters (/download_csv).
+        
+        Args:
+            args: Query string arguments
+            
+        Returns:
+            Dictionary with device, point, since and until (None when absent)
+            
+        Raises:
+            ValidationError: If validation fails
+        """
+        validated = {"device": None, "point": None, "since": None, "until": None}
+        if args.get("device"):
+            validated["device"] = Validator.validate_device_name(args.get("device"))
+        if args.get("point"):
+            validated["point"] = Validator.validate_point_id(args.get("point"))
+        if args.get("since"):
+            validated["since"] = Validator.validate_timestamp(args.get("since"), "since")
+        if args.get("until"):
+            validated["until"] = Validator.validate_timestamp(args.get("until"), "until", end_of_day=True)
         
         return validated
     
@@ -361,5 +566,21 @@ class Validator:
         validated["points"] = Validator.validate_points_list(payload.get("points", []))
         validated["repeats"] = Validator.validate_repeats(payload.get("repeats", defaults.get("repeats", 1)))
         validated["manual"] = bool(payload.get("manual", False))
+        validated["latency_mode"] = Validator.validate_latency_mode(
+            payload.get("latency_mode", defaults.get("latency_mode", "idle"))
+        )
+        validated["bidir"] = Validator.validate_flag(payload.get("bidir", defaults.get("bidir", False)), "bidir")
+        validated["adaptive_repeats"] = Validator.validate_flag(
+            payload.get("adaptive_repeats", defaults.get("adaptive_repeats", False)), "adaptive_repeats"
+        )
+        # The configured maximum never caps an explicit repeats value
+        max_default = max(int(defaults.get("max_repeats", validated["repeats"])), validated["repeats"])
+        validated["max_repeats"] = Validator.validate_repeats(payload.get("max_repeats", max_default), "max_repeats")
+        if validated["adaptive_repeats"] and validated["max_repeats"] < validated["repeats"]:
+            raise ValidationError(
+                "El número máximo de repeticiones no puede ser menor que el número de repeticiones",
+                field="max_repeats",
+                details={"min": validated["repeats"], "actual": validated["max_repeats"]}
+            )
         
         return validated
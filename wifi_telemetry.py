@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Wi-Fi telemetry for WiFi Survey application.
+One background sampler polls the Wi-Fi connection info while measurements
+run and serves the latest reading from cache, so tasks don't each pay for a
+termux-api round trip and RSSI swings or roams show up in the timeline.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, NamedTuple, Optional
+
+from engine import run_exec
+
+logger = logging.getLogger(__name__)
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class WifiReading(NamedTuple):
+    """One Wi-Fi connection info sample."""
+    t: float
+    rssi_dbm: Optional[float]
+    link_speed_mbps: Optional[float]
+    frequency_mhz: Optional[float]
+    bssid: str
+    ssid: str
+
+    @classmethod
+    def from_info(cls, info: Dict[str, Any], t: Optional[float] = None) -> "WifiReading":
+        """Build a reading from termux-wifi-connectioninfo style JSON."""
+        return cls(
+            t=time.time() if t is None else t,
+            rssi_dbm=_float(info.get("rssi")),
+            # termux-api names; older builds and hand-written files use the short ones
+            link_speed_mbps=_float(info.get("link_speed_mbps", info.get("linkSpeed"))),
+            frequency_mhz=_float(info.get("frequency_mhz", info.get("frequency"))),
+            bssid=str(info.get("bssid") or ""),
+            ssid=str(info.get("ssid") or "")
+        )
+
+
+class TermuxWifiSource:
+    """Reads `termux-wifi-connectioninfo` (Android, Termux:API)."""
+
+    def __init__(self, command: str = "termux-wifi-connectioninfo", timeout_s: float = 4.0):
+        self.command = command
+        self.timeout_s = timeout_s
+
+    async def read(self) -> Optional[Dict[str, Any]]:
+        out, _, rc = await run_exec([self.command], timeout=self.timeout_s)
+        if rc != 0 or not out:
+            return None
+        return json.loads(out)
+
+    def __str__(self) -> str:
+        return self.command
+
+
+class FileWifiSource:
+    """Reads the same JSON from a file, e.g. one kept up to date by a script on Linux."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def read(self) -> Optional[Dict[str, Any]]:
+        with open(self.path) as f:
+            return json.load(f)
+
+    def __str__(self) -> str:
+        return f"file:{self.path}"
+
+
+def make_source(spec: str):
+    """
+    Build a source from its config value.
+
+    Args:
+        spec: "termux" or "file:<path>"
+
+    Raises:
+        ValueError: If the value names no known source
+    """
+    spec = (spec or "").strip()
+    if spec == "termux":
+        return TermuxWifiSource()
+    if spec.startswith("file:") and len(spec) > 5:
+        return FileWifiSource(spec[5:])
+    raise ValueError(f"unknown wifi source {spec!r}")
+
+
+class WifiTelemetry:
+    """
+    Background Wi-Fi sampler with a ring buffer of recent readings.
+
+    Must be used from a single event loop (the measurement engine). Polling
+    runs while at least one session() is open, every interval_s; latest()
+    answers from cache.
+    """
+
+    def __init__(self, source, interval_s: float = 2.0, capacity: int = 600):
+        self.source = source
+        self.interval_s = interval_s
+        self.readings: Deque[WifiReading] = deque(maxlen=capacity)
+        # Full JSON of the latest successful read, for raw files
+        self.info: Dict[str, Any] = {}
+        self._sessions = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._waiters: List[asyncio.Future] = []
+        self._polls = 0
+        self._errors = 0
+
+    def latest(self, max_age_s: Optional[float] = None) -> Optional[WifiReading]:
+        """Most recent reading, or None if there is none (or it is older than max_age_s)."""
+        if not self.readings:
+            return None
+        reading = self.readings[-1]
+        if max_age_s is not None and time.time() - reading.t > max_age_s:
+            return None
+        return reading
+
+    async def wait_latest(self, timeout: float) -> Optional[WifiReading]:
+        """Latest reading, waiting up to timeout seconds for the first one."""
+        if self.readings or self._poller is None or self._poller.done():
+            return self.latest()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return self.latest()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator["WifiTelemetry"]:
+        """Keep the sampler running for the duration of the block."""
+        self._sessions += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        try:
+            yield self
+        finally:
+            self._sessions -= 1
+            if not self._sessions and self._poller is not None:
+                self._poller.cancel()
+                self._poller = None
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await self.poll_once()
+            await asyncio.sleep(max(0.0, self.interval_s - (loop.time() - started)))
+
+    async def poll_once(self) -> Optional[WifiReading]:
+        """Read the source once and record the reading."""
+        self._polls += 1
+        try:
+            info = await self.source.read()
+        except Exception as e:
+            info = None
+            logger.debug(f"Wi-Fi source {self.source} failed: {e}")
+        if not isinstance(info, dict) or not info:
+            self._errors += 1
+            return None
+        reading = WifiReading.from_info(info)
+        self.readings.append(reading)
+        self.info = info
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(reading)
+        return reading
+
+    def stats(self) -> Dict[str, Any]:
+        """Sampler counters for the health endpoint."""
+        latest = self.latest()
+        return {
+            "source": str(self.source),
+            "interval_s": self.interval_s,
+            "running": self._poller is not None and not self._poller.done(),
+            "buffered": len(self.readings),
+            "polls": self._polls,
+            "errors": self._errors,
+            "latest_age_s": round(time.time() - latest.t, 1) if latest else None
+        }